@@ -0,0 +1,231 @@
+"""
+Pipeline Benchmarks
+===================
+
+Mede cada etapa da pipeline sobre dados sintéticos (ver
+`benchmarks.synthetic`): leitura do corpus, embeddings, ajuste por
+algoritmo, agregação dos resultados, score, atribuição, agregação da
+avaliação e escrita dos artefatos. Nenhum serviço externo é usado: o
+embedder é determinístico em CPU e a nomeação de clusters vai para um
+servidor HTTP local.
+
+Uso:
+
+    python -m benchmarks.run_benchmarks --questions 5000 --models 10 \\
+        --output bench.json
+    python -m benchmarks.run_benchmarks --questions 5000 --models 10 \\
+        --compare bench.json
+
+O JSON de saída traz, por etapa, o tempo, as linhas processadas, a vazão
+(linhas/s) e o pico de RSS do processo; `--compare` compara os tempos com
+um JSON anterior e termina com código 1 se alguma etapa ficar mais lenta
+que o limite.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de RSS
+    resource = None
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo, em MB (None se indisponível)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """Acumula tempo, linhas e pico de RSS de cada etapa."""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        self.stages.append({
+            "stage": name,
+            "seconds": round(seconds, 6),
+            "rows": int(rows),
+            "rows_per_s": round(rows / seconds, 2) if seconds > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        print(f"{name:<28} {seconds:9.3f}s {rows:>10} linhas", flush=True)
+
+
+def run(questions, models, ks, dim, workdir, seed=0):
+    """
+    Executa todas as etapas uma vez e retorna a lista de medições.
+
+    As variáveis de ambiente de caminhos (JSON_PATH, RESULTS_PATH e caches)
+    apontam para `workdir`, de modo que a execução começa sempre a frio.
+    """
+    os.environ.update({
+        "JSON_PATH": os.path.join(workdir, "corpus.json"),
+        "RESULTS_PATH": os.path.join(workdir, "results"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "cache", "embeddings.sqlite"),
+        "NAME_CACHE_PATH": os.path.join(workdir, "cache", "names.sqlite"),
+        # Mede a pipeline, não o limite de taxa do endpoint real
+        "AWS_RATE_LIMIT": os.getenv("BENCH_AWS_RATE_LIMIT", "1000"),
+        "AWS_RATE_BURST": os.getenv("BENCH_AWS_RATE_BURST", "1000"),
+    })
+    os.environ.pop("EMBEDDING_ARTIFACT_DIR", None)
+    os.environ.pop("AGLOMERAR_CACHE_DIR", None)
+
+    from benchmarks.synthetic import write_corpus, write_results_folder, StubEmbedder, stub_naming_server
+    from utils.utils_IO import load_corpus
+    from utils.embeddings import encode_texts, unique_texts
+    from utils.run import kmeans_estimator, bisecting_kmeans_estimator, agglomerative_tree, cut_tree
+    from utils.aglomerar import aglomerar
+    from utils.metrics import compute_scores
+    from utils.assign import CentroidAssigner
+    from utils.evaluation import _aggregate_long
+    from utils.writer import ArtifactWriter
+    from utils.run import save_kmeans_results
+
+    embedder = StubEmbedder(dim=dim)
+    timer = StageTimer()
+
+    write_corpus(os.environ["JSON_PATH"], questions, seed=seed)
+    models_folder = os.path.join(workdir, "models")
+
+    with timer.stage("load_corpus", questions):
+        corpus = load_corpus()
+    write_results_folder(models_folder, corpus["question"].tolist(), models, seed=seed)
+
+    with timer.stage("embed_corpus", len(corpus)):
+        embeddings = encode_texts(corpus["text"].tolist(), embed_model=embedder,
+                                  model_name="stub", show_progress_bar=False)
+    with timer.stage("embed_corpus_cached", len(corpus)):
+        encode_texts(corpus["text"].tolist(), embed_model=embedder,
+                     model_name="stub", show_progress_bar=False)
+
+    fits = {}
+    for k in ks:
+        with timer.stage(f"fit_kmeans_k{k}", len(corpus)):
+            fits[("kmeans", None, k)] = kmeans_estimator(k).fit_predict(embeddings)
+        with timer.stage(f"fit_top_bottom_k{k}", len(corpus)):
+            fits[("top_bottom", "largest_cluster", k)] = (
+                bisecting_kmeans_estimator(k).fit_predict(embeddings))
+    with timer.stage("fit_bottom_top_ward_tree", len(corpus)):
+        tree = agglomerative_tree(embeddings, "ward")
+    with timer.stage("cut_bottom_top_ward", len(corpus) * len(ks)):
+        for k in ks:
+            fits[("bottom_top", "ward", k)] = cut_tree(tree, k)
+
+    with timer.stage("aglomerar", questions * models * 4):
+        df = aglomerar(models_folder)
+    with timer.stage("compute_scores", len(df)):
+        df["score"] = compute_scores(df)
+
+    with timer.stage("assign", len(df) * len(fits)):
+        texts, inverse = unique_texts(df["input"].astype(str))
+        inputs = encode_texts(texts, embed_model=embedder, model_name="stub", show_progress_bar=False)
+        labels = {}
+        for key, fitted in fits.items():
+            assigner = CentroidAssigner.from_labels(embeddings, fitted, metric="euclidean")
+            labels[key] = assigner.predict(inputs)[inverse]
+
+    with timer.stage("aggregate_evaluation", len(df) * len(labels)):
+        _aggregate_long(df, labels)
+
+    with stub_naming_server() as server:
+        with timer.stage("write_artifacts", len(corpus) * len(ks)):
+            with ArtifactWriter(fmt="files") as writer:
+                for k in ks:
+                    out = corpus.copy()
+                    out["cluster"] = fits[("kmeans", None, k)]
+                    save_kmeans_results(out, k, writer)
+        naming_calls = server.calls
+
+    return timer.stages, {"naming_calls": naming_calls, "test_cases": len(df)}
+
+
+def compare(current, baseline, tolerance):
+    """
+    Compara os tempos por etapa com um resultado anterior.
+
+    Returns
+    -------
+    list of str
+        Etapas mais lentas que `baseline * (1 + tolerance)`.
+    """
+    before = {s["stage"]: s for s in baseline["stages"]}
+    slower = []
+    print(f"\n{'etapa':<28} {'antes':>9} {'agora':>9} {'razão':>7}")
+    for stage in current["stages"]:
+        old = before.get(stage["stage"])
+        if old is None or not old["seconds"]:
+            continue
+        ratio = stage["seconds"] / old["seconds"]
+        flag = "  <- mais lenta" if ratio > 1 + tolerance else ""
+        print(f"{stage['stage']:<28} {old['seconds']:9.3f} {stage['seconds']:9.3f} {ratio:7.2f}{flag}")
+        if flag:
+            slower.append(stage["stage"])
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da pipeline de clustering com dados sintéticos.")
+    parser.add_argument("--questions", type=int, default=2000, help="Perguntas no corpus sintético.")
+    parser.add_argument("--models", type=int, default=5, help="Modelos na pasta de resultados.")
+    parser.add_argument("--ks", type=int, nargs="+", default=[5, 10, 20], help="Valores de k.")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensão do embedder sintético.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Pasta de trabalho (padrão: temporária).")
+    parser.add_argument("--output", help="Grava o resultado em JSON.")
+    parser.add_argument("--compare", help="JSON anterior para comparação.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Aumento relativo de tempo tolerado em --compare (padrão: 0.2).")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        stages, extra = run(args.questions, args.models, args.ks, args.dim,
+                            args.workdir or tmp, seed=args.seed)
+
+    result = {
+        "meta": {
+            "questions": args.questions,
+            "models": args.models,
+            "ks": args.ks,
+            "dim": args.dim,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **extra,
+        },
+        "stages": stages,
+        "total_seconds": round(sum(s["seconds"] for s in stages), 6),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            slower = compare(result, json.load(f), args.tolerance)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Synthetic Data Module
+=====================
+
+Dados e serviços sintéticos para os benchmarks da pipeline:
+
+- corpus no formato de JSON_PATH ({seção: {"question": [...], "answer": [...]}})
+- pasta de resultados de modelos (arquivos `prefix_modelo_tarefa.json` com
+  testCases, lidos por `utils.aglomerar.aglomerar`)
+- embedder determinístico em CPU, com a interface encode() do
+  SentenceTransformer
+- servidor HTTP local no lugar do endpoint AWS de nomeação de clusters
+"""
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.metrics import METRIC_COLUMNS, BINARY_TASKS
+
+
+SECTIONS = ("qa", "completion", "tf", "choice")
+TASKS = ("qa", "completion", "tf", "choice")
+
+# Vocabulário pequeno e tópicos fixos: perguntas do mesmo tópico
+# compartilham palavras, de modo que o corpus tem estrutura de clusters
+_VOCABULARY = [
+    "granito", "basalto", "arenito", "calcario", "gnaisse", "xisto", "quartzo",
+    "feldspato", "mica", "olivina", "piroxenio", "anfibolio", "argila", "silte",
+    "falha", "dobra", "foliacao", "estratificacao", "intrusao", "vulcanismo",
+    "sedimento", "diagenese", "metamorfismo", "magma", "lava", "erosao",
+    "intemperismo", "bacia", "rifte", "subduccao", "orogenia", "cráton",
+    "porosidade", "permeabilidade", "reservatorio", "petroleo", "aquifero",
+    "mineral", "cristal", "textura", "granulacao", "fossil", "estratigrafia",
+]
+
+
+def make_corpus(n_questions, n_topics=50, words_per_question=12, seed=0):
+    """
+    Gera o corpus sintético no formato de JSON_PATH.
+
+    Returns
+    -------
+    dict
+        {seção: {"question": [...], "answer": [...]}}, com as perguntas
+        distribuídas igualmente entre as seções de SECTIONS.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array(_VOCABULARY)
+    topics = [rng.choice(len(vocab), size=8, replace=False) for _ in range(n_topics)]
+
+    corpus = {section: {"question": [], "answer": []} for section in SECTIONS}
+    for i in range(n_questions):
+        topic = topics[rng.integers(n_topics)]
+        words = vocab[np.where(rng.random(words_per_question) < 0.7,
+                               rng.choice(topic, size=words_per_question),
+                               rng.integers(len(vocab), size=words_per_question))]
+        section = SECTIONS[i % len(SECTIONS)]
+        corpus[section]["question"].append(f"Q{i}: " + " ".join(words) + "?")
+        corpus[section]["answer"].append(" ".join(rng.choice(vocab, size=6)))
+    return corpus
+
+
+def write_corpus(path, n_questions, **kwargs):
+    """Grava `make_corpus` em `path` e retorna o caminho."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_corpus(n_questions, **kwargs), f, ensure_ascii=False)
+    return path
+
+
+def write_results_folder(folder, questions, n_models, tasks=TASKS, seed=0):
+    """
+    Gera uma pasta de resultados: um arquivo por (modelo, tarefa).
+
+    Cada arquivo tem um testCase por pergunta, com input, success e
+    metricsData (métricas de METRIC_COLUMNS em tarefas não binárias) — a
+    mesma pergunta se repete em todos os modelos, como nas pastas reais.
+
+    Returns
+    -------
+    list of str
+        Arquivos gravados.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for m in range(n_models):
+        for task in tasks:
+            cases = []
+            for question in questions:
+                case = {"input": question, "success": bool(rng.random() < 0.6)}
+                if task not in BINARY_TASKS:
+                    case["metricsData"] = [
+                        {"name": name, "score": float(rng.random())} for name in METRIC_COLUMNS
+                    ]
+                cases.append(case)
+            path = os.path.join(folder, f"results_model{m}_{task}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"testCases": cases}, f, ensure_ascii=False)
+            paths.append(path)
+    return paths
+
+
+class StubEmbedder:
+    """
+    Embedder determinístico em CPU com a interface do SentenceTransformer.
+
+    O vetor de um texto é a soma de vetores pseudoaleatórios fixos de cada
+    palavra (semente = hash da palavra): textos com palavras em comum ficam
+    próximos, e o resultado não depende de ordem, lote ou processo.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self._words = {}
+
+    def _word(self, word):
+        vector = self._words.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._words[word] = vector
+        return vector
+
+    def encode(self, texts, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in str(text).split():
+                out[i] += self._word(word)
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+
+class _NamingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        prompt = json.loads(self.rfile.read(length) or b"{}").get("prompt", "")
+        with self.server.lock:
+            self.server.calls += 1
+        # Nome determinístico derivado do texto enviado
+        words = [w for w in (w.strip("?:,.") for w in prompt.split()[-40:]) if w.isalpha()]
+        name = "_".join(sorted(set(words))[:3]) or "cluster"
+        payload = json.dumps({"body": name}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_naming_server():
+    """
+    Sobe um servidor HTTP local no lugar do endpoint de nomeação.
+
+    Define AWS_ENDPOINT_URL e AWS_MODEL enquanto o contexto estiver aberto.
+
+    Examples
+    --------
+    >>> with stub_naming_server() as server:
+    ...     save_txt_per_cluster(df, out_dir, text_col="question")
+    >>> server.calls
+    10
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _NamingHandler)
+    server.calls = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    previous = {var: os.environ.get(var) for var in ("AWS_ENDPOINT_URL", "AWS_MODEL")}
+    os.environ["AWS_ENDPOINT_URL"] = f"http://127.0.0.1:{server.server_address[1]}/generate"
+    os.environ["AWS_MODEL"] = "stub"
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Caminhos e caches da pipeline isolados em uma pasta temporária."""
+    for var in ("EMBEDDING_ARTIFACT_DIR", "AGLOMERAR_CACHE_DIR", "EMBEDDING_WORKER_SOCKET",
+                "EMBEDDING_BACKEND", "TRACE_DIR"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setenv("JSON_PATH", str(tmp_path / "corpus.json"))
+    monkeypatch.setenv("RESULTS_PATH", str(tmp_path / "results"))
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "cache" / "embeddings.sqlite"))
+    monkeypatch.setenv("NAME_CACHE_PATH", str(tmp_path / "cache" / "names.sqlite"))
+    monkeypatch.setenv("CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setenv("INCREMENTAL_DIR", str(tmp_path / "incremental"))
+    monkeypatch.setenv("AWS_RATE_LIMIT", "1000")
+    monkeypatch.setenv("AWS_RATE_BURST", "1000")
+
+    # Caches do processo apontam para os caminhos acima
+    import utils.embeddings
+    import utils.AWS
+    monkeypatch.setattr(utils.embeddings, "_cache", None)
+    monkeypatch.setattr(utils.AWS, "_name_cache", None)
+    monkeypatch.setattr(utils.AWS, "_limiter", None)
+    monkeypatch.setattr(utils.AWS, "_request_slots", None)
+    return tmp_path
+
+
+@pytest.fixture
+def stub_embedder(monkeypatch):
+    """Embedder sintético registrado como o modelo padrão do processo."""
+    from benchmarks.synthetic import StubEmbedder
+    from utils.embeddings import DEFAULT_EMBEDDING_MODEL, register_embed_model
+    import utils.embeddings
+
+    monkeypatch.setattr(utils.embeddings, "_models", {})
+    embedder = StubEmbedder(dim=32)
+    register_embed_model(DEFAULT_EMBEDDING_MODEL, embedder)
+    return embedder
@@ -0,0 +1,95 @@
+import json
+import os
+
+import pandas as pd
+
+from benchmarks.synthetic import write_results_folder
+from utils.aglomerar import aglomerar
+
+
+def _parquet_files(cache_dir):
+    return {
+        os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+        for root, _, files in os.walk(cache_dir)
+        for name in files
+        if name.endswith(".parquet")
+    }
+
+
+def test_incremental_cache_is_per_folder(tmp_path):
+    questions = [f"pergunta {i}" for i in range(20)]
+    folder_a, folder_b = tmp_path / "a", tmp_path / "b"
+    # Mesmos nomes de arquivo nas duas pastas, conteúdos diferentes
+    write_results_folder(str(folder_a), questions, n_models=2, seed=0)
+    write_results_folder(str(folder_b), questions, n_models=2, seed=1)
+    cache_dir = str(tmp_path / "cache")
+
+    first_a = aglomerar(str(folder_a), n_jobs=1, cache_dir=cache_dir)
+    aglomerar(str(folder_b), n_jobs=1, cache_dir=cache_dir)
+    before = _parquet_files(cache_dir)
+
+    # Voltar para a pasta A reaproveita o cache sem regravar nada
+    again_a = aglomerar(str(folder_a), n_jobs=1, cache_dir=cache_dir)
+    assert _parquet_files(cache_dir) == before
+    pd.testing.assert_frame_equal(again_a, first_a)
+    pd.testing.assert_frame_equal(again_a, aglomerar(str(folder_a), n_jobs=1))
+
+
+def test_incremental_cache_drops_removed_files(tmp_path):
+    folder = tmp_path / "a"
+    paths = write_results_folder(str(folder), [f"pergunta {i}" for i in range(10)], n_models=2)
+    cache_dir = str(tmp_path / "cache")
+    aglomerar(str(folder), n_jobs=1, cache_dir=cache_dir)
+    os.remove(paths[0])
+    df = aglomerar(str(folder), n_jobs=1, cache_dir=cache_dir)
+    assert len(_parquet_files(cache_dir)) == len(paths) - 1
+    assert len(df) == 10 * (len(paths) - 1)
+
+
+def test_incremental_cache_round_trips_mixed_and_list_columns(tmp_path):
+    folder = tmp_path / "a"
+    folder.mkdir()
+    cases = [
+        {"input": "p1", "success": True, "tags": ["a", "b"]},
+        {"input": "p2", "success": "true", "tags": []},
+        {"input": "p3", "success": None, "tags": ["c"]},
+    ]
+    with open(folder / "results_model_qa.json", "w", encoding="utf-8") as f:
+        json.dump({"testCases": cases}, f)
+    write_results_folder(str(folder), ["p1", "p2"], n_models=1, tasks=("completion",))
+    cache_dir = str(tmp_path / "cache")
+
+    uncached = aglomerar(str(folder), n_jobs=1)
+    first = aglomerar(str(folder), n_jobs=1, cache_dir=cache_dir)
+    again = aglomerar(str(folder), n_jobs=1, cache_dir=cache_dir)
+
+    for df in (first, again):
+        pd.testing.assert_frame_equal(df, uncached)
+    tags = again.loc[(again["task"] == "qa") & (again["input"] == "p1"), "tags"].iloc[0]
+    assert tags == ["a", "b"]
+
+
+def test_parallel_matches_serial(tmp_path):
+    write_results_folder(str(tmp_path), [f"pergunta {i}" for i in range(50)], n_models=3)
+
+    serial = aglomerar(str(tmp_path), n_jobs=1)
+    parallel = aglomerar(str(tmp_path), n_jobs=2)
+
+    pd.testing.assert_frame_equal(parallel, serial)
+    for col in ("model", "task"):
+        assert isinstance(parallel[col].dtype, pd.CategoricalDtype)
+        assert list(parallel[col].cat.categories) == list(serial[col].cat.categories)
+
+
+def test_small_folder_defaults_to_serial(tmp_path, monkeypatch):
+    import utils.aglomerar
+
+    write_results_folder(str(tmp_path), [f"pergunta {i}" for i in range(5)], n_models=2)
+    monkeypatch.delenv("AGLOMERAR_PARALLEL_BYTES", raising=False)
+    monkeypatch.setenv("AGLOMERAR_WORKERS", "4")
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("pool de processos iniciado para uma pasta pequena")
+
+    monkeypatch.setattr(utils.aglomerar, "ProcessPoolExecutor", no_pool)
+    assert len(aglomerar(str(tmp_path))) == 5 * 2 * 4
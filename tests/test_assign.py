@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import AgglomerativeClustering, BisectingKMeans, KMeans
+
+from utils.assign import CentroidAssigner, assign_clusters, assign_by_centroids
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(6, 16)) * 3
+    train = (centers[rng.integers(6, size=400)] + rng.normal(size=(400, 16))).astype(np.float32)
+    query = (centers[rng.integers(6, size=300)] + rng.normal(size=(300, 16))).astype(np.float32)
+    return train, query
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000])
+def test_euclidean_assigner_matches_kmeans_predict(data, chunk_size):
+    train, query = data
+    kmeans = KMeans(n_clusters=6, n_init=1, random_state=0).fit(train)
+
+    assigner = CentroidAssigner.from_model(kmeans, metric="euclidean")
+
+    np.testing.assert_array_equal(assigner.predict(query, chunk_size), kmeans.predict(query))
+
+
+def test_from_labels_matches_assign_by_centroids(data):
+    train, query = data
+    labels = AgglomerativeClustering(n_clusters=6).fit_predict(train)
+
+    assigner = CentroidAssigner.from_labels(train, labels, metric="euclidean", chunk_size=50)
+
+    np.testing.assert_array_equal(assigner.predict(query), assign_by_centroids(query, train, labels))
+
+
+@pytest.mark.parametrize("model", [
+    KMeans(n_clusters=12, n_init=1, random_state=0),
+    BisectingKMeans(n_clusters=12, random_state=0, bisecting_strategy="largest_cluster"),
+])
+def test_assign_clusters_matches_model_predict(model):
+    # Sem estrutura de clusters: o centróide mais próximo difere do predict()
+    # do BisectingKMeans, e o cosseno difere do euclidiano
+    rng = np.random.default_rng(0)
+    train, query = rng.normal(size=(2, 1000, 8)).astype(np.float32)
+    model.fit(train)
+    df = pd.DataFrame({"input": [f"t{i}" for i in range(len(query))]})
+
+    result = assign_clusters(df, None, model, embeddings=query, chunk_size=64)
+
+    np.testing.assert_array_equal(result["cluster"].to_numpy(), model.predict(query))
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.AWS import generate, generate_many, generate_cluster_names, get_name_cache
+
+
+@contextmanager
+def status_server(statuses):
+    """Servidor local que responde cada POST com o próximo status da lista."""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status = statuses[min(len(calls), len(statuses) - 1)]
+            calls.append(status)
+            payload = json.dumps({"body": "granito_xisto"}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/generate", calls
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("status", [400, 401, 403])
+def test_client_errors_are_not_retried(workdir, status):
+    with status_server([status]) as (url, calls):
+        with pytest.raises(RuntimeError, match=str(status)):
+            generate("texto", max_retries=5, retry_delay=0, endpoint_url=url, model_name="stub")
+    assert calls == [status]
+
+
+def test_retryable_errors_are_retried(workdir):
+    with status_server([503, 503, 200]) as (url, calls):
+        assert generate("texto", max_retries=5, retry_delay=0, endpoint_url=url, model_name="stub") == "granito_xisto"
+    assert calls == [503, 503, 200]
+
+
+@contextmanager
+def naming_server(fail_marker):
+    """Servidor que nomeia cada prompt e responde 400 aos que contêm `fail_marker`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            prompt = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["prompt"]
+            status = 400 if fail_marker in prompt else 200
+            payload = json.dumps({"body": f"nome_{prompt.split()[-1]}"}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/generate"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_name_keeps_the_others_in_cache(workdir):
+    clusters = [["granito"], ["falha"], ["basalto"], ["xisto"]]
+    with naming_server("falha") as url:
+        with pytest.raises(RuntimeError, match="400"):
+            generate_cluster_names(clusters, max_retries=1, endpoint_url=url, model_name="stub")
+
+    cache = get_name_cache()
+    assert [cache.get(texts, "stub") for texts in clusters] == ["nome_granito", None, "nome_basalto", "nome_xisto"]
+
+
+def test_concurrent_generate_many_calls_share_one_limit(workdir, monkeypatch):
+    monkeypatch.setenv("AWS_MAX_CONCURRENCY", "2")
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            payload = json.dumps({"body": "granito"}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/generate"
+    try:
+        # Como as threads do ArtifactWriter: cada uma com o seu generate_many
+        callers = [threading.Thread(target=generate_many, args=([f"t{i}"] * 4,),
+                                    kwargs={"max_workers": 4, "endpoint_url": url, "model_name": "stub"})
+                   for i in range(3)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert state["peak"] == 2
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from benchmarks.run_benchmarks import compare, main
+
+ENV = ("JSON_PATH", "RESULTS_PATH", "EMBEDDING_CACHE_PATH", "NAME_CACHE_PATH",
+       "AWS_RATE_LIMIT", "AWS_RATE_BURST")
+
+
+@pytest.fixture
+def bench_env(workdir, monkeypatch):
+    # run() grava os caminhos em os.environ; o monkeypatch os restaura
+    for var in ENV:
+        monkeypatch.setenv(var, "")
+    return workdir
+
+
+def test_harness_runs_every_stage_and_writes_json(bench_env):
+    output = bench_env / "bench.json"
+
+    code = main(["--questions", "60", "--models", "2", "--ks", "3", "5", "--dim", "16",
+                 "--workdir", str(bench_env / "bench"), "--output", str(output)])
+
+    assert code == 0
+    with open(output, encoding="utf-8") as f:
+        result = json.load(f)
+    stages = [s["stage"] for s in result["stages"]]
+    assert stages[:3] == ["load_corpus", "embed_corpus", "embed_corpus_cached"]
+    assert {"fit_kmeans_k3", "fit_kmeans_k5", "aglomerar", "assign", "write_artifacts"} <= set(stages)
+    assert result["meta"]["test_cases"] == 60 * 2 * 4
+    assert result["meta"]["naming_calls"] > 0
+    assert all(s["seconds"] >= 0 and s["rows"] > 0 for s in result["stages"])
+
+    # Comparado consigo mesmo, nada fica mais lento
+    assert main(["--questions", "60", "--models", "2", "--ks", "3", "--dim", "16",
+                 "--workdir", str(bench_env / "again"), "--compare", str(output),
+                 "--tolerance", "1000"]) == 0
+
+
+def test_compare_flags_only_slower_stages():
+    baseline = {"stages": [{"stage": "a", "seconds": 1.0}, {"stage": "b", "seconds": 1.0},
+                           {"stage": "c", "seconds": 0.0}]}
+    current = {"stages": [{"stage": "a", "seconds": 1.1}, {"stage": "b", "seconds": 1.5},
+                          {"stage": "c", "seconds": 9.0}, {"stage": "new", "seconds": 9.0}]}
+
+    assert compare(current, baseline, tolerance=0.2) == ["b"]
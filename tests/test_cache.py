@@ -0,0 +1,52 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import utils.cache
+from utils.cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Relógio estritamente crescente: a ordem LRU não depende da resolução de time.time()
+    ticks = itertools.count(1)
+    monkeypatch.setattr(utils.cache.time, "time", lambda: float(next(ticks)))
+
+
+def _keys(*texts):
+    return [EmbeddingCache.key("modelo", True, t) for t in texts]
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_entries=10)
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    cache.put_many(_keys("a", "b"), vectors)
+
+    found = cache.get_many(_keys("a", "b", "c"))
+
+    np.testing.assert_array_equal(found[_keys("a")[0]], vectors[0])
+    np.testing.assert_array_equal(found[_keys("b")[0]], vectors[1])
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 2, "hit_rate": 2 / 3}
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_entries=3)
+    cache.put_many(_keys("a", "b", "c"), np.ones((3, 4)))
+    cache.get_many(_keys("a"))  # "a" passa a ser o mais recente
+
+    cache.put_many(_keys("d"), np.ones((1, 4)))
+
+    assert len(cache) == 3
+    assert set(cache.get_many(_keys("a", "b", "c", "d"))) == set(_keys("a", "c", "d"))
+
+
+def test_limit_holds_after_reopening(tmp_path, clock):
+    path = str(tmp_path / "emb.sqlite")
+    EmbeddingCache(path, max_entries=100).put_many(_keys(*"abcdef"), np.ones((6, 2)))
+
+    cache = EmbeddingCache(path, max_entries=4)
+    cache.put_many(_keys("g"), np.ones((1, 2)))
+
+    assert len(cache) == 4
+    assert set(cache.get_many(_keys(*"abcdefg"))) == set(_keys("d", "e", "f", "g"))
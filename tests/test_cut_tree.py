@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from sklearn.metrics import adjusted_rand_score
+
+from utils.run import agglomerative_estimator, agglomerative_tree, cut_tree
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((8, 16))
+    X = centers[rng.integers(8, size=300)] + 0.3 * rng.standard_normal((300, 16))
+    return (X / np.linalg.norm(X, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.parametrize("linkage", ["ward", "complete", "average", "single"])
+@pytest.mark.parametrize("k", [2, 5, 20, 250])
+def test_cut_tree_labels_match_direct_fit(embeddings, linkage, k):
+    tree = agglomerative_tree(embeddings, linkage)
+    direct = agglomerative_estimator(linkage, embeddings, n_clusters=k).fit_predict(embeddings)
+    np.testing.assert_array_equal(cut_tree(tree, k), direct)
+
+
+@pytest.mark.parametrize("linkage", ["ward_knn", "average_knn"])
+@pytest.mark.parametrize("k", [5, 20, 250])
+def test_cut_tree_knn_partition_matches_direct_fit(embeddings, linkage, k):
+    tree = agglomerative_tree(embeddings, linkage, n_neighbors=10)
+    direct = agglomerative_estimator(linkage, embeddings, n_neighbors=10, n_clusters=k).fit_predict(embeddings)
+    # Mesma partição; a numeração dos clusters pode vir permutada
+    assert adjusted_rand_score(cut_tree(tree, k), direct) == 1.0
+
+
+def test_cut_tree_distance_threshold(embeddings):
+    tree = agglomerative_tree(embeddings, "ward")
+    direct = agglomerative_estimator("ward", embeddings, n_clusters=None,
+                                     distance_threshold=1.5).fit_predict(embeddings)
+    np.testing.assert_array_equal(cut_tree(tree, distance_threshold=1.5), direct)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.embedding_worker import EmbeddingWorker, WorkerEmbedder
+
+
+class SlowEmbedder:
+    def __init__(self, delay):
+        self.delay = delay
+        self.finished = None
+
+    def encode(self, texts, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        time.sleep(self.delay)
+        self.finished = time.monotonic()
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class ConstantEmbedder:
+    def __init__(self, value):
+        self.value = value
+
+    def encode(self, texts, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        return np.full((len(texts), 4), self.value, dtype=np.float32)
+
+
+def test_worker_encodes_with_the_client_backend(tmp_path):
+    socket_path = str(tmp_path / "worker.sock")
+    worker = EmbeddingWorker(socket_path)
+    worker.models["modelo"] = (ConstantEmbedder(1.0), threading.Lock())
+    worker.models["modelo@onnx-int8"] = (ConstantEmbedder(2.0), threading.Lock())
+    thread = threading.Thread(target=worker.serve, daemon=True)
+    thread.start()
+    try:
+        torch = WorkerEmbedder(socket_path, "modelo", backend="torch").encode(["a"])
+        onnx = WorkerEmbedder(socket_path, "modelo", backend="onnx-int8").encode(["a"])
+    finally:
+        worker.shutdown()
+        thread.join(timeout=10)
+
+    assert torch[0, 0] == 1.0 and onnx[0, 0] == 2.0
+
+
+def test_idle_timeout_waits_for_request_in_flight(tmp_path, monkeypatch):
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    socket_path = str(tmp_path / "worker.sock")
+    worker = EmbeddingWorker(socket_path)
+    model = SlowEmbedder(delay=1.0)
+    worker.models["lento"] = (model, threading.Lock())
+    stopped = []
+
+    def serve():
+        worker.serve(idle_timeout=0.2)
+        stopped.append(time.monotonic())
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    vectors = WorkerEmbedder(socket_path, "lento", timeout=10).encode(["a", "b"])
+
+    assert vectors.shape == (2, 4)
+    thread.join(timeout=10)
+    # O encerramento por ociosidade só acontece depois do pedido em andamento
+    assert stopped and stopped[0] > model.finished
@@ -0,0 +1,65 @@
+import numpy as np
+
+from benchmarks.synthetic import StubEmbedder
+from utils.embeddings import encode_texts, get_embedding_cache, register_embed_model, unique_texts
+
+
+class ShiftedEmbedder(StubEmbedder):
+    """Outro modelo com a mesma dimensão: vetores diferentes para os mesmos textos."""
+
+    def encode(self, texts, **kwargs):
+        return super().encode(texts, **kwargs)[:, ::-1].copy()
+
+
+TEXTS = ["granito xisto", "basalto vulcanica", "arenito poroso"]
+
+
+def test_custom_embedders_never_share_cache_entries(workdir):
+    first, second = StubEmbedder(dim=16), ShiftedEmbedder(dim=16)
+
+    a = encode_texts(TEXTS, embed_model=first, show_progress_bar=False)
+    b = encode_texts(TEXTS, embed_model=second, show_progress_bar=False)
+
+    np.testing.assert_allclose(a, first.encode(TEXTS, normalize_embeddings=True))
+    np.testing.assert_allclose(b, second.encode(TEXTS, normalize_embeddings=True))
+    # Sem identidade no cache, nada foi gravado sob a chave do modelo padrão
+    assert len(get_embedding_cache()) == 0
+
+
+def test_explicit_or_registered_identity_uses_the_cache(workdir, monkeypatch):
+    import utils.embeddings
+    monkeypatch.setattr(utils.embeddings, "_models", {})
+    first, second = StubEmbedder(dim=16), ShiftedEmbedder(dim=16)
+    register_embed_model("registrado", second)
+
+    a = encode_texts(TEXTS, embed_model=first, model_name="stub-16", show_progress_bar=False)
+    b = encode_texts(TEXTS, embed_model=second, show_progress_bar=False)
+    again = encode_texts(TEXTS, embed_model=second, show_progress_bar=False)
+
+    assert len(get_embedding_cache()) == 2 * len(TEXTS)
+    np.testing.assert_allclose(again, b)
+    assert not np.allclose(a, b)
+
+
+def test_unique_texts_round_trip():
+    texts = ["b", "a", "b", 3, "3", "", "a"]
+
+    uniques, inverse = unique_texts(texts)
+
+    assert uniques == ["b", "a", "3", ""]
+    assert [uniques[i] for i in inverse] == [str(t) for t in texts]
+
+
+def test_duplicates_are_encoded_once_and_scattered_back(workdir):
+    class CountingEmbedder(StubEmbedder):
+        def encode(self, texts, **kwargs):
+            self.seen = getattr(self, "seen", []) + list(texts)
+            return super().encode(texts, **kwargs)
+
+    embedder = CountingEmbedder(dim=16)
+    texts = TEXTS + TEXTS[::-1] + TEXTS[:1]
+
+    vectors = encode_texts(texts, embed_model=embedder, show_progress_bar=False)
+
+    assert sorted(embedder.seen) == sorted(TEXTS)
+    np.testing.assert_allclose(vectors, StubEmbedder(dim=16).encode(texts, normalize_embeddings=True))
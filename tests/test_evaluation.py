@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_results_folder
+from utils.aglomerar import aglomerar
+from utils.evaluation import _aggregate_long
+from utils.metrics import compute_scores, METRIC_COLUMNS
+
+
+def test_aggregate_long_matches_groupby_per_combination(tmp_path):
+    write_results_folder(str(tmp_path), [f"pergunta {i}" for i in range(200)], n_models=2)
+    df = aglomerar(str(tmp_path), n_jobs=1)
+    df["score"] = compute_scores(df)
+    rng = np.random.default_rng(0)
+    labels = {("kmeans", None, 5): rng.integers(5, size=len(df)),
+              ("bottom_top", "ward", 8): rng.integers(8, size=len(df))}
+
+    result = _aggregate_long(df, labels)
+
+    for (method, linkage, k), assigned in labels.items():
+        expected = (
+            df.assign(cluster=assigned)
+            .groupby(["model", "task", "cluster"], observed=True)
+            .agg(num_questions=("score", "size"), score_mean=("score", "mean"),
+                 **{f"{col}_mean": (col, "mean") for col in METRIC_COLUMNS.values()})
+            .reset_index()
+        )
+        got = result[(result["method"] == method) & (result["k"] == k)]
+        got = got.drop(columns=["method", "linkage", "k", "score_sum"]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+    assert result["num_questions"].sum() == len(df) * len(labels)
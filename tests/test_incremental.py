@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import make_corpus
+import utils.incremental
+import utils.utils_IO
+from utils.incremental import update_clusters
+
+
+@pytest.fixture
+def corpus_path(workdir, stub_embedder, monkeypatch):
+    monkeypatch.setattr(utils.incremental, "generate_cluster_names",
+                        lambda groups, **kwargs: [f"cluster_{len(texts)}" for texts in groups])
+    return workdir / "corpus.json"
+
+
+def _write(path, corpus):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False)
+    # load_corpus memoiza por mtime, que pode não mudar entre duas gravações
+    utils.utils_IO._corpus_cache.clear()
+
+
+def _with_duplicates(n=120):
+    corpus = make_corpus(n, n_topics=5)
+    for section in corpus.values():
+        for col in ("question", "answer"):
+            section[col] = section[col] + section[col][:3]
+    return corpus
+
+
+def test_unchanged_corpus_with_duplicates_is_a_no_op(corpus_path):
+    _write(corpus_path, _with_duplicates())
+    assert update_clusters("kmeans", 5)["refit"] is True
+
+    report = update_clusters("kmeans", 5)
+
+    assert report["refit"] is False
+    assert (report["added"], report["removed"], report["renamed"]) == (0, 0, 0)
+
+
+def test_extra_copy_of_duplicate_is_the_only_added_row(corpus_path):
+    corpus = _with_duplicates()
+    _write(corpus_path, corpus)
+    update_clusters("kmeans", 5)
+
+    section = next(iter(corpus.values()))
+    for col in ("question", "answer"):
+        section[col].append(section[col][0])
+    _write(corpus_path, corpus)
+    report = update_clusters("kmeans", 5)
+
+    assert (report["added"], report["removed"]) == (1, 0)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import connected_components
+
+from utils.knn_graph import compare_with_exact, knn_graph
+
+
+def _normalized(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _brute_force_neighbors(embeddings, k):
+    sims = embeddings @ embeddings.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def test_exact_graph_matches_brute_force():
+    embeddings = _normalized(120, 8)
+    k = 5
+
+    # memory_mb minúsculo força vários blocos
+    graph = knn_graph(embeddings, n_neighbors=k, method="exact", memory_mb=0.01)
+
+    expected = _brute_force_neighbors(embeddings, k)
+    for i, row in enumerate(expected):
+        assert set(row) <= set(graph[i].indices)
+    assert (graph != graph.T).nnz == 0
+    assert graph.diagonal().sum() == 0
+
+
+def test_disconnected_clusters_are_bridged():
+    rng = np.random.default_rng(1)
+    centers = np.eye(4, 16, dtype=np.float32) * 10
+    embeddings = centers.repeat(20, axis=0) + rng.normal(scale=0.01, size=(80, 16)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    graph = knn_graph(embeddings, n_neighbors=3)
+
+    n_components, _ = connected_components(graph, directed=False)
+    assert n_components == 1
+
+
+def test_compare_with_exact_on_separated_clusters():
+    rng = np.random.default_rng(2)
+    centers = rng.normal(size=(4, 16)) * 5
+    embeddings = (centers.repeat(40, axis=0) + rng.normal(size=(160, 16))).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    result = compare_with_exact(embeddings, [2, 4], linkage="ward", sample_size=100, n_neighbors=10)
+
+    assert list(result["k"]) == [2, 4]
+    assert result.loc[result["k"] == 4, "ari"].item() == pytest.approx(1.0)
+    assert result["nmi"].between(0, 1).all()
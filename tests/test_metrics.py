@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.metrics import METRIC_COLUMNS, compute_score, compute_scores
+
+SUCCESS_VARIANTS = [True, False, "true", "True", "false", 1, 0, 1.0, None, np.nan]
+
+
+def _frame(success, tasks):
+    rng = np.random.default_rng(0)
+    n = len(success)
+    df = pd.DataFrame({"task": tasks, "success": pd.Series(success, dtype=object)})
+    for col in METRIC_COLUMNS.values():
+        values = rng.random(n).astype(object)
+        values[rng.random(n) < 0.3] = None
+        df[col] = values
+    return df
+
+
+def _assert_parity(df):
+    expected = df.apply(compute_score, axis=1).astype(float)
+    pd.testing.assert_series_equal(compute_scores(df), expected, check_names=False, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("task", ["tf", "choice", "TF", "qa"])
+def test_vectorized_matches_per_row_for_success_variants(task):
+    _assert_parity(_frame(SUCCESS_VARIANTS, [task] * len(SUCCESS_VARIANTS)))
+
+
+@pytest.mark.parametrize("success", [
+    pd.Series([True, False, True], dtype=bool),
+    pd.Series([1, 0, 1], dtype="int64"),
+    pd.Series([1.0, 0.0, np.nan], dtype="float64"),
+])
+def test_vectorized_matches_per_row_for_typed_success_columns(success):
+    df = _frame(list(success), ["tf", "choice", "qa"])
+    df["success"] = success
+    _assert_parity(df)
+
+
+def test_all_metrics_missing_is_nan():
+    df = _frame([None, None], ["qa", "open"])
+    for col in METRIC_COLUMNS.values():
+        df[col] = [None, np.nan]
+
+    assert df.apply(compute_score, axis=1).isna().all()
+    assert compute_scores(df).isna().all()
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_corpus, write_results_folder
+from utils.evaluation import evaluate_grid
+from utils.pipeline import run_pipeline
+from utils.utils_IO import load_corpus
+
+METHODS = {"kmeans": (None,), "top_bottom": ("largest_cluster",), "bottom_top": ("ward",)}
+
+
+@pytest.fixture
+def inputs(workdir, stub_embedder):
+    json_path = write_corpus(str(workdir / "corpus.json"), 150)
+    models_folder = str(workdir / "models")
+    write_results_folder(models_folder, load_corpus(json_path)["question"].tolist(), n_models=2)
+    return json_path, models_folder
+
+
+def test_rerun_resumes_from_checkpoints(inputs):
+    json_path, models_folder = inputs
+    first = run_pipeline([5, 10], METHODS, json_path=json_path, models_folder=models_folder, name=False)
+    assert first["counts"]["fit"] == {"cached": 0, "computed": 6}
+
+    second = run_pipeline([5, 10, 15], METHODS, json_path=json_path, models_folder=models_folder, name=False)
+
+    assert second["counts"]["fit"] == {"cached": 6, "computed": 3}
+    assert second["counts"]["evaluate"] == {"cached": 0, "computed": 1}
+    for key, labels in first["labelings"].items():
+        np.testing.assert_array_equal(second["labelings"][key], labels)
+
+
+def test_top_bottom_evaluation_matches_evaluate_grid(inputs):
+    json_path, models_folder = inputs
+    methods = {"top_bottom": ("largest_cluster",)}
+    run_pipeline([5, 10], methods, json_path=json_path, name=False)
+
+    # Avaliação em outra execução: rótulos e modelos vêm dos checkpoints
+    result = run_pipeline([5, 10], methods, json_path=json_path, models_folder=models_folder, name=False)
+    expected = evaluate_grid(models_folder, [5, 10], methods, corpus=load_corpus(json_path))
+
+    assert result["counts"]["fit"] == {"cached": 2, "computed": 0}
+    pd.testing.assert_frame_equal(result["evaluation"], expected, check_dtype=False)
+
+
+def test_evaluation_encodes_cases_with_the_pipeline_model(inputs):
+    from benchmarks.synthetic import StubEmbedder
+    from utils.embeddings import register_embed_model
+
+    json_path, models_folder = inputs
+    # Dimensão diferente do modelo padrão (32): misturar os dois quebraria a atribuição
+    register_embed_model("outro-modelo", StubEmbedder(dim=16))
+    methods = {"kmeans": (None,)}
+
+    result = run_pipeline([5], methods, json_path=json_path, models_folder=models_folder, name=False,
+                          model_name="outro-modelo")
+    expected = evaluate_grid(models_folder, [5], methods, corpus=load_corpus(json_path),
+                             model_name="outro-modelo")
+
+    pd.testing.assert_frame_equal(result["evaluation"], expected, check_dtype=False)
+
+
+def test_kmeans_k_above_corpus_size_is_clamped(workdir, stub_embedder):
+    json_path = write_corpus(str(workdir / "small.json"), 8)
+
+    result = run_pipeline([5, 20], {"kmeans": (None,)}, json_path=json_path, name=False)
+
+    assert len(np.unique(result["labelings"][("kmeans", None, 20)])) == 8
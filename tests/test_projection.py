@@ -0,0 +1,21 @@
+import os
+
+import numpy as np
+
+from utils.embeddings import save_embedding_artifact, open_embedding_artifact
+from utils.projection import pca_projection, PROJECTION_FILE
+
+
+def test_projection_of_artifact_view_is_not_stored_as_artifact_projection(tmp_path):
+    rng = np.random.default_rng(0)
+    path = save_embedding_artifact(str(tmp_path / "artifact"), rng.normal(size=(50, 8)),
+                                   [f"t{i}" for i in range(50)])
+    matrix = open_embedding_artifact(path)[0]
+
+    view = matrix[10:]
+    assert pca_projection(view).shape == (40, 2)
+    assert not os.path.exists(os.path.join(path, PROJECTION_FILE))
+
+    assert pca_projection(matrix).shape == (50, 2)
+    assert np.load(os.path.join(path, PROJECTION_FILE)).shape == (50, 2)
+    assert pca_projection(open_embedding_artifact(path)[0][10:]).shape == (40, 2)
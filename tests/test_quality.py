@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+
+from utils.quality import cluster_quality
+
+
+@pytest.fixture
+def fitted():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(5, 12)) * 2
+    embeddings = (centers[rng.integers(5, size=500)] + rng.normal(size=(500, 12))).astype(np.float32)
+    kmeans = KMeans(n_clusters=5, n_init=1, random_state=0).fit(embeddings)
+    return embeddings, kmeans
+
+
+@pytest.mark.parametrize("chunk_size", [64, 8192])
+def test_matches_sklearn(fitted, chunk_size):
+    embeddings, kmeans = fitted
+    labels = kmeans.labels_
+
+    result = cluster_quality(embeddings, labels, sample_size=0, chunk_size=chunk_size)
+
+    assert result["n_clusters"] == 5
+    assert result["silhouette"] == pytest.approx(silhouette_score(embeddings, labels), rel=1e-4)
+    assert result["calinski_harabasz"] == pytest.approx(calinski_harabasz_score(embeddings, labels), rel=1e-4)
+    assert result["davies_bouldin"] == pytest.approx(davies_bouldin_score(embeddings, labels), rel=1e-4)
+    assert result["inertia"] == pytest.approx(kmeans.inertia_, rel=1e-4)
+
+
+def test_degenerate_labelings_are_nan(fitted):
+    embeddings, _ = fitted
+
+    single = cluster_quality(embeddings, np.zeros(len(embeddings)))
+    singletons = cluster_quality(embeddings, np.arange(len(embeddings)))
+
+    assert single["n_clusters"] == 1 and np.isnan(single["silhouette"])
+    assert np.isnan(singletons["calinski_harabasz"])
@@ -0,0 +1,25 @@
+import numpy as np
+
+import utils.run
+from benchmarks.synthetic import write_corpus
+from utils.embeddings import encode_texts
+from utils.run import kmeans_streaming_sweep
+from utils.utils_IO import load_corpus
+
+
+def test_streaming_sweep_encodes_each_chunk_once(workdir, stub_embedder, monkeypatch):
+    corpus = load_corpus(write_corpus(str(workdir / "corpus.json"), 300))
+    calls = []
+
+    def counting_encode(texts, **kwargs):
+        calls.append(len(texts))
+        return encode_texts(texts, **kwargs)
+
+    monkeypatch.setattr(utils.run, "encode_texts", counting_encode)
+
+    results = kmeans_streaming_sweep([5, 10], corpus=corpus, chunk_size=64, n_epochs=3)
+
+    assert calls == [64, 64, 64, 64, 44]
+    embeddings = encode_texts(corpus["text"].tolist(), normalize=True)
+    for k, (df, model) in results.items():
+        np.testing.assert_array_equal(df["cluster"].to_numpy(), model.predict(embeddings))
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.sweep import run_sweep
+
+
+def _corpus(n=60, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+    questions = [f"pergunta {i}" for i in range(n)]
+    corpus = pd.DataFrame({"section": "qa", "question": questions, "text": questions})
+    return corpus, embeddings
+
+
+def test_run_sweep_writes_pca_plots(workdir, monkeypatch):
+    monkeypatch.setenv("ARTIFACT_FORMAT", "parquet")
+    corpus, embeddings = _corpus()
+    methods = {"top_bottom": ["biggest_inertia"], "bottom_top": ["ward"]}
+
+    results = run_sweep(16, methods=methods, corpus=corpus, embeddings=embeddings, n_workers=1, quality=False)
+
+    results_path = os.environ["RESULTS_PATH"]
+    assert set(results) == {("top_bottom", "biggest_inertia", k) for k in (5, 10, 15)} | \
+        {("bottom_top", "ward", k) for k in (5, 10, 15)}
+    for k in (5, 10, 15):
+        assert os.path.exists(f"{results_path}/Hierarchical/Top-Bottom/plots/biggest_inertia_{k}.png")
+    assert os.path.exists(f"{results_path}/Hierarchical/Bottom-top/plots/_ward.png")
+    assert len(pd.read_parquet(f"{results_path}/sweep.parquet")) == len(corpus) * len(results)
+
+
+def test_run_sweep_does_not_reuse_file_of_memmap_view(workdir, tmp_path):
+    corpus, embeddings = _corpus(n=80)
+    path = tmp_path / "embeddings.npy"
+    np.save(path, embeddings)
+    view = np.load(path, mmap_mode="r")[20:]
+    methods = {"kmeans": [None]}
+
+    results = run_sweep(11, methods=methods, corpus=corpus.iloc[20:], embeddings=view, n_workers=1, write=False)
+
+    for k in (5, 10):
+        assert len(results[("kmeans", None, k)]) == len(view)
@@ -0,0 +1,74 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import utils.tracing
+from utils.tracing import Trace, traced
+
+
+@pytest.fixture
+def trace(monkeypatch):
+    monkeypatch.setenv("TRACE", "1")
+    trace = Trace()
+    monkeypatch.setattr(utils.tracing, "_trace", trace)
+    return trace
+
+
+def test_stage_records_timing_rows_and_nesting(trace):
+    @traced("test.inner")
+    def inner(n):
+        time.sleep(0.02)
+        return list(range(n))
+
+    with trace.stage("test.outer", rows=3):
+        inner(5)
+        inner(7)
+
+    inner_events = [e for e in trace.events if e["stage"] == "test.inner"]
+    outer = next(e for e in trace.events if e["stage"] == "test.outer")
+    assert [e["rows"] for e in inner_events] == [5, 7]
+    assert all(e["parent"] == "test.outer" for e in inner_events)
+    assert outer["parent"] is None and outer["rows"] == 3
+    assert all(e["wall_s"] >= 0.02 for e in inner_events)
+    assert outer["wall_s"] >= sum(e["wall_s"] for e in inner_events)
+    assert trace.summary["test.inner"]["count"] == 2
+    assert trace.summary["test.inner"]["rows"] == 12
+
+
+def test_errors_are_flagged_and_still_recorded(trace):
+    with pytest.raises(ValueError):
+        with trace.stage("test.fails"):
+            raise ValueError("falhou")
+
+    assert trace.events[-1]["stage"] == "test.fails"
+    assert trace.events[-1]["error"] is True
+
+
+@pytest.mark.skipif(utils.tracing._rss_mb() is None, reason="RSS atual indisponível")
+def test_rss_delta_is_per_stage(trace):
+    with trace.stage("test.alloc"):
+        block = np.ones(64 * 1024 ** 2 // 8)
+    with trace.stage("test.idle"):
+        pass
+
+    alloc, idle = trace.events
+    assert alloc["rss_delta_mb"] > 32
+    assert abs(idle["rss_delta_mb"]) < 16
+    # O pico do processo não cai entre etapas: é acumulado, não por etapa
+    assert idle["process_peak_rss_mb"] >= alloc["process_peak_rss_mb"]
+    del block
+
+
+def test_write_produces_json(trace, tmp_path):
+    with trace.stage("test.stage", rows=1):
+        pass
+
+    path = trace.write(str(tmp_path / "trace.json"))
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["summary"]["test.stage"]["count"] == 1
+    assert data["stages"][0]["stage"] == "test.stage"
+    assert "process_peak_rss_mb" in data
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import utils.utils_IO
+from utils.utils_IO import load_corpus
+
+
+@pytest.fixture
+def corpus_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.utils_IO, "_corpus_cache", {})
+    path = tmp_path / "corpus.json"
+    _write(path, ["Q0?", "Q1?"])
+    return str(path)
+
+
+def _write(path, questions, mtime_ns=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"qa": {"question": questions, "answer": ["r"] * len(questions)}}, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _count_parses(monkeypatch):
+    calls = []
+    read_json = pd.read_json
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return read_json(*args, **kwargs)
+
+    monkeypatch.setattr(utils.utils_IO.pd, "read_json", counting)
+    return calls
+
+
+def test_unchanged_file_is_parsed_once(corpus_path, monkeypatch):
+    calls = _count_parses(monkeypatch)
+
+    first = load_corpus(corpus_path)
+    first.loc[0, "text"] = "alterado"
+    second = load_corpus(corpus_path)
+
+    assert len(calls) == 1
+    # Cada chamada recebe uma cópia: alterar uma não afeta o cache
+    assert second.loc[0, "text"] == "Q0? r"
+
+
+def test_new_mtime_invalidates_the_cache(corpus_path, monkeypatch):
+    calls = _count_parses(monkeypatch)
+    load_corpus(corpus_path)
+    mtime = os.stat(corpus_path).st_mtime_ns
+
+    _write(corpus_path, ["Q0?", "Q1?", "Q2?"], mtime_ns=mtime + 10 ** 9)
+    df = load_corpus(corpus_path)
+
+    assert len(calls) == 2
+    assert df["question"].tolist() == ["Q0?", "Q1?", "Q2?"]
+    # A versão antiga do mesmo arquivo é descartada
+    assert len(utils.utils_IO._corpus_cache) == 1
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import adjusted_rand_score
+
+from utils.run import kmeans_estimator, kmeans_warm_sweep
+
+
+@pytest.fixture
+def blobs():
+    # Estrutura aninhada 2 -> 4 -> 8: cada k da varredura tem uma partição clara
+    rng = np.random.default_rng(0)
+    top = rng.normal(size=(2, 16)) * 40
+    mid = top.repeat(2, axis=0) + rng.normal(size=(4, 16)) * 12
+    leaf = mid.repeat(2, axis=0) + rng.normal(size=(8, 16)) * 4
+    embeddings = (leaf[rng.integers(8, size=400)] + rng.normal(size=(400, 16))).astype(np.float32)
+    questions = [f"pergunta {i}" for i in range(len(embeddings))]
+    corpus = pd.DataFrame({"section": "qa", "question": questions, "text": questions})
+    return corpus, embeddings
+
+
+def test_warm_labels_match_cold_fit(blobs):
+    corpus, embeddings = blobs
+
+    results, stats = kmeans_warm_sweep([2, 4, 8], corpus=corpus, embeddings=embeddings, compare=True)
+
+    inertia = stats.set_index(["k", "mode"])["inertia"]
+    for k, (df, model) in results.items():
+        cold = kmeans_estimator(k).fit(embeddings)
+        assert df["cluster"].nunique() == k
+        assert adjusted_rand_score(cold.labels_, df["cluster"]) > 0.95
+        assert inertia[(k, "warm")] <= inertia[(k, "cold")] * 1.01
+
+
+def test_ks_are_sorted_and_clamped(blobs):
+    corpus, embeddings = blobs
+    corpus, embeddings = corpus.iloc[:6], embeddings[:6]
+
+    results, stats = kmeans_warm_sweep([10, 3], corpus=corpus, embeddings=embeddings)
+
+    assert list(results) == [3, 6]
+    assert stats["mode"].eq("warm").all()
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_corpus, stub_naming_server
+from utils.writer import ArtifactWriter, write_cluster_results
+
+KEYS = [("kmeans", None, 3), ("kmeans", None, 5), ("bottom_top", "ward", 4)]
+
+
+def _results():
+    corpus = make_corpus(60, n_topics=5)
+    questions = [q for section in corpus.values() for q in section["question"]]
+    df = pd.DataFrame({"question": questions})
+    rng = np.random.default_rng(0)
+    return {key: df.assign(cluster=rng.integers(key[2], size=len(df))) for key in KEYS}
+
+
+def _tree(root):
+    files = {}
+    for folder, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def _paths(root, key):
+    method, linkage, k = key
+    tag = f"{method}_{linkage or 'none'}_{k}"
+    return os.path.join(root, "csv", f"{tag}.csv"), os.path.join(root, "clusters", tag)
+
+
+def test_background_writer_matches_serial_writes(workdir):
+    results = _results()
+    serial, queued = str(workdir / "serial"), str(workdir / "queued")
+
+    with stub_naming_server():
+        for key, df in results.items():
+            write_cluster_results(df, *_paths(serial, key))
+        with ArtifactWriter(max_workers=3, fmt="files") as writer:
+            for key, df in results.items():
+                writer.write_results(df, *_paths(queued, key), key=key)
+
+    expected = _tree(serial)
+    assert len(expected) > len(KEYS)
+    assert _tree(queued) == expected
+
+
+def test_parquet_format_holds_every_combination(workdir):
+    results = _results()
+    path = str(workdir / "sweep.parquet")
+
+    with ArtifactWriter(fmt="parquet", parquet_path=path) as writer:
+        for key, df in results.items():
+            writer.write_results(df, None, None, key=key)
+
+    stored = pd.read_parquet(path)
+    for (method, linkage, k), df in results.items():
+        got = stored[(stored["method"] == method) & (stored["k"] == str(k))]
+        pd.testing.assert_frame_equal(
+            got[df.columns].reset_index(drop=True), df.reset_index(drop=True), check_dtype=False
+        )
@@ -1,9 +1,121 @@
 
 import time
 import os
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydantic import BaseModel
-from typing import Union, Optional
+from typing import Callable, Union, Optional, List
+from utils.cache import NameCache
+from utils.tracing import record_call, traced
+
+
+# Status HTTP transitórios: recebem backoff exponencial com jitter
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_limiter = None
+_request_slots = None
+_name_cache = None
+_state_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Limitador de taxa por token bucket, seguro para uso entre threads.
+
+    Permite rajadas de até `capacity` requisições e, em regime, no máximo
+    `rate` requisições por segundo. Substitui os sleeps fixos antes de cada
+    chamada: só espera quando o balde está vazio.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens repostos por segundo.
+    capacity : float
+        Tamanho máximo do balde (rajada).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloqueia até haver um token disponível e o consome."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_session() -> requests.Session:
+    """
+    Sessão HTTP compartilhada, com pool de conexões keep-alive.
+
+    O tamanho do pool acompanha AWS_MAX_CONCURRENCY (padrão 8).
+    """
+    global _session
+    with _state_lock:
+        if _session is None:
+            pool = int(os.getenv("AWS_MAX_CONCURRENCY", 8))
+            adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def get_rate_limiter() -> TokenBucket:
+    """
+    Limitador de taxa compartilhado pelo processo.
+
+    Configurado por AWS_RATE_LIMIT (requisições/s, padrão 2) e
+    AWS_RATE_BURST (rajada, padrão 4).
+    """
+    global _limiter
+    with _state_lock:
+        if _limiter is None:
+            _limiter = TokenBucket(
+                rate=float(os.getenv("AWS_RATE_LIMIT", 2)),
+                capacity=float(os.getenv("AWS_RATE_BURST", 4)),
+            )
+        return _limiter
+
+
+def get_request_slots() -> threading.BoundedSemaphore:
+    """
+    Semáforo do processo que limita as requisições HTTP simultâneas.
+
+    Com AWS_MAX_CONCURRENCY vagas (padrão 8), o mesmo tamanho do pool de
+    conexões da sessão: vários `generate_many` em paralelo (ex.: um por
+    thread do `utils.writer.ArtifactWriter`) dividem o mesmo limite.
+    """
+    global _request_slots
+    with _state_lock:
+        if _request_slots is None:
+            _request_slots = threading.BoundedSemaphore(int(os.getenv("AWS_MAX_CONCURRENCY", 8)))
+        return _request_slots
+
+
+def _backoff(attempt: int, retry_delay: float, retry_after: Optional[str] = None) -> float:
+    # Respeita Retry-After quando o servidor informa; senão, "full jitter"
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, min(60.0, retry_delay * 2 ** (attempt - 1)))
 
 
 def generate(
@@ -11,7 +123,9 @@ def generate(
     schema: Optional[BaseModel] = None,
     max_retries: int = 5,
     retry_delay: int = 10,
-    request_delay: int = 3
+    request_delay: Optional[int] = None,
+    endpoint_url: Optional[str] = None,
+    model_name: Optional[str] = None
 ) -> Union[str, BaseModel]:
     """
     Gera termos geológicos específicos a partir de um texto usando LLM da AWS.
@@ -34,10 +148,16 @@ def generate(
         Número máximo de tentativas em caso de erro antes de desistir.
         Se None, tentará indefinidamente.
     retry_delay : int, optional (default=10)
-        Tempo em segundos entre tentativas após falha.
-    request_delay : int, optional (default=3)
-        Tempo em segundos de espera antes de cada requisição
-        (rate limiting preventivo).
+        Base em segundos do backoff exponencial (com jitter) entre
+        tentativas após falha.
+    request_delay : int, optional (default=None)
+        Espera fixa opcional antes de cada requisição. Por padrão o
+        rate limiting é feito pelo token bucket compartilhado
+        (ver `get_rate_limiter`).
+    endpoint_url : str, optional
+        URL do endpoint. Padrão: variável de ambiente AWS_ENDPOINT_URL.
+    model_name : str, optional
+        Identificador do modelo. Padrão: variável de ambiente AWS_MODEL.
         
     Returns
     -------
@@ -74,15 +194,19 @@ def generate(
     ------
     EnvironmentError
         Se as variáveis de ambiente AWS_ENDPOINT_URL ou AWS_MODEL não estiverem definidas.
-    requests.exceptions.RequestException
-        Se todas as tentativas de requisição falharem após max_retries.
+    RuntimeError
+        Se todas as tentativas falharem após max_retries, ou imediatamente
+        em um status HTTP fora de RETRYABLE_STATUS (ex.: 400, 401, 403).
     ValueError
         Se a resposta da API estiver em formato inesperado.
         
     Notes
     -----
-    - A função implementa rate limiting automático (3s entre requisições)
-    - Em caso de erro, aguarda 10s antes de tentar novamente
+    - O rate limiting é feito por um token bucket compartilhado entre
+      threads (AWS_RATE_LIMIT requisições/s, rajadas de AWS_RATE_BURST)
+    - As conexões HTTP são reaproveitadas por uma sessão com pool
+    - Em caso de erro, aguarda um backoff exponencial com jitter
+      (respeitando Retry-After em respostas 429)
     - A temperatura baixa (0.1) garante respostas mais determinísticas
     - O prompt é otimizado para extrair termos técnicos de geologia
     - A função tenta indefinidamente por padrão (pode ser limitado com max_retries)
@@ -92,15 +216,17 @@ def generate(
     - Certifique-se de que as credenciais AWS estão configuradas corretamente
     - Custos da AWS são incorridos a cada chamada da API
     - Textos muito longos podem exceder o limite de tokens do modelo
-    - O delay de 3s pode tornar processamento em lote lento
+    - Para nomear muitos textos, prefira `generate_many`, que faz as
+      chamadas em paralelo
     
     See Also
     --------
+    generate_many : Versão concorrente para vários textos
     requests.post : Documentação da biblioteca requests
     pydantic.BaseModel : Sistema de validação de dados
     """
-    endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-    model_name = os.getenv("AWS_MODEL")
+    endpoint_url = endpoint_url or os.getenv("AWS_ENDPOINT_URL")
+    model_name = model_name or os.getenv("AWS_MODEL")
     
     if not endpoint_url:
         raise EnvironmentError(
@@ -131,21 +257,30 @@ def generate(
         "max_tokens": 4096  
     }
     
+    session = get_session()
+    limiter = get_rate_limiter()
+    slots = get_request_slots()
     attempt = 0
+    started = time.perf_counter()
     
     while max_retries is None or attempt < max_retries:
         attempt += 1
+        wait = None
         
         # Rate limiting preventivo
-        time.sleep(request_delay)
+        if request_delay:
+            time.sleep(request_delay)
+        limiter.acquire()
         
         try:
-            response = requests.post(
-                endpoint_url,
-                json=body,
-                headers=headers,
-                timeout=60  # Timeout de 60 segundos
-            )
+            # A vaga só é ocupada durante a requisição, não no backoff
+            with slots:
+                response = session.post(
+                    endpoint_url,
+                    json=body,
+                    headers=headers,
+                    timeout=60  # Timeout de 60 segundos
+                )
             
             response.raise_for_status()
             
@@ -155,31 +290,188 @@ def generate(
 
             # Retorna diretamente se já for string
             if isinstance(output, str):
+                record_call("llm.generate", time.perf_counter() - started, ok=True, attempts=attempt)
                 return output
 
             # Navega pela estrutura: response > output > message > content > text
             extracted_text = output["response"]["output"]["message"]["content"][0]["text"]
+            record_call("llm.generate", time.perf_counter() - started, ok=True, attempts=attempt)
             return extracted_text
             
         except requests.exceptions.Timeout:
-            print(f"Timeout na requisição (tentativa {attempt}/{max_retries}). Tentando novamente em {retry_delay}s...")
+            wait = _backoff(attempt, retry_delay)
+            print(f"Timeout na requisição (tentativa {attempt}/{max_retries}). Tentando novamente em {wait:.1f}s...")
             
         except requests.exceptions.HTTPError as e:
-            print(f"Erro HTTP {e.response.status_code}: {e}. Tentando novamente em {retry_delay}s...")
+            status = e.response.status_code
+            retry_after = e.response.headers.get("Retry-After") if status == 429 else None
+            if status not in RETRYABLE_STATUS:
+                # Erros do cliente (400, 401, 403, ...) não melhoram com nova tentativa
+                record_call("llm.generate", time.perf_counter() - started, ok=False, attempts=attempt)
+                raise RuntimeError(f"Erro HTTP {status} não recuperável: {e}") from e
+            wait = _backoff(attempt, retry_delay, retry_after)
+            print(f"Erro HTTP {status}: {e}. Tentando novamente em {wait:.1f}s...")
             
         except KeyError as e:
-            print(f"Estrutura de resposta inesperada. Chave ausente: {e}. Tentando novamente em {retry_delay}s...")
+            wait = _backoff(attempt, retry_delay)
+            print(f"Estrutura de resposta inesperada. Chave ausente: {e}. Tentando novamente em {wait:.1f}s...")
             
         except Exception as e:
-            print(f"Erro inesperado na geração: {e}. Tentando novamente em {retry_delay}s...")
+            wait = _backoff(attempt, retry_delay)
+            print(f"Erro inesperado na geração: {e}. Tentando novamente em {wait:.1f}s...")
         
 
         if max_retries is None or attempt < max_retries:
-            time.sleep(retry_delay)
+            time.sleep(wait)
     
    
+    record_call("llm.generate", time.perf_counter() - started, ok=False, attempts=attempt)
     raise RuntimeError(
         f"Falha ao gerar termos após {max_retries} tentativas. "
         "Verifique a conexão, credenciais AWS e logs acima."
     )
 
+
+def generate_many(
+    input_texts: List[str],
+    max_workers: Optional[int] = None,
+    on_result: Optional[Callable[[int, Union[str, BaseModel]], None]] = None,
+    **kwargs
+) -> List[Union[str, BaseModel]]:
+    """
+    Gera termos para vários textos em paralelo.
+
+    As chamadas compartilham a sessão HTTP com pool de conexões e o token
+    bucket de `generate`, de modo que a concorrência não ultrapassa o
+    limite de taxa configurado.
+
+    Parameters
+    ----------
+    input_texts : list of str
+        Textos a serem resumidos (por exemplo, um por cluster).
+    max_workers : int, optional
+        Número máximo de requisições simultâneas desta chamada. Padrão:
+        variável de ambiente AWS_MAX_CONCURRENCY ou 8. O total do processo,
+        somando chamadas concorrentes, nunca passa de AWS_MAX_CONCURRENCY
+        (ver `get_request_slots`).
+    on_result : callable, optional
+        Chamado como `on_result(i, resultado)` assim que o texto `i` termina,
+        antes das demais chamadas (ex.: para gravar no cache o que já foi
+        pago mesmo que outra chamada falhe).
+    **kwargs
+        Repassados para `generate` (max_retries, retry_delay, endpoint_url...).
+
+    Returns
+    -------
+    list
+        Resultados de `generate`, na mesma ordem de `input_texts`.
+
+    Raises
+    ------
+    RuntimeError
+        A primeira falha de `generate`, relançada depois que todas as
+        chamadas terminam (as bem-sucedidas já passaram por `on_result`).
+
+    Examples
+    --------
+    >>> nomes = generate_many(["texto do cluster 0", "texto do cluster 1"])
+    >>> nomes
+    ['granito_plutonica_faneritica', 'basalto_vulcanica_afanitica']
+    """
+    input_texts = list(input_texts)
+    if not input_texts:
+        return []
+    max_workers = max_workers or int(os.getenv("AWS_MAX_CONCURRENCY", 8))
+    results = [None] * len(input_texts)
+    errors = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(input_texts))) as pool:
+        futures = {pool.submit(generate, text, **kwargs): i for i, text in enumerate(input_texts)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as exc:  # as demais chamadas continuam
+                errors.append(exc)
+                continue
+            if on_result is not None:
+                on_result(i, results[i])
+    if errors:
+        raise errors[0]
+    return results
+
+
+def get_name_cache() -> Optional[NameCache]:
+    """
+    Cache de nomes de clusters compartilhado pelo processo.
+
+    Desativado definindo NAME_CACHE=0.
+    """
+    global _name_cache
+    if os.getenv("NAME_CACHE", "1") == "0":
+        return None
+    with _state_lock:
+        if _name_cache is None:
+            _name_cache = NameCache()
+        return _name_cache
+
+
+@traced("aws.generate_cluster_names")
+def generate_cluster_names(
+    member_texts: List[List[str]],
+    max_workers: Optional[int] = None,
+    **kwargs
+) -> List[str]:
+    """
+    Nomeia clusters a partir de seus textos membros, consultando o cache.
+
+    Clusters cujo conjunto de membros já foi nomeado (exatamente ou, se
+    configurado, por sobreposição de Jaccard) reaproveitam o nome salvo;
+    apenas os demais são enviados ao LLM, em paralelo via `generate_many`.
+
+    Parameters
+    ----------
+    member_texts : list of list of str
+        Textos membros de cada cluster.
+    max_workers : int, optional
+        Concorrência máxima das chamadas ao LLM.
+    **kwargs
+        Repassados para `generate`.
+
+    Returns
+    -------
+    list of str
+        Nome de cada cluster, na mesma ordem de `member_texts`.
+
+    Raises
+    ------
+    RuntimeError
+        Se alguma chamada ao LLM falhar; os nomes gerados pelas demais já
+        estão no cache, e uma nova execução só refaz os que faltam.
+
+    Examples
+    --------
+    >>> generate_cluster_names([["q1", "q2"], ["q3"]])
+    ['granito_gnaisse_xisto', 'basalto_vulcanica_afanitica']
+    >>> get_name_cache().stats()["hit_rate"]
+    0.0
+    """
+    cache = get_name_cache()
+    model = kwargs.get("model_name") or os.getenv("AWS_MODEL") or ""
+    names = [cache.get(texts, model) if cache is not None else None for texts in member_texts]
+
+    missing = [i for i, name in enumerate(names) if name is None]
+
+    def store(j, name):
+        # Cada nome vai para o cache ao chegar: uma falha em outro cluster
+        # não descarta os nomes já gerados (e pagos)
+        names[missing[j]] = name
+        if cache is not None:
+            cache.put(member_texts[missing[j]], name, model)
+
+    generate_many(
+        ["\n".join(str(t) for t in member_texts[i]) for i in missing],
+        max_workers=max_workers,
+        on_result=store,
+        **kwargs
+    )
+    return names
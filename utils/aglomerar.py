@@ -9,10 +9,26 @@ armazenados em arquivos JSON.
 import os
 import pandas as pd
 import json
-from utils.metrics import split_metrics
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from utils.metrics import split_metrics_frame
+from utils.tracing import traced
 
+try:
+    import ijson
+except ImportError:  # parser incremental é opcional
+    ijson = None
 
-def aglomerar(folder):
+try:
+    import pyarrow
+except ImportError:  # cache colunar em Parquet é opcional
+    pyarrow = None
+
+MANIFEST_NAME = "manifest.json"
+
+
+@traced("aglomerar.aglomerar")
+def aglomerar(folder, n_jobs=None, stream_bytes=None, cache_dir=None):
     """
     Agrega dados de métricas de múltiplos arquivos JSON em um único DataFrame.
     
@@ -33,15 +49,37 @@ def aglomerar(folder):
     ----------
     folder : str
         Caminho para a pasta contendo os arquivos JSON com dados de métricas
+    n_jobs : int, optional
+        Número de processos usados no parse dos arquivos. Padrão: variável
+        de ambiente AGLOMERAR_WORKERS ou o número de CPUs; se a pasta
+        somar menos que AGLOMERAR_PARALLEL_BYTES (padrão 32 MB), a leitura
+        é serial, pois iniciar o pool custa mais que o parse. Com 1, os
+        arquivos são lidos no processo atual.
+    stream_bytes : int, optional
+        Arquivos maiores que este tamanho (em bytes) são lidos com o parser
+        incremental `ijson`, se instalado, sem carregar a árvore JSON
+        inteira. Padrão: variável de ambiente AGLOMERAR_STREAM_BYTES ou
+        256 MB.
+    cache_dir : str, optional
+        Ativa o modo incremental: pasta onde ficam o manifesto (nome,
+        tamanho, mtime e hash de cada arquivo) e uma cópia Parquet das
+        linhas já achatadas de cada arquivo. Apenas arquivos novos ou
+        alterados são lidos novamente; os demais são lidos do cache com
+        memory map. Cada pasta de resultados tem sua própria subpasta no
+        cache (hash do caminho absoluto), de modo que alternar entre pastas
+        não invalida o cache das outras. Padrão: variável de ambiente
+        AGLOMERAR_CACHE_DIR (ausente desativa). Requer pyarrow. Arquivos
+        com colunas de tipos misturados ou listas são guardados em pickle,
+        para que a leitura do cache devolva o mesmo DataFrame.
         
     Returns
     -------
     pandas.DataFrame
         DataFrame consolidado contendo todas as métricas de todos os modelos,
         com as seguintes colunas principais:
-        - model: Nome do modelo extraído do nome do arquivo
-        - task: Nome da tarefa extraída do nome do arquivo
-        - Colunas adicionais de metricsData (expandidas via split_metrics)
+        - model: Nome do modelo extraído do nome do arquivo (categórica)
+        - task: Nome da tarefa extraída do nome do arquivo (categórica)
+        - Colunas adicionais de metricsData (expandidas via split_metrics_frame)
         - Outras colunas presentes em testCases
         
     Structure do JSON Esperado
@@ -69,10 +107,17 @@ def aglomerar(folder):
     
     Notes
     -----
-    - Apenas arquivos com extensão .json são processados
-    - A função split_metrics deve estar disponível em utils.metrics
-    - Os dados de metricsData são expandidos em colunas separadas
+    - Apenas arquivos com extensão .json são processados, em ordem alfabética
+    - Os arquivos são lidos em paralelo em um pool de processos, exceto
+      em pastas pequenas (ver `n_jobs`)
+    - Os dados de metricsData são expandidos em colunas separadas em uma
+      única passada colunar (utils.metrics.split_metrics_frame)
     - Todos os DataFrames são concatenados ignorando o índice original
+    - As colunas model e task usam dtype categórico; agrupe com
+      `observed=True` para não gerar combinações inexistentes
+    - No modo incremental, arquivos removidos da pasta são descartados
+      do cache; um arquivo com mtime alterado mas conteúdo idêntico
+      (mesmo hash) não é relido
     
     Raises
     ------
@@ -83,34 +128,198 @@ def aglomerar(folder):
     KeyError
         Se a estrutura JSON não contiver a chave "testCases"
     """
-    dfs = []
+    names = sorted(f for f in os.listdir(folder) if f.endswith(".json"))
+    paths = [os.path.join(folder, f) for f in names]
+    if stream_bytes is None:
+        stream_bytes = int(os.getenv("AGLOMERAR_STREAM_BYTES", 256 * 1024 ** 2))
+    if n_jobs is None:
+        n_jobs = int(os.getenv("AGLOMERAR_WORKERS", os.cpu_count() or 1))
+        # Pastas pequenas: o parse serial termina antes de o pool subir
+        parallel_bytes = int(os.getenv("AGLOMERAR_PARALLEL_BYTES", 32 * 1024 ** 2))
+        if sum(os.path.getsize(p) for p in paths) < parallel_bytes:
+            n_jobs = 1
+    n_jobs = max(1, min(n_jobs, len(paths)))
+
+    cache_dir = cache_dir or os.getenv("AGLOMERAR_CACHE_DIR")
+    if cache_dir and pyarrow is None:
+        print("pyarrow não instalado: modo incremental desativado, lendo todos os arquivos.")
+        cache_dir = None
+
+    if cache_dir:
+        dfs = _load_incremental(folder, names, cache_dir, n_jobs, stream_bytes)
+    elif n_jobs == 1:
+        dfs = [load_results_file(p, stream_bytes) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            dfs = list(pool.map(load_results_file, paths, [stream_bytes] * len(paths)))
+
+    # Combina todos os DataFrames em um único
+    df = pd.concat(dfs, ignore_index=True)
+    df["model"] = df["model"].astype("category")
+    df["task"] = df["task"].astype("category")
+    return df
+
+
+def parse_results_filename(fname):
+    """
+    Extrai (modelo, tarefa) do nome de um arquivo de resultados.
+
+    Segue a convenção `prefix_modelname_task.json` ou
+    `prefix_modelname_suffix_task.json` descrita em `aglomerar`.
+    """
+    parts = fname.replace(".json", "").split("_")
+    task = parts[-1]
+    # Determina o nome do modelo baseado na estrutura do nome
+    if parts[2] == task:
+        model_name = parts[1]
+    else:
+        # Formato: prefix_modelname_suffix_task
+        model_name = parts[1] + "_" + parts[2]
+    return model_name, task
+
+
+def load_results_file(path, stream_bytes=256 * 1024 ** 2):
+    """
+    Lê um arquivo de resultados e retorna seus testCases já achatados.
+
+    Parameters
+    ----------
+    path : str
+        Caminho do arquivo JSON.
+    stream_bytes : int, optional
+        Acima deste tamanho, usa `ijson` (se instalado) para ler os
+        testCases incrementalmente.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Colunas de testCases (sem metricsData), model, task e as colunas
+        de métricas.
+    """
+    model_name, task = parse_results_filename(os.path.basename(path))
+
+    if ijson is not None and os.path.getsize(path) > stream_bytes:
+        cases = []
+        with open(path, "rb") as f:
+            for case in ijson.items(f, "testCases.item", use_float=True):
+                cases.append(case)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            cases = json.load(f)["testCases"]
+
+    # Separa metricsData antes de montar o DataFrame
+    metrics = [case.pop("metricsData", None) for case in cases]
+
+    df = pd.DataFrame(cases)
+    df["model"] = model_name
+    df["task"] = task
+
+    return pd.concat([df, split_metrics_frame(metrics, index=df.index)], axis=1)
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 ** 2), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _parquet_safe(df):
+    # Colunas object só vão para o Parquet com um único tipo escalar: tipos
+    # misturados (ex.: success True e "true") quebram a conversão do pyarrow,
+    # e listas voltariam como np.ndarray
+    for col in df.columns[df.dtypes == object]:
+        types = {type(v) for v in df[col] if v is not None and v == v}
+        if len(types) > 1 or not types <= {str, bool, int, float}:
+            return False
+    return True
+
+
+def _cache_results_file(path, out_base, stream_bytes):
+    # Executado nos workers: grava o cache direto, sem devolver o DataFrame.
+    # Parquet quando as colunas permitem; senão pickle, que preserva os
+    # valores como o JSON os trouxe
+    df = load_results_file(path, stream_bytes)
+    if _parquet_safe(df):
+        out_path = f"{out_base}.parquet"
+        df.to_parquet(out_path, index=False)
+    else:
+        out_path = f"{out_base}.pkl"
+        df.to_pickle(out_path)
+    return len(df), os.path.basename(out_path)
 
-    for fname in os.listdir(folder):
-        # Processa apenas arquivos JSON
-        if not fname.endswith(".json"):
+
+def _read_cached(path):
+    if path.endswith(".pkl"):
+        return pd.read_pickle(path)
+    return pd.read_parquet(path, memory_map=True)
+
+
+def _load_incremental(folder, names, cache_dir, n_jobs, stream_bytes):
+    # Manifesto e Parquet por pasta de origem: a limpeza abaixo só remove
+    # entradas da própria pasta
+    folder_key = hashlib.sha256(os.path.abspath(folder).encode("utf-8")).hexdigest()[:16]
+    cache_dir = os.path.join(cache_dir, folder_key)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    current = {}
+    stale = []
+    for name in names:
+        path = os.path.join(folder, name)
+        st = os.stat(path)
+        entry = manifest.get(name)
+        cached = entry is not None and os.path.exists(os.path.join(cache_dir, entry["cache"]))
+
+        if cached and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            current[name] = entry
             continue
-        # Extrai informações do nome do arquivo
-        parts = fname.replace(".json", "").split("_")
-        task = parts[-1]  
-        # Determina o nome do modelo baseado na estrutura do nome
-        if parts[2] == task: 
-            model_name = parts[1]
-        else: 
-            # Formato: prefix_modelname_suffix_task
-            model_name = parts[1] + "_" + parts[2]
-        
-        with open(os.path.join(folder, fname), 'r', encoding='utf-8') as f:
-            data = json.load(f)["testCases"]
 
-        df = pd.DataFrame(data)
-        df["model"] = model_name
-        df["task"] = task
-        
-        metrics_df = df["metricsData"].apply(split_metrics).apply(pd.Series)
-        df = pd.concat([df.drop(columns=["metricsData"]), metrics_df], axis=1)
+        digest = _file_hash(path)
+        if cached and entry["sha256"] == digest:
+            # Só o mtime mudou (ex.: arquivo copiado novamente)
+            current[name] = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            continue
 
-        dfs.append(df)
+        current[name] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+            # model/task vêm do nome do arquivo: o nome entra na chave do
+            # cache; a extensão é definida na gravação
+            "cache": hashlib.sha256(f"{name}\0{digest}".encode()).hexdigest()[:32],
+        }
+        stale.append(name)
 
-    # Combina todos os DataFrames em um único
-    return pd.concat(dfs, ignore_index=True)
+    # Lê apenas os arquivos novos ou alterados
+    if stale:
+        paths = [os.path.join(folder, n) for n in stale]
+        outs = [os.path.join(cache_dir, current[n]["cache"]) for n in stale]
+        workers = max(1, min(n_jobs, len(stale)))
+        if workers == 1:
+            rows = [_cache_results_file(p, o, stream_bytes) for p, o in zip(paths, outs)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(_cache_results_file, paths, outs, [stream_bytes] * len(paths)))
+        for name, (n_rows, cache_name) in zip(stale, rows):
+            current[name]["rows"] = n_rows
+            current[name]["cache"] = cache_name
+
+    # Remove do cache os arquivos que saíram da pasta (ou foram substituídos)
+    in_use = {entry["cache"] for entry in current.values()}
+    for name, entry in manifest.items():
+        cache_path = os.path.join(cache_dir, entry["cache"])
+        if entry["cache"] not in in_use and os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    os.replace(tmp_path, manifest_path)
 
+    return [_read_cached(os.path.join(cache_dir, current[name]["cache"])) for name in names]
@@ -1,15 +1,22 @@
+import os
 import pandas as pd
 import numpy as np
 from typing import Any
+from scipy import sparse
+from utils.embeddings import encode_texts, load_embeddings, unique_texts
 
 
-def assign_clusters(model_df, embed_model, kmeans):
+def assign_clusters(model_df, embed_model, kmeans, model_name=None, embeddings=None,
+                    train_embeddings=None, metric="euclidean", chunk_size=None):
     """
-    Atribui clusters a textos usando embeddings e modelo K-means.
+    Atribui clusters a textos usando embeddings e um clustering já ajustado.
     
     Esta função realiza três operações principais:
-    1. Gera embeddings normalizados para os textos de entrada
-    2. Prevê os clusters usando o modelo K-means treinado
+    1. Obtém os centróides do clustering (ver `CentroidAssigner.from_model`)
+       ou, se o predict() do modelo não é o do centróide mais próximo,
+       usa o próprio predict()
+    2. Gera embeddings normalizados para os textos de entrada, em blocos,
+       e atribui cada bloco
     3. Adiciona a coluna 'cluster' ao DataFrame original
     
     Parameters
@@ -17,19 +24,41 @@ def assign_clusters(model_df, embed_model, kmeans):
     model_df : pandas.DataFrame
         DataFrame contendo os dados a serem clusterizados.
         Deve conter uma coluna 'input' com os textos para análise.
-    embed_model : SentenceTransformer ou similar
+    embed_model : SentenceTransformer ou similar, ou None
         Modelo de embeddings pré-treinado que implementa o método encode().
         Exemplos: SentenceTransformer, OpenAI embeddings, etc.
-    kmeans : sklearn.cluster.KMeans ou similar
-        Modelo K-means já treinado que implementa o método predict().
-        Deve ter sido previamente ajustado com fit() em dados similares.
+        Se None, o modelo `model_name` (padrão "all-MiniLM-L6-v2") só é
+        carregado quando algum texto não estiver no cache de embeddings.
+    kmeans : sklearn.cluster.KMeans, BisectingKMeans, AgglomerativeClustering ou similar
+        Clustering já ajustado. KMeans e MiniBatchKMeans usam
+        `cluster_centers_`; modelos sem predict() (ex.:
+        AgglomerativeClustering) usam a média de `train_embeddings` por
+        rótulo de `labels_`. Os demais (ex.: BisectingKMeans, cujo predict()
+        desce a árvore de bisecções) usam o próprio predict(), bloco a bloco.
+    model_name : str, optional
+        Nome do modelo de embeddings, usado como parte da chave do cache.
+        Com um `embed_model` próprio, informe-o para aproveitar o cache
+        (ver `utils.embeddings.encode_texts`).
+    embeddings : np.ndarray ou str, optional
+        Embeddings já calculados para `model_df["input"]`, linha a linha, ou
+        o caminho de um artefato de embeddings (aberto com memory map). Se
+        informado, nenhum texto é codificado.
+    train_embeddings : np.ndarray ou str, optional
+        Embeddings usados no ajuste, obrigatórios para modelos sem
+        `cluster_centers_`.
+    metric : {'cosine', 'euclidean'}, optional (default='euclidean')
+        Critério de proximidade ao centróide (ver `CentroidAssigner`).
+        'euclidean' reproduz o predict() do KMeans. Ignorado quando o
+        predict() do modelo é usado.
+    chunk_size : int, optional
+        Linhas codificadas e atribuídas por bloco. Padrão: variável de
+        ambiente ASSIGN_CHUNK_SIZE ou 65536.
         
     Returns
     -------
     pandas.DataFrame
         DataFrame original com uma nova coluna 'cluster' contendo
-        os índices dos clusters atribuídos (0 a k-1, onde k é o
-        número de clusters do modelo K-means).
+        os rótulos dos clusters atribuídos.
         
     Examples
     --------
@@ -60,36 +89,217 @@ def assign_clusters(model_df, embed_model, kmeans):
     Notes
     -----
     - A coluna 'input' é convertida para string antes da geração de embeddings
+    - Textos repetidos são codificados e atribuídos uma única vez
     - Os embeddings são normalizados (normalize_embeddings=True) para garantir
       que todos os vetores tenham magnitude unitária
     - Uma barra de progresso é exibida durante a geração dos embeddings
+      quando os textos cabem em um único bloco
+    - A memória fica limitada a um bloco de `chunk_size` embeddings
     - A função modifica o DataFrame original adicionando a coluna 'cluster'
     - Valores NaN ou None na coluna 'input' são convertidos para string "nan"
     
     Warnings
     --------
-    - Certifique-se de que o modelo K-means foi treinado com embeddings
+    - Certifique-se de que o clustering foi treinado com embeddings
       do mesmo modelo de embedding usado aqui
-    - A dimensionalidade dos embeddings deve corresponder à esperada pelo K-means
-    - DataFrame grandes podem consumir muita memória durante a geração de embeddings
+    - A dimensionalidade dos embeddings deve corresponder à dos centróides
     
     See Also
     --------
+    CentroidAssigner : Atribuição em blocos pelo centróide mais próximo
     sklearn.cluster.KMeans : Algoritmo de clustering K-means
     sentence_transformers.SentenceTransformer : Modelo de embeddings de texto
     """
-    # Gera embeddings normalizados para todos os textos
+    assigner = _model_assigner(kmeans, train_embeddings, metric)
+
+    embeddings = load_embeddings(embeddings)
+    if embeddings is not None:
+        model_df["cluster"] = assigner.predict(embeddings, chunk_size)
+        return model_df
+
+    # Codifica e atribui bloco a bloco: só um bloco de embeddings em memória
     # - astype(str): converte todos os valores para string (trata NaN, números, etc.)
-    # - tolist(): converte Series do pandas para lista Python
-    # - normalize_embeddings=True: normaliza vetores para magnitude unitária
-    # - show_progress_bar=True: mostra barra de progresso durante processamento
-    embeddings = embed_model.encode(
-        model_df["input"].astype(str).tolist(),
-        normalize_embeddings=True,
-        show_progress_bar=True
-    )
-
-    # Prevê o cluster mais próximo para cada embedding
-    model_df["cluster"] = kmeans.predict(embeddings)
-    
-    return model_df
\ No newline at end of file
+    # - cada texto distinto é codificado e atribuído uma vez; o rótulo volta
+    #   para as linhas repetidas pelo índice inverso
+    # - embeddings já calculados são lidos do cache em disco (utils.cache)
+    texts, inverse = unique_texts(model_df["input"].astype(str))
+    chunk_size = _chunk_size(chunk_size)
+    labels = None
+    for start in range(0, len(texts), chunk_size):
+        block = encode_texts(
+            texts[start:start + chunk_size],
+            embed_model=embed_model,
+            model_name=model_name,
+            normalize=True,
+            show_progress_bar=len(texts) <= chunk_size,
+        )
+        assigned = assigner.predict(block, chunk_size)
+        if labels is None:
+            labels = np.empty(len(texts), dtype=assigned.dtype)
+        labels[start:start + chunk_size] = assigned
+
+    model_df["cluster"] = labels[inverse] if labels is not None else np.empty(0, dtype=np.int64)
+    return model_df
+
+
+def _chunk_size(chunk_size):
+    return max(1, int(chunk_size or os.getenv("ASSIGN_CHUNK_SIZE", 65536)))
+
+
+def _model_assigner(model, train_embeddings, metric):
+    # predict() do KMeans é o centróide mais próximo: vira produto de
+    # matrizes. Outros modelos com predict() (BisectingKMeans) mantêm o seu
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    if hasattr(model, "predict") and not isinstance(model, (KMeans, MiniBatchKMeans)):
+        return _ModelPredictor(model)
+    return CentroidAssigner.from_model(model, train_embeddings, metric=metric)
+
+
+class _ModelPredictor:
+    # Mesma interface de CentroidAssigner.predict, em blocos
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, embeddings, chunk_size=None):
+        embeddings = load_embeddings(embeddings)
+        chunk_size = _chunk_size(chunk_size)
+        blocks = [self.model.predict(np.asarray(embeddings[start:start + chunk_size], dtype=np.float32))
+                  for start in range(0, len(embeddings), chunk_size)]
+        return np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+
+
+class CentroidAssigner:
+    """
+    Atribui embeddings ao centróide mais próximo de um clustering fixo.
+
+    A atribuição é um produto de matrizes em blocos (BLAS) seguido de
+    argmax, igual para qualquer algoritmo: basta ter os centróides, que
+    podem vir do modelo (`cluster_centers_`) ou de qualquer rotulação
+    (`from_labels`), inclusive aglomerativa.
+
+    Parameters
+    ----------
+    centroids : np.ndarray, shape (k, dim)
+        Centróides dos clusters.
+    clusters : array-like, shape (k,), optional
+        Rótulo de cada centróide. Padrão: 0..k-1.
+    metric : {'cosine', 'euclidean'}, optional (default='cosine')
+        'cosine' normaliza os centróides e maximiza x·c (para embeddings
+        de norma unitária, a similaridade de cosseno). 'euclidean' maximiza
+        x·c - ||c||²/2, equivalente à menor distância euclidiana e ao
+        predict() do KMeans.
+
+    Examples
+    --------
+    >>> assigner = CentroidAssigner.from_labels(embeddings, labels)
+    >>> assigner.predict(eval_embeddings, chunk_size=100_000)
+    array([3, 0, 3, ...])
+    """
+
+    def __init__(self, centroids, clusters=None, metric="cosine"):
+        centroids = np.asarray(centroids, dtype=np.float64)
+        if metric == "cosine":
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids = centroids / np.maximum(norms, 1e-12)
+            bias = np.zeros(len(centroids))
+        elif metric == "euclidean":
+            # argmin ||x - c||² = argmax (x·c - ||c||²/2)
+            bias = -0.5 * (centroids ** 2).sum(axis=1)
+        else:
+            raise ValueError(f"Métrica de atribuição desconhecida: {metric}")
+
+        self.metric = metric
+        self.clusters = np.arange(len(centroids)) if clusters is None else np.asarray(clusters)
+        self.centroids = centroids.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+
+    @classmethod
+    def from_labels(cls, embeddings, labels, metric="cosine", chunk_size=None):
+        """
+        Calcula os centróides (médias por rótulo) de uma rotulação qualquer.
+
+        `embeddings` pode ser um memory map ou o caminho de um artefato: as
+        somas são acumuladas em blocos de `chunk_size` linhas.
+        """
+        embeddings = load_embeddings(embeddings)
+        labels = np.asarray(labels)
+        clusters, inverse = np.unique(labels, return_inverse=True)
+        k, n = len(clusters), len(labels)
+
+        sums = np.zeros((k, embeddings.shape[1]), dtype=np.float64)
+        chunk_size = _chunk_size(chunk_size)
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            # Matriz indicadora (k, bloco): a soma por cluster vira um produto esparso
+            indicator = sparse.csr_matrix(
+                (np.ones(stop - start), (inverse[start:stop], np.arange(stop - start))),
+                shape=(k, stop - start),
+            )
+            sums += indicator @ np.asarray(embeddings[start:stop], dtype=np.float64)
+
+        centroids = sums / np.bincount(inverse, minlength=k)[:, None]
+        return cls(centroids, clusters, metric)
+
+    @classmethod
+    def from_model(cls, model, embeddings=None, metric="cosine"):
+        """
+        Obtém os centróides de um modelo ajustado.
+
+        Usa `cluster_centers_` quando existe (KMeans, BisectingKMeans,
+        MiniBatchKMeans); caso contrário, `labels_` e os `embeddings` do
+        ajuste (AgglomerativeClustering).
+
+        No BisectingKMeans o centróide mais próximo não equivale ao
+        predict() do modelo, que desce a árvore de bisecções;
+        `assign_clusters` usa o predict() nesse caso.
+        """
+        if hasattr(model, "cluster_centers_"):
+            return cls(model.cluster_centers_, metric=metric)
+        if embeddings is None or not hasattr(model, "labels_"):
+            raise ValueError(
+                "Modelos sem cluster_centers_ exigem labels_ e os embeddings usados no ajuste."
+            )
+        return cls.from_labels(embeddings, model.labels_, metric)
+
+    def predict(self, embeddings, chunk_size=None):
+        """
+        Rótulo do centróide mais próximo de cada linha de `embeddings`.
+
+        Processa `chunk_size` linhas por vez, de modo que a matriz de scores
+        nunca passa de (chunk_size, k).
+        """
+        embeddings = load_embeddings(embeddings)
+        n = len(embeddings)
+        out = np.empty(n, dtype=self.clusters.dtype)
+        chunk_size = _chunk_size(chunk_size)
+        for start in range(0, n, chunk_size):
+            block = np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+            scores = block @ self.centroids.T
+            scores += self.bias
+            out[start:start + chunk_size] = self.clusters[np.argmax(scores, axis=1)]
+        return out
+
+
+def assign_by_centroids(query_embeddings, embeddings, labels):
+    """
+    Atribui cada embedding de consulta ao cluster de centróide mais próximo.
+
+    Permite atribuir clusters a partir de qualquer rotulação já ajustada,
+    inclusive de modelos sem predict() (ex.: AgglomerativeClustering).
+
+    Parameters
+    ----------
+    query_embeddings : np.ndarray, shape (m, dim)
+        Embeddings a serem atribuídos.
+    embeddings : np.ndarray, shape (n, dim), ou str
+        Embeddings usados no ajuste do clustering, ou o caminho do artefato
+        de embeddings correspondente.
+    labels : array-like, shape (n,)
+        Rótulo de cluster de cada linha de `embeddings`.
+
+    Returns
+    -------
+    np.ndarray, shape (m,)
+        Rótulo do centróide mais próximo (distância euclidiana).
+    """
+    return CentroidAssigner.from_labels(embeddings, labels, metric="euclidean").predict(query_embeddings)
@@ -0,0 +1,385 @@
+"""
+Cache Module
+============
+
+Caches persistentes em disco usados pela pipeline para não repetir
+trabalho caro entre execuções (por exemplo, gerar embeddings de textos
+que já foram codificados em uma varredura anterior).
+
+Também guarda os nomes de clusters gerados pelo LLM, para que clusters
+idênticos (ou quase idênticos) não sejam enviados ao endpoint duas vezes.
+
+Os caches são armazenados em SQLite (biblioteca padrão), com limite de
+tamanho e descarte LRU (least recently used).
+"""
+
+import os
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+
+# SQLite limita o número de parâmetros por consulta
+_SQL_CHUNK = 500
+
+
+def text_key(*parts):
+    """
+    Gera uma chave de conteúdo (SHA-256) a partir de partes textuais.
+
+    Parameters
+    ----------
+    *parts : Any
+        Partes que compõem a chave. São convertidas para string e
+        separadas por um byte nulo antes do hash.
+
+    Returns
+    -------
+    str
+        Hash hexadecimal da concatenação.
+    """
+    h = hashlib.sha256()
+    for i, part in enumerate(parts):
+        if i:
+            h.update(b"\0")
+        h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Armazena embeddings em disco, endereçados por (modelo, normalização, texto).
+
+    Cada entrada guarda o vetor float32 de um único texto. Ao ultrapassar
+    `max_entries`, as entradas usadas há mais tempo são descartadas.
+
+    Parameters
+    ----------
+    path : str, optional
+        Caminho do arquivo SQLite. Padrão: variável de ambiente
+        EMBEDDING_CACHE_PATH ou "./.cache/embeddings.sqlite".
+    max_entries : int, optional
+        Número máximo de vetores armazenados. Padrão: variável de
+        ambiente EMBEDDING_CACHE_MAX_ENTRIES ou 500000.
+
+    Attributes
+    ----------
+    hits : int
+        Número de textos encontrados no cache.
+    misses : int
+        Número de textos que precisaram ser codificados.
+
+    Examples
+    --------
+    >>> cache = EmbeddingCache("/tmp/emb.sqlite", max_entries=1000)
+    >>> keys = [cache.key("all-MiniLM-L6-v2", True, t) for t in textos]
+    >>> found = cache.get_many(keys)
+    >>> cache.stats()
+    {'hits': 0, 'misses': 3, 'entries': 0, 'hit_rate': 0.0}
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", "./.cache/embeddings.sqlite")
+        self.max_entries = int(max_entries or os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 500000))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER, vec BLOB, last_used REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(model_name, normalize, text):
+        """Chave de cache de um texto para um modelo e flag de normalização."""
+        return text_key(model_name, int(bool(normalize)), text)
+
+    def get_many(self, keys):
+        """
+        Busca vetores pelas chaves fornecidas.
+
+        Parameters
+        ----------
+        keys : list of str
+            Chaves geradas por `EmbeddingCache.key`.
+
+        Returns
+        -------
+        dict
+            Mapeamento chave -> np.ndarray (float32) apenas para as
+            chaves encontradas.
+        """
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(unique), _SQL_CHUNK):
+                chunk = unique[start:start + _SQL_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for k, blob in rows:
+                    found[k] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, k) for k, _ in rows],
+                    )
+            self._conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, keys, vectors):
+        """
+        Armazena vetores e aplica o limite de tamanho (descarte LRU).
+
+        Parameters
+        ----------
+        keys : list of str
+            Chaves dos textos.
+        vectors : array-like, shape (len(keys), dim)
+            Embeddings correspondentes.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [
+            (k, int(v.shape[0]), v.tobytes(), now)
+            for k, v in zip(keys, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vec, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def stats(self):
+        """
+        Retorna estatísticas de uso do cache.
+
+        Returns
+        -------
+        dict
+            hits, misses, entries (tamanho atual) e hit_rate.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        """Remove todas as entradas e zera os contadores."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+
+class NameCache:
+    """
+    Armazena nomes de clusters gerados pelo LLM, endereçados pelo conjunto
+    de textos membros.
+
+    A chave exata é o hash dos textos membros ordenados (mais o modelo
+    LLM). Opcionalmente, um cluster cujo conjunto de membros tenha
+    sobreposição de Jaccard >= `jaccard_threshold` com um cluster já
+    nomeado reaproveita esse nome. Ao ultrapassar `max_entries`, as
+    entradas usadas há mais tempo são descartadas.
+
+    Parameters
+    ----------
+    path : str, optional
+        Caminho do arquivo SQLite. Padrão: variável de ambiente
+        NAME_CACHE_PATH ou "./.cache/names.sqlite".
+    max_entries : int, optional
+        Número máximo de nomes armazenados. Padrão: variável de ambiente
+        NAME_CACHE_MAX_ENTRIES ou 100000.
+    jaccard_threshold : float, optional
+        Sobreposição mínima para reaproveitar um nome aproximado. Padrão:
+        variável de ambiente NAME_CACHE_JACCARD; 0 ou ausente desativa.
+
+    Examples
+    --------
+    >>> cache = NameCache("/tmp/names.sqlite", jaccard_threshold=0.9)
+    >>> cache.put(["q1", "q2", "q3"], "granito_gnaisse_xisto", model="m")
+    >>> cache.get(["q3", "q1", "q2"], model="m")
+    'granito_gnaisse_xisto'
+    """
+
+    def __init__(self, path=None, max_entries=None, jaccard_threshold=None):
+        self.path = path or os.getenv("NAME_CACHE_PATH", "./.cache/names.sqlite")
+        self.max_entries = int(max_entries or os.getenv("NAME_CACHE_MAX_ENTRIES", 100000))
+        if jaccard_threshold is None:
+            jaccard_threshold = float(os.getenv("NAME_CACHE_JACCARD", 0) or 0)
+        self.jaccard_threshold = jaccard_threshold
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS names ("
+            "key TEXT PRIMARY KEY, model TEXT, name TEXT, size INTEGER, "
+            "members TEXT, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS names_size ON names(model, size)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS names_last_used ON names(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _members(texts):
+        # Hash curto (64 bits) por texto: suficiente para medir sobreposição
+        return sorted({text_key(t)[:16] for t in texts})
+
+    @staticmethod
+    def key(texts, model=""):
+        """Chave exata de um conjunto de textos membros."""
+        return text_key(model, *sorted(str(t) for t in texts))
+
+    def get(self, texts, model=""):
+        """
+        Busca o nome de um cluster pelo conjunto de textos membros.
+
+        Parameters
+        ----------
+        texts : list of str
+            Textos membros do cluster (a ordem não importa).
+        model : str, optional
+            Identificador do modelo LLM que gerou os nomes.
+
+        Returns
+        -------
+        str or None
+            Nome armazenado, ou None se não houver entrada exata nem
+            aproximada (Jaccard) para o conjunto.
+        """
+        texts = [str(t) for t in texts]
+        key = self.key(texts, model)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT name FROM names WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE names SET last_used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                return row[0]
+
+            if self.jaccard_threshold:
+                match = self._nearest(self._members(texts), model)
+                if match is not None:
+                    self._conn.execute("UPDATE names SET last_used = ? WHERE key = ?", (now, match[0]))
+                    self._conn.commit()
+                    self.fuzzy_hits += 1
+                    return match[1]
+
+            self.misses += 1
+        return None
+
+    def _nearest(self, members, model):
+        # |A ∩ B| / |A ∪ B| >= t exige t·|A| <= |B| <= |A| / t
+        t = self.jaccard_threshold
+        n = len(members)
+        rows = self._conn.execute(
+            "SELECT key, name, members FROM names WHERE model = ? AND size BETWEEN ? AND ?",
+            (model, math.ceil(n * t), math.floor(n / t)),
+        ).fetchall()
+        members = set(members)
+        best, best_score = None, t
+        for key, name, stored in rows:
+            other = set(stored.split(","))
+            score = len(members & other) / len(members | other)
+            if score >= best_score:
+                best, best_score = (key, name), score
+        return best
+
+    def put(self, texts, name, model=""):
+        """
+        Armazena o nome de um cluster e aplica o limite de tamanho (LRU).
+
+        Parameters
+        ----------
+        texts : list of str
+            Textos membros do cluster.
+        name : str
+            Nome gerado pelo LLM.
+        model : str, optional
+            Identificador do modelo LLM.
+        """
+        texts = [str(t) for t in texts]
+        members = self._members(texts)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO names (key, model, name, size, members, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(texts, model), model, name, len(members), ",".join(members), time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM names").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM names WHERE key IN ("
+                    "SELECT key FROM names ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM names").fetchone()
+        return count
+
+    def stats(self):
+        """
+        Retorna estatísticas de uso do cache.
+
+        Returns
+        -------
+        dict
+            hits (exatos), fuzzy_hits (Jaccard), misses, entries e hit_rate.
+        """
+        total = self.hits + self.fuzzy_hits + self.misses
+        return {
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "entries": len(self),
+            "hit_rate": (self.hits + self.fuzzy_hits) / total if total else 0.0,
+        }
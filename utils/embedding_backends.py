@@ -0,0 +1,297 @@
+"""
+Embedding Backends Module
+=========================
+
+Backends de inferência dos modelos de embeddings, escolhidos por
+EMBEDDING_BACKEND:
+
+- torch (padrão): SentenceTransformer em fp32.
+- onnx: ONNX Runtime em CPU com o export ONNX do modelo (publicado no Hub
+  para os modelos sentence-transformers, ex.: all-MiniLM-L6-v2).
+- onnx-int8: o mesmo modelo com quantização dinâmica int8 dos pesos, feita
+  uma vez e guardada em EMBEDDING_ONNX_DIR.
+
+Nos backends ONNX os textos são tokenizados uma vez, ordenados pelo número
+de tokens e agrupados em lotes de comprimento parecido, com um limite de
+tokens por lote: o padding fica restrito a cada lote, e textos curtos vão em
+lotes maiores. Isso importa nas seções qa/completion, em que o texto é
+"pergunta resposta" e o comprimento varia muito.
+
+Vetores de backends diferentes não são idênticos: o identificador do
+backend entra na chave do cache e dos artefatos de embeddings (ver
+`model_id`). Antes de trocar de backend em produção, meça a concordância
+com a referência fp32:
+
+    python -m utils.embedding_backends --backend onnx-int8 --sample 2000
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Comprimento máximo do MiniLM no sentence-transformers (max_seq_length)
+DEFAULT_MAX_LENGTH = 256
+
+
+def get_backend_name(backend=None):
+    """Backend configurado (argumento ou EMBEDDING_BACKEND; padrão torch)."""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND") or "torch").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de embeddings desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+    return backend
+
+
+def model_id(model_name, backend=None):
+    """
+    Identificador do modelo usado nas chaves de cache e de artefato.
+
+    O backend torch mantém o nome do modelo (caches existentes continuam
+    válidos); os demais recebem um sufixo, ex.: "all-MiniLM-L6-v2@onnx-int8".
+    """
+    backend = get_backend_name(backend)
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def load_backend(model_name, backend=None, threads=None):
+    """
+    Carrega o modelo no backend configurado.
+
+    Parameters
+    ----------
+    model_name : str
+        Nome do modelo sentence-transformers (ou repositório do Hub).
+    backend : {'torch', 'onnx', 'onnx-int8'}, optional
+        Padrão: variável de ambiente EMBEDDING_BACKEND ou torch.
+    threads : int, optional
+        Threads de inferência em CPU. Padrão: variável de ambiente
+        EMBEDDING_THREADS (0 ou ausente mantém o padrão da biblioteca).
+
+    Returns
+    -------
+    objeto com encode()
+        SentenceTransformer ou `OnnxEmbedder`.
+    """
+    backend = get_backend_name(backend)
+    threads = int(threads or os.getenv("EMBEDDING_THREADS", 0))
+    if backend == "torch":
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    return OnnxEmbedder(model_name, quantize=backend == "onnx-int8", threads=threads)
+
+
+def length_batches(lengths, batch_size=None, max_tokens=None):
+    """
+    Divide textos já ordenados por comprimento em lotes.
+
+    Cada lote tem no máximo `batch_size` textos e no máximo `max_tokens`
+    tokens contando o padding (textos do lote × maior comprimento do lote).
+
+    Parameters
+    ----------
+    lengths : array-like of int
+        Comprimento em tokens de cada texto, em ordem crescente.
+    batch_size : int, optional
+        Textos por lote. Padrão: EMBEDDING_BATCH_SIZE ou 128.
+    max_tokens : int, optional
+        Tokens por lote. Padrão: EMBEDDING_MAX_BATCH_TOKENS ou 16384.
+
+    Returns
+    -------
+    list of slice
+        Fatias contíguas sobre a ordem de `lengths`.
+
+    Examples
+    --------
+    >>> length_batches([5, 5, 6, 200, 256], batch_size=64, max_tokens=400)
+    [slice(0, 3, None), slice(3, 4, None), slice(4, 5, None)]
+    """
+    batch_size = int(batch_size or os.getenv("EMBEDDING_BATCH_SIZE", 128))
+    max_tokens = int(max_tokens or os.getenv("EMBEDDING_MAX_BATCH_TOKENS", 16384))
+    batches, start = [], 0
+    for i, length in enumerate(lengths):
+        # Ordem crescente: o texto atual é o mais longo do lote
+        if i > start and (i - start >= batch_size or (i - start + 1) * int(length) > max_tokens):
+            batches.append(slice(start, i))
+            start = i
+    if start < len(lengths):
+        batches.append(slice(start, len(lengths)))
+    return batches
+
+
+class OnnxEmbedder:
+    """
+    Modelo sentence-transformers (BERT + mean pooling) no ONNX Runtime.
+
+    Parameters
+    ----------
+    model_name : str
+        Nome do modelo sentence-transformers (ou repositório do Hub).
+    quantize : bool, optional (default=False)
+        Usa a versão com quantização dinâmica int8 dos pesos.
+    threads : int, optional
+        intra_op_num_threads do ONNX Runtime (0 = padrão).
+    max_length : int, optional
+        Tokens por texto. Padrão: EMBEDDING_MAX_LENGTH ou 256.
+    onnx_path : str, optional
+        Arquivo .onnx local. Padrão: variável de ambiente EMBEDDING_ONNX_PATH
+        ou `onnx/model.onnx` baixado do repositório do modelo no Hub.
+    """
+
+    def __init__(self, model_name, quantize=False, threads=0, max_length=None, onnx_path=None):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise ImportError(
+                "EMBEDDING_BACKEND=onnx requer onnxruntime e transformers: pip install onnxruntime"
+            ) from exc
+
+        repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        path = onnx_path or os.getenv("EMBEDDING_ONNX_PATH") or self._download(repo)
+        if quantize:
+            path = self._quantized(path, model_name)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(repo)
+        self.max_length = int(max_length or os.getenv("EMBEDDING_MAX_LENGTH", DEFAULT_MAX_LENGTH))
+        self.path = path
+
+    @staticmethod
+    def _download(repo):
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(repo, "onnx/model.onnx")
+
+    @staticmethod
+    def _quantized(path, model_name):
+        # Quantização dinâmica (pesos int8, ativações quantizadas em tempo de
+        # execução): portátil entre CPUs, feita uma vez por modelo
+        out_dir = os.path.join(os.getenv("EMBEDDING_ONNX_DIR", "./.cache/onnx"), model_name.replace("/", "__"))
+        out = os.path.join(out_dir, "model_int8.onnx")
+        if not os.path.exists(out):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            os.makedirs(out_dir, exist_ok=True)
+            tmp = f"{out}.tmp"
+            quantize_dynamic(path, tmp, weight_type=QuantType.QInt8)
+            os.replace(tmp, out)
+        return out
+
+    def encode(self, texts, normalize_embeddings=False, show_progress_bar=False, batch_size=None, **kwargs):
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Tokeniza tudo de uma vez, sem padding; o padding é feito por lote
+        ids = self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+        lengths = np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(ids))
+        order = np.argsort(lengths, kind="stable")
+
+        out = None
+        for batch in length_batches(lengths[order], batch_size):
+            rows = order[batch]
+            width = int(lengths[rows[-1]])
+            input_ids = np.zeros((len(rows), width), dtype=np.int64)
+            mask = np.zeros((len(rows), width), dtype=np.int64)
+            for j, row in enumerate(rows):
+                input_ids[j, :lengths[row]] = ids[row]
+                mask[j, :lengths[row]] = 1
+
+            feeds = {"input_ids": input_ids, "attention_mask": mask}
+            if "token_type_ids" in self.inputs:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+
+            # Mean pooling sobre os tokens reais, como o sentence-transformers
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            if out is None:
+                out = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[rows] = pooled
+
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+
+def embedding_agreement(texts, model_name, backend, reference="torch", threads=None):
+    """
+    Compara um backend com a referência: concordância de cosseno e vazão.
+
+    Parameters
+    ----------
+    texts : list of str
+        Textos de teste (ex.: uma amostra do corpus).
+    model_name : str
+        Modelo de embeddings.
+    backend : str
+        Backend avaliado.
+    reference : str, optional (default="torch")
+        Backend de referência (fp32).
+    threads : int, optional
+        Threads dos dois backends (ver `load_backend`).
+
+    Returns
+    -------
+    dict
+        Cosseno entre os vetores normalizados de cada texto (média, mínimo e
+        percentil 1), textos/s de cada backend e o ganho de vazão.
+    """
+    texts = [str(t) for t in texts]
+    result = {"texts": len(texts)}
+    vectors = {}
+    for name in (reference, backend):
+        model = load_backend(model_name, name, threads)
+        model.encode(texts[:32], normalize_embeddings=True)  # aquecimento
+        start = time.perf_counter()
+        vectors[name] = np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+        result[f"{name}_texts_per_s"] = len(texts) / (time.perf_counter() - start)
+
+    cosine = (vectors[reference] * vectors[backend]).sum(axis=1)
+    result.update(
+        mean_cosine=float(cosine.mean()),
+        min_cosine=float(cosine.min()),
+        p01_cosine=float(np.percentile(cosine, 1)),
+        speedup=result[f"{backend}_texts_per_s"] / result[f"{reference}_texts_per_s"],
+    )
+    return result
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Concordância e vazão de um backend de embeddings.")
+    parser.add_argument("--backend", default="onnx-int8", choices=BACKENDS[1:])
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--json-path", help="Corpus de onde amostrar os textos (padrão: JSON_PATH).")
+    parser.add_argument("--sample", type=int, default=2000, help="Textos amostrados do corpus.")
+    parser.add_argument("--threads", type=int, help="Threads de inferência (padrão: EMBEDDING_THREADS).")
+    parser.add_argument("--min-cosine", type=float, default=float(os.getenv("EMBEDDING_MIN_AGREEMENT", 0.99)),
+                        help="Cosseno médio mínimo; abaixo dele termina com código 1.")
+    args = parser.parse_args(argv)
+
+    from utils.utils_IO import load_corpus
+    texts = load_corpus(args.json_path)["text"]
+    if len(texts) > args.sample:
+        texts = texts.sample(args.sample, random_state=42)
+
+    result = embedding_agreement(texts.tolist(), args.model, args.backend, threads=args.threads)
+    for key, value in result.items():
+        print(f"{key:<24} {value:.4f}" if isinstance(value, float) else f"{key:<24} {value}")
+    return 0 if result["mean_cosine"] >= args.min_cosine else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
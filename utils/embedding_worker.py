@@ -0,0 +1,266 @@
+"""
+Embedding Worker
+================
+
+Worker local de longa duração que mantém os modelos de embeddings carregados
+e atende pedidos de codificação por um socket Unix. Execuções curtas (uma
+avaliação, uma chamada da CLI) deixam de pagar a importação do
+torch/sentence_transformers e a leitura dos pesos a cada processo.
+
+Uso:
+
+    python -m utils.embedding_worker --socket /tmp/embeddings.sock \\
+        --model all-MiniLM-L6-v2
+    export EMBEDDING_WORKER_SOCKET=/tmp/embeddings.sock
+
+Com EMBEDDING_WORKER_SOCKET definida, `utils.embeddings.get_embed_model`
+devolve um `WorkerEmbedder` no lugar do SentenceTransformer. O cache de
+embeddings continua sendo consultado no cliente: só textos fora do cache
+chegam ao worker. Cada pedido leva o backend do cliente (EMBEDDING_BACKEND,
+ver `utils.embedding_backends`), e o worker codifica com esse backend: os
+vetores sempre correspondem à chave de cache do cliente.
+
+Protocolo: cada mensagem é um cabeçalho JSON precedido do seu tamanho (4
+bytes, big-endian), seguido opcionalmente de `nbytes` bytes de payload. A
+resposta de um pedido "encode" traz a matriz float32 como payload.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+import numpy as np
+from utils.embedding_backends import get_backend_name, load_backend, model_id
+
+
+# Textos por mensagem: limita o tamanho de cada pedido e resposta
+REQUEST_BATCH = 8192
+
+_HEADER = struct.Struct(">I")
+
+
+def _send(sock, header, payload=b""):
+    data = json.dumps({**header, "nbytes": len(payload)}).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data + payload)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1024 ** 2))
+        if not chunk:
+            raise ConnectionError("Conexão encerrada pelo outro lado")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, size).decode("utf-8"))
+    payload = _recv_exact(sock, header["nbytes"]) if header["nbytes"] else b""
+    return header, payload
+
+
+class WorkerEmbedder:
+    """
+    Cliente do worker, com a interface encode() do SentenceTransformer.
+
+    Parameters
+    ----------
+    socket_path : str
+        Socket Unix do worker.
+    model_name : str
+        Modelo pedido ao worker (carregado por ele na primeira vez).
+    backend : str, optional
+        Backend pedido ao worker. Padrão: EMBEDDING_BACKEND deste processo,
+        o mesmo usado nas chaves do cache de embeddings.
+    timeout : float, optional (default=600)
+        Tempo máximo, em segundos, de cada pedido.
+    """
+
+    def __init__(self, socket_path, model_name, backend=None, timeout=600):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.backend = get_backend_name(backend)
+        self.timeout = timeout
+
+    def _request(self, header, payload=b""):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            _send(sock, header, payload)
+            response, data = _recv(sock)
+        if not response.get("ok"):
+            raise RuntimeError(f"Worker de embeddings: {response.get('error')}")
+        return response, data
+
+    def ping(self):
+        """True se o worker responde no socket."""
+        try:
+            self._request({"op": "ping"})
+            return True
+        except (OSError, RuntimeError):
+            return False
+
+    def encode(self, texts, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        texts = [str(t) for t in texts]
+        blocks = []
+        for start in range(0, len(texts), REQUEST_BATCH):
+            batch = texts[start:start + REQUEST_BATCH]
+            payload = json.dumps(batch, ensure_ascii=False).encode("utf-8")
+            response, data = self._request(
+                {"op": "encode", "model": self.model_name, "backend": self.backend,
+                 "normalize": bool(normalize_embeddings)},
+                payload,
+            )
+            blocks.append(np.frombuffer(data, dtype=np.float32).reshape(response["shape"]))
+        if not blocks:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(blocks)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        server.begin_request()
+        try:
+            header, payload = _recv(self.request)
+            if header.get("op") == "ping":
+                _send(self.request, {"ok": True, "models": sorted(server.models)})
+                return
+            if header.get("op") != "encode":
+                raise ValueError(f"Operação desconhecida: {header.get('op')}")
+            texts = json.loads(payload.decode("utf-8"))
+            # Pedidos sem backend (clientes antigos) usam o do worker
+            model, lock = server.get_model(header["model"], header.get("backend"))
+            # SentenceTransformer não é seguro para chamadas concorrentes
+            with lock:
+                vectors = np.ascontiguousarray(
+                    model.encode(texts, normalize_embeddings=header.get("normalize", True),
+                                 show_progress_bar=False),
+                    dtype=np.float32,
+                )
+            _send(self.request, {"ok": True, "shape": list(vectors.shape)}, vectors.tobytes())
+        except Exception as exc:  # devolve o erro ao cliente em vez de derrubar o worker
+            try:
+                _send(self.request, {"ok": False, "error": f"{type(exc).__name__}: {exc}"})
+            except OSError:
+                pass
+        finally:
+            server.end_request()
+
+
+class EmbeddingWorker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Servidor do worker: um modelo carregado por (nome, backend),
+    compartilhado por todas as conexões.
+
+    Parameters
+    ----------
+    socket_path : str
+        Caminho do socket Unix (um arquivo antigo no caminho é removido).
+    models : iterable of str, optional
+        Modelos carregados já na inicialização, no backend de
+        EMBEDDING_BACKEND.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, models=()):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.models = {}
+        self._lock = threading.Lock()
+        self._active_lock = threading.Lock()
+        self.active = 0
+        self.last_request = time.monotonic()
+        for name in models:
+            self.get_model(name)
+
+    def begin_request(self):
+        with self._active_lock:
+            self.active += 1
+            self.last_request = time.monotonic()
+
+    def end_request(self):
+        with self._active_lock:
+            self.active -= 1
+            self.last_request = time.monotonic()
+
+    def idle_for(self):
+        """Segundos sem pedidos em andamento (0 enquanto algum é atendido)."""
+        with self._active_lock:
+            return 0.0 if self.active else time.monotonic() - self.last_request
+
+    def get_model(self, model_name, backend=None):
+        # Indexado por model_id: o mesmo modelo em backends diferentes são
+        # entradas distintas
+        key = model_id(model_name, backend)
+        with self._lock:
+            entry = self.models.get(key)
+            if entry is None:
+                print(f"Carregando {key}...", flush=True)
+                entry = self.models[key] = (load_backend(model_name, backend), threading.Lock())
+            return entry
+
+    def serve(self, idle_timeout=0):
+        """
+        Atende pedidos até ser interrompido ou ficar `idle_timeout` s ocioso
+        (0 = sem limite). Pedidos em andamento adiam o encerramento.
+        """
+        if idle_timeout:
+            threading.Thread(target=self._watch_idle, args=(idle_timeout,), daemon=True).start()
+        try:
+            self.serve_forever()
+        finally:
+            # Sem aceitar conexões novas, termina as respostas em andamento
+            while self.active:
+                time.sleep(0.05)
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _watch_idle(self, idle_timeout):
+        # Um pedido longo (ex.: um lote grande no modelo) não conta como
+        # ociosidade: só encerra sem pedidos em andamento
+        while self.idle_for() < idle_timeout:
+            time.sleep(min(idle_timeout, 5))
+        print("Worker ocioso: encerrando.", flush=True)
+        self.shutdown()
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Worker local de embeddings (socket Unix).")
+    parser.add_argument("--socket", default=os.getenv("EMBEDDING_WORKER_SOCKET"),
+                        help="Caminho do socket (padrão: EMBEDDING_WORKER_SOCKET).")
+    parser.add_argument("--model", action="append",
+                        help="Modelo pré-carregado (repetível; padrão: EMBEDDING_MODEL).")
+    parser.add_argument("--idle-timeout", type=float, default=0,
+                        help="Encerra após N segundos sem pedidos (padrão: 0, nunca).")
+    args = parser.parse_args(argv)
+    if not args.socket:
+        parser.error("informe --socket ou defina EMBEDDING_WORKER_SOCKET")
+
+    models = args.model or [os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")]
+    worker = EmbeddingWorker(args.socket, models)
+    print(f"Worker de embeddings em {args.socket} ({', '.join(worker.models)})", flush=True)
+    try:
+        worker.serve(args.idle_timeout)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+Embeddings Module
+=================
+
+Ponto único de geração de embeddings da pipeline. Todos os caminhos de
+clustering e avaliação passam por `encode_texts`, que consulta o cache
+persistente (utils.cache.EmbeddingCache) e só codifica textos nunca vistos.
+
+Matrizes de um corpus inteiro podem ser gravadas como artefato em disco
+(`embed_to_artifact`) e abertas com memory map por qualquer etapa ou
+processo (`open_embedding_artifact`), opcionalmente em float16.
+
+Cada modelo é carregado uma única vez por processo (`get_embed_model`); com
+EMBEDDING_WORKER_SOCKET, a codificação vai para um worker local de longa
+duração (`utils.embedding_worker`) que mantém o modelo carregado entre
+execuções.
+"""
+
+import os
+import json
+import mmap
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from utils.cache import EmbeddingCache, text_key
+from utils.tracing import traced
+from utils.embedding_backends import load_backend, model_id
+
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+_cache = None
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Retorna o cache de embeddings compartilhado pelo processo.
+
+    O cache é desativado definindo EMBEDDING_CACHE=0.
+
+    Returns
+    -------
+    EmbeddingCache or None
+        Instância única do cache, ou None se estiver desativado.
+    """
+    global _cache
+    if os.getenv("EMBEDDING_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+def get_embed_model(model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Retorna o modelo de embeddings do processo, carregando-o uma única vez.
+
+    O backend de inferência (torch, onnx, onnx-int8) vem de
+    EMBEDDING_BACKEND (ver `utils.embedding_backends`). Se a variável de
+    ambiente EMBEDDING_WORKER_SOCKET apontar para um worker ativo (ver
+    `utils.embedding_worker`), retorna um cliente com a mesma interface
+    encode(), e o modelo não é carregado neste processo.
+
+    Parameters
+    ----------
+    model_name : str, optional (default="all-MiniLM-L6-v2")
+        Nome do modelo SentenceTransformer.
+
+    Returns
+    -------
+    SentenceTransformer, OnnxEmbedder ou WorkerEmbedder
+        Objeto com encode(), compartilhado por todas as chamadas.
+    """
+    key = model_id(model_name)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = _load_model(model_name)
+        return model
+
+
+def register_embed_model(model_name, model):
+    """
+    Registra um objeto com encode() como o modelo `model_name` do processo.
+
+    Útil para modelos já carregados ou substitutos (ex.: o embedder
+    sintético de `benchmarks.synthetic`).
+    """
+    with _models_lock:
+        _models[model_id(model_name)] = model
+
+
+def _load_model(model_name):
+    socket_path = os.getenv("EMBEDDING_WORKER_SOCKET")
+    if socket_path:
+        from utils.embedding_worker import WorkerEmbedder
+        worker = WorkerEmbedder(socket_path, model_name)
+        if worker.ping():
+            return worker
+        print(f"Worker de embeddings indisponível em {socket_path}: carregando {model_name} localmente.")
+    return load_backend(model_name)
+
+
+@traced("embeddings.encode_texts")
+def encode_texts(
+    texts,
+    embed_model=None,
+    model_name=None,
+    normalize=True,
+    show_progress_bar=True,
+):
+    """
+    Gera embeddings para uma lista de textos, reaproveitando o cache em disco.
+
+    Parameters
+    ----------
+    texts : list of str
+        Textos a serem codificados.
+    embed_model : SentenceTransformer ou similar, optional
+        Modelo que implementa encode(). Se None, usa `get_embed_model`
+        (carregado apenas se houver textos fora do cache).
+    model_name : str, optional
+        Nome do modelo, usado na chave do cache. Sem `embed_model`, o
+        padrão é "all-MiniLM-L6-v2". Com `embed_model`, identifica os
+        vetores desse modelo no cache; se None, a identidade vem do
+        registro do processo (`register_embed_model`) ou do atributo
+        `cache_id` do modelo e, sem nenhum dos dois, os textos são
+        codificados sem passar pelo cache (nunca sob a chave de outro
+        modelo).
+    normalize : bool, optional (default=True)
+        Normaliza os vetores para magnitude unitária.
+    show_progress_bar : bool, optional (default=True)
+        Mostra barra de progresso ao codificar os textos ausentes.
+
+    Returns
+    -------
+    np.ndarray, shape (len(texts), dim)
+        Matriz float32 de embeddings, na mesma ordem de `texts`.
+
+    Examples
+    --------
+    >>> emb = encode_texts(df["text"].tolist())
+    >>> get_embedding_cache().stats()["hit_rate"]
+    1.0
+    """
+    # Textos repetidos (a mesma pergunta em vários arquivos de modelo) são
+    # codificados uma vez e espalhados de volta pelo índice inverso
+    uniques, inverse = unique_texts(texts)
+    vectors = _encode_unique(uniques, embed_model, model_name, normalize, show_progress_bar)
+    if len(uniques) == len(inverse):
+        return vectors
+    return vectors[inverse]
+
+
+def unique_texts(texts):
+    """
+    Fatoriza textos em valores únicos e índice inverso.
+
+    Parameters
+    ----------
+    texts : iterable
+        Textos (convertidos para str).
+
+    Returns
+    -------
+    tuple of (list of str, np.ndarray)
+        Textos únicos, na ordem da primeira ocorrência, e o índice de cada
+        texto original na lista de únicos (`uniques[inverse[i]] == texts[i]`).
+
+    Examples
+    --------
+    >>> unique_texts(["a", "b", "a"])
+    (['a', 'b'], array([0, 1, 0]))
+    """
+    texts = [str(t) for t in texts]
+    inverse, uniques = pd.factorize(pd.Series(texts, dtype=object))
+    return list(uniques), inverse
+
+
+def _cache_identity(embed_model, model_name):
+    # Vetores de backends diferentes (ex.: int8) não se misturam no cache
+    if embed_model is None:
+        return model_id(model_name or DEFAULT_EMBEDDING_MODEL)
+    if model_name is not None:
+        return model_name
+    with _models_lock:
+        registered = next((key for key, model in _models.items() if model is embed_model), None)
+    return registered or getattr(embed_model, "cache_id", None)
+
+
+def _encode_unique(texts, embed_model, model_name, normalize, show_progress_bar):
+    cache = get_embedding_cache()
+    cache_model = _cache_identity(embed_model, model_name)
+
+    if cache is None or cache_model is None:
+        return _encode(texts, embed_model, model_name, normalize, show_progress_bar)
+
+    keys = [cache.key(cache_model, normalize, t) for t in texts]
+    found = cache.get_many(keys)
+
+    missing = [k for k in keys if k not in found]
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        vectors = _encode(
+            [text_by_key[k] for k in missing], embed_model, model_name,
+            normalize, show_progress_bar,
+        )
+        cache.put_many(missing, vectors)
+        found.update(zip(missing, vectors))
+
+    if not keys:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack([found[k] for k in keys]).astype(np.float32, copy=False)
+
+
+def _encode(texts, embed_model, model_name, normalize, show_progress_bar):
+    if embed_model is None:
+        embed_model = get_embed_model(model_name or DEFAULT_EMBEDDING_MODEL)
+    batch = {"batch_size": int(os.environ["EMBEDDING_BATCH_SIZE"])} if os.getenv("EMBEDDING_BATCH_SIZE") else {}
+    return np.asarray(
+        embed_model.encode(
+            texts,
+            normalize_embeddings=normalize,
+            show_progress_bar=show_progress_bar,
+            **batch,
+        ),
+        dtype=np.float32,
+    )
+
+
+ARTIFACT_MATRIX = "embeddings.npy"
+ARTIFACT_IDS = "ids.npy"
+ARTIFACT_META = "meta.json"
+
+
+def save_embedding_artifact(path, embeddings, texts, model_name=DEFAULT_EMBEDDING_MODEL,
+                            normalize=True, dtype="float32"):
+    """
+    Grava um artefato de embeddings reutilizável entre etapas e processos.
+
+    O artefato é uma pasta com:
+    - embeddings.npy: matriz (n, dim) em float32 ou float16, aberta com memory map
+    - ids.npy: id de cada linha (hash SHA-256 do texto), na ordem da matriz
+    - meta.json: modelo, dimensão, número de linhas, normalização e dtype
+
+    Parameters
+    ----------
+    path : str
+        Pasta de destino (criada se não existir).
+    embeddings : np.ndarray, shape (n, dim)
+        Matriz de embeddings.
+    texts : list of str
+        Textos de cada linha, usados para gerar os ids.
+    model_name : str, optional
+        Modelo que gerou os embeddings.
+    normalize : bool, optional (default=True)
+        Se os vetores foram normalizados.
+    dtype : {'float32', 'float16'}, optional (default='float32')
+        Tipo armazenado. float16 reduz o artefato pela metade.
+
+    Returns
+    -------
+    str
+        O próprio `path`.
+    """
+    os.makedirs(path, exist_ok=True)
+    matrix = np.asarray(embeddings).astype(dtype, copy=False)
+    ids = np.array([text_key(t) for t in texts], dtype="S64")
+
+    # Grava em arquivos temporários e troca no fim: leitores nunca veem
+    # um artefato pela metade
+    for name, value in ((ARTIFACT_MATRIX, matrix), (ARTIFACT_IDS, ids)):
+        tmp = os.path.join(path, f".{name}.tmp.npy")
+        np.save(tmp, value)
+        os.replace(tmp, os.path.join(path, name))
+
+    meta = {
+        "model": model_name,
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "rows": int(matrix.shape[0]),
+        "normalize": bool(normalize),
+        "dtype": str(matrix.dtype),
+    }
+    with open(os.path.join(path, ARTIFACT_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return path
+
+
+def open_embedding_artifact(path):
+    """
+    Abre um artefato de embeddings sem copiar a matriz para a memória.
+
+    Parameters
+    ----------
+    path : str
+        Pasta criada por `save_embedding_artifact`.
+
+    Returns
+    -------
+    tuple of (np.memmap, np.ndarray, dict)
+        Matriz somente leitura (memory map), ids das linhas e metadados.
+
+    Examples
+    --------
+    >>> emb, ids, meta = open_embedding_artifact("./.cache/artifacts/abc123")
+    >>> meta["dtype"], emb.shape
+    ('float16', (120000, 384))
+    """
+    with open(os.path.join(path, ARTIFACT_META), encoding="utf-8") as f:
+        meta = json.load(f)
+    matrix = np.load(os.path.join(path, ARTIFACT_MATRIX), mmap_mode="r")
+    ids = np.load(os.path.join(path, ARTIFACT_IDS), mmap_mode="r")
+    return matrix, ids, meta
+
+
+def embed_to_artifact(texts, artifact_dir=None, model_name=DEFAULT_EMBEDDING_MODEL,
+                      normalize=True, dtype=None):
+    """
+    Retorna o artefato de embeddings de um conjunto de textos, criando-o se preciso.
+
+    O artefato é endereçado pelo conteúdo (modelo, normalização, dtype e
+    hash de todos os textos, em ordem): a mesma lista de textos reabre o
+    mesmo artefato em qualquer etapa ou processo.
+
+    Parameters
+    ----------
+    texts : list of str
+        Textos, na ordem das linhas da matriz.
+    artifact_dir : str, optional
+        Pasta raiz dos artefatos. Padrão: variável de ambiente
+        EMBEDDING_ARTIFACT_DIR ou "./.cache/artifacts".
+    model_name : str, optional
+        Modelo de embeddings.
+    normalize : bool, optional (default=True)
+        Normaliza os vetores.
+    dtype : {'float32', 'float16'}, optional
+        Tipo armazenado. Padrão: variável de ambiente EMBEDDING_DTYPE ou
+        float32.
+
+    Returns
+    -------
+    str
+        Caminho da pasta do artefato (abrir com `open_embedding_artifact`).
+    """
+    texts = [str(t) for t in texts]
+    artifact_dir = artifact_dir or os.getenv("EMBEDDING_ARTIFACT_DIR", "./.cache/artifacts")
+    dtype = dtype or os.getenv("EMBEDDING_DTYPE", "float32")
+
+    digest = hashlib.sha256()
+    for part in (model_id(model_name), int(bool(normalize)), dtype):
+        digest.update(f"{part}\0".encode("utf-8"))
+    for t in texts:
+        digest.update(t.encode("utf-8"))
+        digest.update(b"\0")
+    path = os.path.join(artifact_dir, digest.hexdigest()[:32])
+
+    if not os.path.exists(os.path.join(path, ARTIFACT_META)):
+        embeddings = encode_texts(texts, model_name=model_name, normalize=normalize)
+        save_embedding_artifact(path, embeddings, texts, model_id(model_name), normalize, dtype)
+    return path
+
+
+def load_embeddings(embeddings):
+    """
+    Aceita uma matriz ou o caminho de um artefato e retorna a matriz.
+
+    Caminhos são abertos com memory map (`open_embedding_artifact`), de
+    modo que as etapas da pipeline podem receber o artefato diretamente.
+    """
+    if isinstance(embeddings, (str, os.PathLike)):
+        return open_embedding_artifact(embeddings)[0]
+    return embeddings
+
+
+def memmap_file(embeddings):
+    """
+    Arquivo .npy inteiro mapeado por `embeddings`, ou None.
+
+    Um memory map fatiado (linhas, colunas, passo) ou reinterpretado mantém
+    o `filename` do arquivo original, mas não é a matriz gravada nele. Só
+    devolve o caminho se `embeddings` é o próprio memory map aberto do
+    arquivo e forma, dtype e offset coincidem com o cabeçalho do .npy.
+    """
+    filename = getattr(embeddings, "filename", None)
+    if not isinstance(embeddings, np.memmap) or not filename or not str(filename).endswith(".npy"):
+        return None
+    # Fatias de um memory map têm como base outro np.memmap, não o mmap
+    if not isinstance(embeddings.base, mmap.mmap):
+        return None
+    try:
+        with open(filename, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, fortran_order, dtype = read_header(f)
+            offset = f.tell()
+    except (OSError, ValueError):
+        return None
+    if (shape != embeddings.shape or fortran_order or dtype != embeddings.dtype
+            or offset != embeddings.offset or not embeddings.flags.c_contiguous):
+        return None
+    return str(filename)
@@ -1,86 +1,219 @@
+import numpy as np
 import pandas as pd
-from utils.utils_IO import json_to_df
-from utils.assign import assign_clusters
-from utils.metrics import compute_score
+from utils.assign import CentroidAssigner
+from utils.metrics import compute_scores, METRIC_COLUMNS
 from utils.aglomerar import aglomerar
-from utils.run import hierachical_clustering_top_bottom, hierarchical_clustering_bottom_top, kmeans_model
-from sentence_transformers import SentenceTransformer
+from utils.tracing import traced, stage
+from utils.embeddings import encode_texts, unique_texts, DEFAULT_EMBEDDING_MODEL
+from utils.run import (prepare_corpus, kmeans_estimator, bisecting_kmeans_estimator,
+                       agglomerative_tree, cut_tree, CLUSTERING_METHODS)
 
 
-def evaluate_top(models_folder, i):
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+# Métodos avaliados por padrão: os mesmos da varredura de clustering
+GRID_METHODS = CLUSTERING_METHODS
 
-    df, model =hierachical_clustering_top_bottom(i)
-    df = aglomerar(models_folder)
-    df = assign_clusters(df, embed_model, model)
-    df["score"] = df.apply(compute_score, axis=1)
-    print(df)
-
-    final = (
-    df
-    .groupby(["model", "task", "cluster",], as_index=False)
-    .agg(
-        num_questions=("score", "size"),
-
-        score_mean=("score", "mean"),
-        score_sum=("score", "sum"),
-
-        answer_relevancy_mean=("answer_relevancy", "mean"),
-        bert_similarity_mean=("bert_similarity", "mean"),
-        correctness_geval_mean=("correctness_geval", "mean"),
-        prompt_alignment_mean=("prompt_alignment", "mean"),
-    )
-)
-    return final
+GRID_KEYS = ["method", "linkage", "k"]
+GROUP_KEYS = ["model", "task", "cluster"]
 
-def evaluate_bottom(models_folder, i):
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+AGGREGATES = dict(
+    num_questions=("score", "size"),
 
-    df, model =hierarchical_clustering_bottom_top(i)
-    df = aglomerar(models_folder)
-    df = assign_clusters(df, embed_model, model)
-    df["score"] = df.apply(compute_score, axis=1)
-    print(df)
-
-    final = (
-    df
-    .groupby(["model", "task", "cluster",], as_index=False)
-    .agg(
-        num_questions=("score", "size"),
-
-        score_mean=("score", "mean"),
-        score_sum=("score", "sum"),
-
-        answer_relevancy_mean=("answer_relevancy", "mean"),
-        bert_similarity_mean=("bert_similarity", "mean"),
-        correctness_geval_mean=("correctness_geval", "mean"),
-        prompt_alignment_mean=("prompt_alignment", "mean"),
-    )
+    score_mean=("score", "mean"),
+    score_sum=("score", "sum"),
+
+    **{f"{col}_mean": (col, "mean") for col in METRIC_COLUMNS.values()},
 )
-    return final
 
-def evaluate_kmeans(models_folder, i):
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
 
-    df, model =kmeans_model(i)
+@traced("evaluation.evaluate_grid")
+def evaluate_grid(models_folder, ks, methods=None, corpus=None, embeddings=None, return_labels=False,
+                  model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Avalia todos os métodos de clustering e valores de k em uma única passada.
+
+    A pasta de resultados é lida uma vez, os textos são codificados uma vez e
+    o score é calculado uma vez. Cada combinação (método, linkage, k) vira
+    uma coluna de rótulos, e todos os agregados são produzidos em um único
+    groupby, em formato longo.
+
+    Parameters
+    ----------
+    models_folder : str
+        Pasta com os JSONs de resultados dos modelos (ver `aglomerar`).
+    ks : iterable of int
+        Números de clusters a avaliar.
+    methods : dict, optional
+        Mapeia método ('kmeans', 'top_bottom', 'bottom_top') para os
+        linkages a avaliar. Padrão: GRID_METHODS.
+    corpus, embeddings : optional
+        Corpus de perguntas e embeddings já preparados (ver
+        `utils.run.prepare_corpus`).
+    return_labels : bool, optional (default=False)
+        Se True, retorna também o DataFrame de casos de teste com uma
+        coluna `cluster_<método>_<linkage>_<k>` por combinação.
+    model_name : str, optional (default="all-MiniLM-L6-v2")
+        Modelo de embeddings do corpus e dos casos de teste.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Uma linha por (method, linkage, k, model, task, cluster) com
+        num_questions, score_mean, score_sum e a média de cada métrica.
+        Se `return_labels` for True, retorna a tupla (agregados, casos).
+
+    Examples
+    --------
+    >>> grid = evaluate_grid("/path/to/models", [5, 10])
+    >>> grid[grid["method"] == "kmeans"].head()
+    """
+    methods = methods or GRID_METHODS
+    ks = list(ks)
+    if corpus is None:
+        corpus, embeddings = prepare_corpus(model_name=model_name)
+    elif embeddings is None:
+        embeddings = encode_texts(corpus["text"].tolist(), model_name=model_name, normalize=True)
+
+    df, inverse, inputs = _load_cases(models_folder, model_name)
+
+    labels = {}
+    for method, linkages in methods.items():
+        for linkage in linkages:
+            with stage(f"evaluation.fit_and_assign.{method}", rows=len(df) * len(ks)):
+                for k, assigned in _fit_and_assign(method, linkage, ks, embeddings, inputs):
+                    labels[(method, linkage, k)] = assigned[inverse]
+
+    return _finish(df, labels, return_labels)
+
+
+@traced("evaluation.evaluate_labelings")
+def evaluate_labelings(models_folder, embeddings, labelings, return_labels=False, models=None,
+                       model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Avalia rotulações já ajustadas, sem reajustar nenhum modelo.
+
+    Cada caso de teste é atribuído ao centróide euclidiano mais próximo de
+    cada rotulação (ver `utils.assign.CentroidAssigner.from_labels`), ou
+    pelo predict() do modelo quando ele é informado em `models`, como em
+    `evaluate_grid` para o top_bottom. Usado pelo runner com checkpoints
+    (`utils.pipeline`), que já tem os rótulos de cada (método, linkage, k).
+
+    Parameters
+    ----------
+    models_folder : str
+        Pasta com os JSONs de resultados dos modelos (ver `aglomerar`).
+    embeddings : np.ndarray ou str
+        Embeddings do corpus (ou caminho do artefato) usados nos ajustes.
+    labelings : dict
+        Mapeia (método, linkage, k) para os rótulos do corpus.
+    return_labels : bool, optional (default=False)
+        Como em `evaluate_grid`.
+    models : dict, optional
+        Mapeia (método, linkage, k) para o modelo ajustado cujo predict()
+        atribui os casos (ex.: BisectingKMeans, em que o predict() desce a
+        árvore de bisecções e não equivale ao centróide mais próximo).
+    model_name : str, optional (default="all-MiniLM-L6-v2")
+        Modelo que gerou `embeddings`; os casos de teste são codificados
+        com ele.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Mesmo formato de `evaluate_grid`.
+    """
+    df, inverse, inputs = _load_cases(models_folder, model_name)
+    models = models or {}
+
+    labels = {}
+    with stage("evaluation.assign", rows=len(df) * len(labelings)):
+        for key, fitted in labelings.items():
+            if key in models:
+                labels[key] = models[key].predict(inputs)[inverse]
+                continue
+            assigner = CentroidAssigner.from_labels(embeddings, fitted, metric="euclidean")
+            labels[key] = assigner.predict(inputs)[inverse]
+
+    return _finish(df, labels, return_labels)
+
+
+def _load_cases(models_folder, model_name):
     df = aglomerar(models_folder)
-    df = assign_clusters(df, embed_model, model)
-    df["score"] = df.apply(compute_score, axis=1)
-    print(df)
-
-    final = (
-    df
-    .groupby(["model", "task", "cluster",], as_index=False)
-    .agg(
-        num_questions=("score", "size"),
-
-        score_mean=("score", "mean"),
-        score_sum=("score", "sum"),
-
-        answer_relevancy_mean=("answer_relevancy", "mean"),
-        bert_similarity_mean=("bert_similarity", "mean"),
-        correctness_geval_mean=("correctness_geval", "mean"),
-        prompt_alignment_mean=("prompt_alignment", "mean"),
+    with stage("evaluation.compute_scores", rows=len(df)):
+        df["score"] = compute_scores(df)
+    # A mesma pergunta aparece uma vez por arquivo de modelo: codifica e
+    # atribui só os textos distintos e espalha os rótulos pelo índice inverso
+    texts, inverse = unique_texts(df["input"].astype(str))
+    inputs = encode_texts(texts, model_name=model_name, normalize=True)
+    return df, inverse, inputs
+
+
+def _finish(df, labels, return_labels):
+    for (method, linkage, k), assigned in labels.items():
+        df[f"cluster_{method}_{linkage}_{k}"] = assigned
+
+    with stage("evaluation.aggregate", rows=len(df) * len(labels)):
+        final = _aggregate_long(df, labels)
+    return (final, df) if return_labels else final
+
+
+def _fit_and_assign(method, linkage, ks, embeddings, inputs):
+    # Atribuição euclidiana pelo centróide: igual ao predict() do KMeans,
+    # em blocos de produto de matrizes
+    if method == "kmeans":
+        for k in ks:
+            model = kmeans_estimator(min(k, len(embeddings))).fit(embeddings)
+            yield k, CentroidAssigner.from_model(model, metric="euclidean").predict(inputs)
+    elif method == "top_bottom":
+        # predict() do BisectingKMeans desce a árvore de bisecções, que não
+        # equivale ao centróide mais próximo: mantém o predict do modelo
+        for k in ks:
+            model = bisecting_kmeans_estimator(k, linkage).fit(embeddings)
+            yield k, model.predict(inputs)
+    elif method == "bottom_top":
+        # Uma árvore por linkage; sem predict(), atribui pelo centróide
+        tree = agglomerative_tree(embeddings, linkage)
+        for k in ks:
+            assigner = CentroidAssigner.from_labels(embeddings, cut_tree(tree, k), metric="euclidean")
+            yield k, assigner.predict(inputs)
+    else:
+        raise ValueError(f"Método de clustering desconhecido: {method}")
+
+
+def _aggregate_long(df, labels):
+    # Uma agregação por combinação, agrupando pelos rótulos como array: o
+    # frame de scores não é copiado por combinação
+    values = ["score", *METRIC_COLUMNS.values()]
+    frames = []
+    for (method, linkage, k), assigned in labels.items():
+        cluster = pd.Series(assigned, index=df.index, name="cluster")
+        agg = (
+            df.groupby([df["model"], df["task"], cluster], observed=True, dropna=False)[values]
+            .agg(**AGGREGATES)
+            .reset_index()
+        )
+        agg.insert(0, "method", method)
+        agg.insert(1, "linkage", linkage)
+        agg.insert(2, "k", k)
+        frames.append(agg)
+
+    if not frames:
+        return pd.DataFrame(columns=GRID_KEYS + GROUP_KEYS + list(AGGREGATES))
+    return (
+        pd.concat(frames, ignore_index=True)
+        .sort_values(GRID_KEYS + GROUP_KEYS, kind="stable", na_position="last")
+        .reset_index(drop=True)
     )
-)
-    return final
\ No newline at end of file
+
+
+def _evaluate_single(models_folder, method, linkage, i):
+    final = evaluate_grid(models_folder, [i], {method: (linkage,)})
+    return final.drop(columns=GRID_KEYS)
+
+
+def evaluate_top(models_folder, i):
+    return _evaluate_single(models_folder, "top_bottom", "largest_cluster", i)
+
+def evaluate_bottom(models_folder, i, linkage="ward"):
+    return _evaluate_single(models_folder, "bottom_top", linkage, i)
+
+def evaluate_kmeans(models_folder, i):
+    return _evaluate_single(models_folder, "kmeans", None, i)
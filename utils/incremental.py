@@ -0,0 +1,378 @@
+"""
+Incremental Clustering Module
+=============================
+
+Atualização incremental de uma combinação (método, linkage, k) quando o
+corpus de JSON_PATH cresce. Em vez de reajustar tudo e renomear todos os
+clusters pelo LLM:
+
+1. O estado da execução anterior (corpus rotulado, embeddings, centróides,
+   nomes) é lido de INCREMENTAL_DIR.
+2. Só as perguntas novas são codificadas.
+3. Cada pergunta nova vai para o centróide mais próximo; as que ficam além
+   do limiar de distância abrem clusters novos (agrupamento "leader": a
+   pergunta entra no primeiro cluster novo dentro do limiar, ou abre outro).
+4. Perguntas removidas do corpus saem dos seus clusters.
+5. Só os clusters cuja composição mudou são renomeados e têm o TXT
+   regravado.
+
+O reajuste completo só acontece na primeira execução, com `refit=True`, ou
+quando uma métrica de deriva passa do limite: crescimento do corpus desde o
+último ajuste, proporção de clusters novos em relação a k, ou aumento da
+distância quadrática média ao centróide. Em todos os métodos o passo
+incremental é a atribuição pelo centróide (a árvore aglomerativa e as
+bisecções não são estendidas); o reajuste usa o estimador do método.
+
+Uso:
+
+    python -m utils.incremental --method kmeans --k 20
+    python -m utils.incremental --method bottom_top --linkage ward --k 30 --refit
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from utils.utils_IO import load_corpus, save_txt_per_cluster, cluster_groups
+from utils.embeddings import encode_texts, DEFAULT_EMBEDDING_MODEL
+from utils.embedding_backends import model_id
+from utils.assign import CentroidAssigner
+from utils.run import CLUSTERING_METHODS, fit_labels, result_paths
+from utils.AWS import generate_cluster_names
+from utils.tracing import traced, stage
+
+
+STATE_FILE = "state.json"
+
+# Limites de deriva (variáveis de ambiente de mesmo nome, em maiúsculas)
+DRIFT_LIMITS = {
+    "growth": 0.25,           # linhas novas desde o último ajuste / linhas do ajuste
+    "new_cluster_rate": 0.2,  # clusters abertos desde o ajuste / k
+    "inertia_ratio": 1.25,    # distância² média atual / do ajuste
+}
+
+
+@traced("incremental.update_clusters", rows=None)
+def update_clusters(method, k, linkage=None, json_path=None, state_dir=None, threshold=None,
+                    refit=False, model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Atualiza os clusters de uma combinação com as perguntas novas do corpus.
+
+    Parameters
+    ----------
+    method : {'kmeans', 'top_bottom', 'bottom_top'}
+        Método de clustering.
+    k : int
+        Número de clusters do ajuste completo.
+    linkage : str, optional
+        Linkage / estratégia de bisecção. Padrão: o primeiro de
+        CLUSTERING_METHODS[method].
+    json_path : str, optional
+        JSON de perguntas. Padrão: variável de ambiente JSON_PATH.
+    state_dir : str, optional
+        Pasta do estado. Padrão: INCREMENTAL_DIR/<método>_<linkage>_<k>
+        (INCREMENTAL_DIR padrão: "./.cache/incremental").
+    threshold : float, optional
+        Distância ao centróide acima da qual uma pergunta nova abre um
+        cluster. Padrão: INCREMENTAL_DISTANCE_THRESHOLD ou, se ausente, o
+        quantil INCREMENTAL_THRESHOLD_QUANTILE (0.99) das distâncias no
+        último ajuste completo.
+    refit : bool, optional (default=False)
+        Força o reajuste completo.
+    model_name : str, optional
+        Modelo de embeddings.
+
+    Returns
+    -------
+    dict
+        Resumo da atualização: refit, motivo, linhas novas e removidas,
+        clusters novos, renomeados e removidos, métricas de deriva.
+
+    Examples
+    --------
+    >>> update_clusters("kmeans", 20)
+    {'refit': False, 'added': 120, 'removed': 0, 'new_clusters': 1, 'renamed': 7, ...}
+    """
+    linkage = linkage if linkage is not None else CLUSTERING_METHODS[method][0]
+    combo = (method, linkage, k)
+    state_dir = state_dir or os.path.join(os.getenv("INCREMENTAL_DIR", "./.cache/incremental"),
+                                          f"{method}_{linkage}_{k}")
+    corpus = load_corpus(json_path)
+    state = _load_state(state_dir)
+
+    if state is not None and state["model"] != model_id(model_name):
+        state, reason = None, "modelo de embeddings alterado"
+    else:
+        reason = "forçado" if refit else "primeira execução"
+    if state is None or refit:
+        embeddings = encode_texts(corpus["text"].tolist(), model_name=model_name, normalize=True)
+        return _refit(corpus, embeddings, combo, state_dir, threshold, model_name, reason)
+
+    previous, prev_embeddings, centroids = state["corpus"], state["embeddings"], state["centroids"]
+    clusters = np.asarray(state["clusters"])
+    counts = np.asarray(state["counts"], dtype=np.float64)
+
+    # Casa linhas pela chave (seção, texto, ocorrência): as conhecidas
+    # mantêm embedding e rótulo
+    keys, prev_keys = _row_keys(corpus), _row_keys(previous)
+    positions = pd.Series(np.arange(len(previous)), index=prev_keys)
+    matched = positions.reindex(keys).to_numpy()
+    known = ~np.isnan(matched)
+    matched = matched[known].astype(np.int64)
+    removed = np.setdiff1d(np.arange(len(previous)), matched)
+    new_rows = np.flatnonzero(~known)
+
+    df = corpus.copy()
+    df["cluster"] = -1
+    df["distance"] = np.nan
+    df.loc[known, "cluster"] = previous["cluster"].to_numpy()[matched]
+    df.loc[known, "distance"] = previous["distance"].to_numpy()[matched]
+
+    sums = centroids.astype(np.float64) * counts[:, None]
+    slot = {c: i for i, c in enumerate(clusters)}
+
+    # Remoções: tira a contribuição das linhas que saíram do corpus
+    for row in removed:
+        i = slot.get(previous["cluster"].iat[row])
+        if i is None:  # cluster já fora do estado
+            continue
+        sums[i] -= prev_embeddings[row]
+        counts[i] -= 1
+
+    new_embeddings = np.empty((0, prev_embeddings.shape[1]), dtype=np.float32)
+    opened = []
+    if len(new_rows):
+        new_embeddings = encode_texts(corpus["text"].iloc[new_rows].tolist(), model_name=model_name,
+                                      normalize=True)
+        with stage("incremental.assign", rows=len(new_rows)):
+            alive = counts > 0
+            assigner = CentroidAssigner(centroids[alive], clusters[alive], metric="euclidean")
+            labels = assigner.predict(new_embeddings)
+            own = np.array([slot[c] for c in labels], dtype=np.int64)
+            distances = np.linalg.norm(new_embeddings - centroids[own], axis=1)
+
+            limit = threshold or state["threshold"]
+            far = distances > limit
+            if far.any():
+                first_id = int(clusters.max()) + 1
+                far_labels, far_distances, opened = _open_clusters(new_embeddings[far], limit, first_id)
+                labels[far], distances[far] = far_labels, far_distances
+            for c in opened:
+                slot[c] = len(clusters)
+                clusters = np.append(clusters, c)
+                sums = np.vstack([sums, np.zeros(sums.shape[1])])
+                counts = np.append(counts, 0.0)
+            for row, label in enumerate(labels):
+                i = slot[label]
+                sums[i] += new_embeddings[row]
+                counts[i] += 1
+
+        df.loc[~known, "cluster"] = labels
+        df.loc[~known, "distance"] = distances
+
+    embeddings = np.empty((len(df), prev_embeddings.shape[1]), dtype=np.float32)
+    embeddings[known] = prev_embeddings[matched]
+    embeddings[~known] = new_embeddings
+
+    alive = counts > 0
+    dropped = [int(c) for c in clusters[~alive]]
+    clusters, sums, counts = clusters[alive], sums[alive], counts[alive]
+    centroids = (sums / counts[:, None]).astype(np.float32)
+
+    changed = set(int(c) for c in previous["cluster"].to_numpy()[removed])
+    changed.update(int(c) for c in df["cluster"].to_numpy()[new_rows])
+    changed.difference_update(dropped)
+
+    history = {
+        "added_since_fit": state["added_since_fit"] + len(new_rows),
+        "opened_since_fit": state["opened_since_fit"] + len(opened),
+    }
+    drift = {
+        "growth": history["added_since_fit"] / max(state["fit_rows"], 1),
+        "new_cluster_rate": history["opened_since_fit"] / k,
+        "inertia_ratio": float(np.mean(df["distance"].to_numpy() ** 2)) / max(state["fit_mean_sq"], 1e-12),
+    }
+    exceeded = [name for name, value in drift.items() if value > _drift_limit(name)]
+    if exceeded:
+        return _refit(corpus, embeddings, combo, state_dir, threshold, model_name,
+                      f"deriva: {', '.join(exceeded)}", drift)
+
+    names = {int(c): name for c, name in state["names"].items() if int(c) not in dropped}
+    df["cluster"] = df["cluster"].astype(np.int64)
+    names.update(_name_clusters(df, changed))
+    _write_outputs(df, names, combo, changed, dropped)
+    _save_state(state_dir, {
+        **{key: state[key] for key in ("model", "threshold", "fit_rows", "fit_mean_sq", "refits")},
+        **history,
+        "clusters": clusters.tolist(),
+        "counts": counts.tolist(),
+        "names": names,
+    }, df, embeddings, centroids)
+
+    return {"refit": False, "reason": None, "added": len(new_rows), "removed": len(removed),
+            "new_clusters": len(opened), "renamed": len(changed), "dropped_clusters": len(dropped),
+            "n_clusters": len(clusters), "drift": drift}
+
+
+def _refit(corpus, embeddings, combo, state_dir, threshold, model_name, reason, drift=None):
+    method, linkage, k = combo
+    with stage("incremental.refit", rows=len(corpus)):
+        labels = fit_labels(method, linkage, k, embeddings)
+        assigner = CentroidAssigner.from_labels(embeddings, labels, metric="euclidean")
+        slot = {c: i for i, c in enumerate(assigner.clusters)}
+        own = np.array([slot[c] for c in labels], dtype=np.int64)
+        distances = np.linalg.norm(np.asarray(embeddings) - assigner.centroids[own], axis=1)
+
+    df = corpus.copy()
+    df["cluster"] = labels.astype(np.int64)
+    df["distance"] = distances
+
+    # O cache de nomes (utils.AWS) reaproveita clusters de composição idêntica
+    changed = set(int(c) for c in assigner.clusters)
+    names = _name_clusters(df, changed)
+    _write_outputs(df, names, combo, changed, dropped=None)
+
+    quantile = float(os.getenv("INCREMENTAL_THRESHOLD_QUANTILE", 0.99))
+    previous = _load_state(state_dir, meta_only=True)
+    _save_state(state_dir, {
+        "model": model_id(model_name),
+        "threshold": float(threshold or os.getenv("INCREMENTAL_DISTANCE_THRESHOLD", 0)
+                           or np.quantile(distances, quantile)),
+        "fit_rows": len(df),
+        "fit_mean_sq": float(np.mean(distances ** 2)),
+        "refits": (previous["refits"] + 1) if previous else 1,
+        "added_since_fit": 0,
+        "opened_since_fit": 0,
+        "clusters": [int(c) for c in assigner.clusters],
+        "counts": np.bincount(own, minlength=len(assigner.clusters)).tolist(),
+        "names": names,
+    }, df, np.asarray(embeddings, dtype=np.float32), assigner.centroids)
+
+    return {"refit": True, "reason": reason, "added": len(df), "removed": 0, "new_clusters": 0,
+            "renamed": len(changed), "dropped_clusters": 0, "n_clusters": len(changed), "drift": drift}
+
+
+def _open_clusters(embeddings, threshold, first_id):
+    # Agrupamento "leader": cada linha entra no cluster novo mais próximo
+    # dentro do limiar (centróide atualizado pela média) ou abre outro
+    sums, counts, opened = [], [], []
+    labels = np.empty(len(embeddings), dtype=np.int64)
+    distances = np.empty(len(embeddings))
+    for row, x in enumerate(embeddings):
+        if sums:
+            centers = np.asarray(sums) / np.asarray(counts)[:, None]
+            gaps = np.linalg.norm(centers - x, axis=1)
+            best = int(np.argmin(gaps))
+            if gaps[best] <= threshold:
+                sums[best] = sums[best] + x
+                counts[best] += 1
+                labels[row], distances[row] = opened[best], gaps[best]
+                continue
+        opened.append(first_id + len(opened))
+        sums.append(x.astype(np.float64))
+        counts.append(1)
+        labels[row], distances[row] = opened[-1], 0.0
+    return labels, distances, opened
+
+
+def _drift_limit(name):
+    return float(os.getenv(f"INCREMENTAL_MAX_{name.upper()}", DRIFT_LIMITS[name]))
+
+
+def _row_keys(df):
+    # Linhas repetidas (mesma seção e texto) são casadas pela ordem de
+    # ocorrência: a n-ésima cópia atual corresponde à n-ésima anterior
+    base = pd.Series(df["section"].astype(str).to_numpy() + "\0" + df["text"].astype(str).to_numpy())
+    return (base + "\0" + base.groupby(base).cumcount().astype(str)).to_numpy()
+
+
+def _name_clusters(df, clusters):
+    # Nomeia pelo LLM só os clusters informados
+    groups = [(c, texts) for c, texts in cluster_groups(df, "question") if int(c) in clusters]
+    if not groups:
+        return {}
+    with stage("incremental.name", rows=len(groups)):
+        names = generate_cluster_names([texts for _, texts in groups])
+    return {int(c): name for (c, _), name in zip(groups, names)}
+
+
+def _write_outputs(df, names, combo, changed, dropped):
+    # CSV completo; TXT só dos clusters alterados (dropped=None regrava todos)
+    csv_path, clusters_dir = result_paths(*combo)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    df.drop(columns="distance").to_csv(csv_path, index=False)
+
+    os.makedirs(clusters_dir, exist_ok=True)
+    stale = None if dropped is None else {f"{c}_" for c in set(changed) | set(dropped)}
+    for name in os.listdir(clusters_dir):
+        if name.endswith("_.txt") and (stale is None or any(name.startswith(p) for p in stale)):
+            os.remove(os.path.join(clusters_dir, name))
+    subset = df[df["cluster"].isin(list(changed))]
+    if len(subset):
+        save_txt_per_cluster(subset, clusters_dir, text_col="question",
+                             names={c: names[int(c)] for c in subset["cluster"].unique()})
+
+
+def _load_state(state_dir, meta_only=False):
+    path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if meta_only:
+        return state
+    state["corpus"] = pd.read_pickle(os.path.join(state_dir, "corpus.pkl"))
+    state["embeddings"] = np.load(os.path.join(state_dir, "embeddings.npy"), mmap_mode="r")
+    state["centroids"] = np.load(os.path.join(state_dir, "centroids.npy"))
+    return state
+
+
+def _save_state(state_dir, meta, df, embeddings, centroids):
+    # Arquivos de dados primeiro, state.json por último: um estado só é
+    # válido quando o JSON que o descreve foi gravado
+    os.makedirs(state_dir, exist_ok=True)
+    for name, save in (
+        ("corpus.pkl", lambda f: df.to_pickle(f)),
+        ("embeddings.npy", lambda f: np.save(f, np.asarray(embeddings, dtype=np.float32))),
+        ("centroids.npy", lambda f: np.save(f, np.asarray(centroids, dtype=np.float32))),
+    ):
+        path = os.path.join(state_dir, name)
+        with open(f"{path}.tmp", "wb") as f:
+            save(f)
+        os.replace(f"{path}.tmp", path)
+
+    meta = {**meta, "names": {str(c): name for c, name in meta["names"].items()},
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    path = os.path.join(state_dir, STATE_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Atualização incremental dos clusters com perguntas novas.")
+    parser.add_argument("--method", required=True, choices=sorted(CLUSTERING_METHODS))
+    parser.add_argument("--linkage", help="Linkage / estratégia de bisecção (padrão: o primeiro do método).")
+    parser.add_argument("--k", type=int, required=True)
+    parser.add_argument("--json-path", help="JSON de perguntas (padrão: JSON_PATH).")
+    parser.add_argument("--state-dir", help="Pasta do estado (padrão: INCREMENTAL_DIR/<método>_<linkage>_<k>).")
+    parser.add_argument("--threshold", type=float, help="Distância para abrir um cluster novo.")
+    parser.add_argument("--refit", action="store_true", help="Força o reajuste completo.")
+    parser.add_argument("--embedding-model", default=os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL))
+    args = parser.parse_args(argv)
+
+    report = update_clusters(args.method, args.k, args.linkage, json_path=args.json_path,
+                             state_dir=args.state_dir, threshold=args.threshold, refit=args.refit,
+                             model_name=args.embedding_model)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+kNN Connectivity Module
+=======================
+
+Grafo esparso de k vizinhos mais próximos sobre embeddings normalizados,
+usado como restrição de conectividade no clustering aglomerativo. Com o
+grafo, o AgglomerativeClustering só considera fusões entre vizinhos e não
+precisa da matriz de distâncias completa (memória O(n·k) em vez de O(n²)).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+try:
+    import pynndescent
+except ImportError:  # índice aproximado é opcional
+    pynndescent = None
+
+
+def knn_graph(embeddings, n_neighbors=15, method="exact", memory_mb=256):
+    """
+    Constrói o grafo kNN simétrico e conectado dos embeddings.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray, shape (n, dim)
+        Embeddings com norma unitária (similaridade de cosseno = produto
+        interno).
+    n_neighbors : int, optional (default=15)
+        Vizinhos por ponto.
+    method : {'exact', 'nndescent'}, optional (default='exact')
+        'exact' faz busca exata em blocos (produto de matrizes limitado a
+        `memory_mb` por bloco). 'nndescent' usa o índice aproximado do
+        pacote pynndescent, se instalado.
+    memory_mb : int, optional (default=256)
+        Memória máxima da matriz de similaridades de cada bloco.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix, shape (n, n)
+        Matriz de adjacência binária, simétrica e com um único componente
+        conexo (componentes isolados são ligados por `connect_components`).
+
+    Examples
+    --------
+    >>> graph = knn_graph(embeddings, n_neighbors=10)
+    >>> AgglomerativeClustering(n_clusters=20, connectivity=graph).fit(embeddings)
+    """
+    n = len(embeddings)
+    n_neighbors = max(1, min(n_neighbors, n - 1))
+
+    if method == "nndescent":
+        if pynndescent is None:
+            raise ImportError("method='nndescent' requer o pacote pynndescent.")
+        index = pynndescent.NNDescent(embeddings, n_neighbors=n_neighbors + 1,
+                                      metric="cosine", random_state=42)
+        neighbors, _ = index.neighbor_graph
+        neighbors = neighbors[:, 1:]
+    elif method == "exact":
+        neighbors = _exact_neighbors(embeddings, n_neighbors, memory_mb)
+    else:
+        raise ValueError(f"Método de busca kNN desconhecido: {method}")
+
+    rows = np.repeat(np.arange(n), neighbors.shape[1])
+    graph = sparse.csr_matrix(
+        (np.ones(rows.size, dtype=np.float32), (rows, neighbors.ravel())), shape=(n, n)
+    )
+    graph = graph.maximum(graph.T).tocsr()
+    return connect_components(graph, embeddings)
+
+
+def _exact_neighbors(embeddings, n_neighbors, memory_mb):
+    n = len(embeddings)
+    block = max(1, int(memory_mb * 1024 ** 2 // (4 * n)))
+    neighbors = np.empty((n, n_neighbors), dtype=np.int64)
+    # Conversão única: dentro do laço, cada bloco copiaria a matriz inteira
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        sims = embeddings[start:stop] @ embeddings.T
+        # Exclui o próprio ponto
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        neighbors[start:stop] = np.argpartition(-sims, n_neighbors - 1, axis=1)[:, :n_neighbors]
+    return neighbors
+
+
+def connect_components(graph, embeddings):
+    """
+    Liga componentes desconexos do grafo até restar um único componente.
+
+    A cada rodada, cada componente é ligado ao componente de centróide mais
+    próximo, por uma aresta entre o ponto de cada lado mais próximo do
+    centróide do outro. O número de componentes ao menos cai pela metade
+    por rodada.
+
+    Parameters
+    ----------
+    graph : scipy.sparse matrix, shape (n, n)
+        Grafo de adjacência simétrico.
+    embeddings : np.ndarray, shape (n, dim)
+        Embeddings normalizados.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Grafo conexo.
+    """
+    graph = graph.tocsr()
+    while True:
+        n_components, labels = connected_components(graph, directed=False)
+        if n_components == 1:
+            return graph
+
+        centroids = np.zeros((n_components, embeddings.shape[1]), dtype=np.float64)
+        np.add.at(centroids, labels, embeddings)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+
+        sims = centroids @ centroids.T
+        np.fill_diagonal(sims, -np.inf)
+        nearest = sims.argmax(axis=1)
+
+        order = np.argsort(labels, kind="stable")
+        members = np.split(order, np.cumsum(np.bincount(labels))[:-1])
+
+        rows, cols = [], []
+        for a, b in enumerate(nearest):
+            members_a, members_b = members[a], members[b]
+            # Ponto de A mais próximo do centróide de B, e vice-versa
+            rows.append(members_a[np.argmax(embeddings[members_a] @ centroids[b])])
+            cols.append(members_b[np.argmax(embeddings[members_b] @ centroids[a])])
+
+        bridges = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=graph.shape
+        )
+        graph = graph.maximum(bridges).maximum(bridges.T).tocsr()
+
+
+def compare_with_exact(embeddings, ks, linkage="ward", sample_size=5000,
+                       n_neighbors=None, random_state=42):
+    """
+    Compara o aglomerativo com grafo kNN ao aglomerativo exato em uma amostra.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray
+        Embeddings normalizados do corpus.
+    ks : iterable of int
+        Números de clusters a comparar.
+    linkage : str, optional (default='ward')
+        Linkage base ('ward', 'complete', 'average').
+    sample_size : int, optional (default=5000)
+        Tamanho da amostra (o modo exato é O(n²) em memória).
+    n_neighbors : int, optional
+        Vizinhos do grafo. Padrão: variável de ambiente KNN_NEIGHBORS ou 15.
+    random_state : int, optional (default=42)
+        Semente da amostragem.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Uma linha por k com o ARI e o NMI entre as duas partições.
+
+    Examples
+    --------
+    >>> compare_with_exact(embeddings, [10, 20, 50], linkage="ward")
+        k       ari       nmi
+    0  10  0.912...  0.934...
+    """
+    from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+    from utils.run import agglomerative_tree, cut_tree
+
+    rng = np.random.default_rng(random_state)
+    n = len(embeddings)
+    idx = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+    sample = np.asarray(embeddings[idx])
+
+    exact = agglomerative_tree(sample, linkage)
+    approx = agglomerative_tree(sample, f"{linkage}_knn", n_neighbors=n_neighbors)
+
+    rows = []
+    for k in ks:
+        a, b = cut_tree(exact, k), cut_tree(approx, k)
+        rows.append({
+            "k": k,
+            "ari": adjusted_rand_score(a, b),
+            "nmi": normalized_mutual_info_score(a, b),
+        })
+    return pd.DataFrame(rows)
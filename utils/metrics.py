@@ -1,37 +1,95 @@
 import numpy as np
+import pandas as pd
+
+# Nome da métrica no JSON de resultados -> coluna no DataFrame
+METRIC_COLUMNS = {
+    "Answer Relevancy": "answer_relevancy",
+    "Bert Similarity Metric": "bert_similarity",
+    "Correctness (GEval)": "correctness_geval",
+    "Prompt Alignment": "prompt_alignment",
+}
+
+# Tarefas pontuadas apenas pelo campo success
+BINARY_TASKS = {"tf", "choice"}
+SUCCESS_VALUES = {True, "true", 1}
 
 def split_metrics(metrics):
-    out = {
-        "answer_relevancy": None,
-        "bert_similarity": None,
-        "correctness_geval": None,
-        "prompt_alignment": None,
-    }
+    out = dict.fromkeys(METRIC_COLUMNS.values())
     for m in metrics:
-        if m["name"] == "Answer Relevancy":
-            out["answer_relevancy"] = m.get("score")
-        elif m["name"] == "Bert Similarity Metric":
-            out["bert_similarity"] = m.get("score")
-        elif m["name"] == "Correctness (GEval)":
-            out["correctness_geval"] = m.get("score")
-        elif m["name"] == "Prompt Alignment":
-            out["prompt_alignment"] = m.get("score")
+        col = METRIC_COLUMNS.get(m["name"])
+        if col is not None:
+            out[col] = m.get("score")
 
     return out 
 
+def split_metrics_frame(metrics_lists, index=None):
+    """
+    Expande listas de metricsData em colunas numéricas, em uma única passada.
+
+    Equivalente a `pd.Series(metrics_lists).apply(split_metrics).apply(pd.Series)`,
+    mas sem criar uma Series por linha. Métricas ausentes viram NaN.
+
+    Parameters
+    ----------
+    metrics_lists : iterable of list of dict
+        Conteúdo de metricsData de cada caso de teste.
+    index : pandas.Index, optional
+        Índice do DataFrame resultante.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Uma coluna float por métrica de METRIC_COLUMNS.
+    """
+    metrics_lists = list(metrics_lists)
+    columns = {col: np.full(len(metrics_lists), np.nan) for col in METRIC_COLUMNS.values()}
+    for i, metrics in enumerate(metrics_lists):
+        for m in metrics or ():
+            col = METRIC_COLUMNS.get(m["name"])
+            if col is not None:
+                score = m.get("score")
+                columns[col][i] = np.nan if score is None else score
+    return pd.DataFrame(columns, index=index)
+
 def compute_score(row):
-    if row["task"].lower() in {"tf", "choice"}:
-        return float(row["success"] in {True, "true", 1})
-    
+    if row["task"].lower() in BINARY_TASKS:
+        return float(row["success"] in SUCCESS_VALUES)
+    scores = [row[col] for col in METRIC_COLUMNS.values()]
+    scores = [s for s in scores if s is not None and not pd.isna(s)]
+    return float(np.mean(scores)) if scores else None
+
+def compute_scores(df):
+    """
+    Versão vetorizada de `compute_score` para o DataFrame inteiro.
+
+    - Tarefas tf/choice: 1.0 se `success` for True/"true"/1, senão 0.0
+    - Demais tarefas: média das colunas de METRIC_COLUMNS ignorando
+      valores ausentes (None/NaN); NaN se todas estiverem ausentes
 
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Resultado de `aglomerar`, com as colunas task, success e as
+        colunas de métricas.
 
+    Returns
+    -------
+    pandas.Series
+        Score float de cada linha, alinhado ao índice de `df`. Igual a
+        `df.apply(compute_score, axis=1)` (None vira NaN).
 
+    Examples
+    --------
+    >>> df["score"] = compute_scores(df)
+    """
+    metrics = pd.DataFrame(
+        {col: pd.to_numeric(df[col], errors="coerce") for col in METRIC_COLUMNS.values()},
+        index=df.index,
+    )
+    score = metrics.mean(axis=1, skipna=True)
 
-    scores = [
-        row["answer_relevancy"],
-        row["bert_similarity"],
-        row["correctness_geval"],
-        row["prompt_alignment"],
-    ]
-    scores = [s for s in scores if s is not None]
-    return float(np.mean(scores)) if scores else None
\ No newline at end of file
+    binary = df["task"].astype(str).str.lower().isin(BINARY_TASKS)
+    if binary.any():
+        success = df["success"].isin(list(SUCCESS_VALUES)).astype(float)
+        score = score.where(~binary, success)
+    return score.astype(float)
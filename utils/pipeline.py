@@ -0,0 +1,351 @@
+"""
+Pipeline Runner
+===============
+
+Executa a varredura completa como um grafo de etapas com checkpoints:
+
+    load -> embed -> fit (método, linkage, k) -> name -> write
+                                              \\-> evaluate
+
+Cada nó é identificado pelo hash do seu conteúdo de entrada (arquivo do
+corpus, modelo de embeddings, parâmetros do ajuste, chaves dos nós de que
+depende). Ao terminar, o resultado do nó é gravado em CHECKPOINT_DIR; uma
+nova execução reaproveita todo nó cuja chave já tem checkpoint e só refaz o
+que falta ou o que teve alguma entrada alterada. Se a varredura cair no meio
+(ex.: timeout do endpoint de nomeação depois das tentativas de `generate`),
+basta rodar de novo o mesmo comando.
+
+No top_bottom o BisectingKMeans ajustado também vira checkpoint (nó model):
+a avaliação atribui os casos pelo predict() do modelo, como `evaluate_grid`,
+e não pelo centróide mais próximo.
+
+Uso:
+
+    python -m utils.pipeline --max-clusters 51
+    python -m utils.pipeline --ks 10 20 30 --methods kmeans bottom_top:ward \\
+        --models-folder /caminho/para/pasta/modelos
+"""
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from utils.utils_IO import load_corpus, cluster_groups
+from utils.embeddings import DEFAULT_EMBEDDING_MODEL, embed_to_artifact, open_embedding_artifact, ARTIFACT_META
+from utils.embedding_backends import model_id
+from utils.run import CLUSTERING_METHODS, agglomerative_tree, bisecting_kmeans_estimator, fit_labels, result_paths
+from utils.writer import write_cluster_results
+from utils.AWS import generate_cluster_names
+from utils.tracing import stage
+
+
+# Incrementar invalida todos os checkpoints (mudança no formato ou na lógica dos nós)
+PIPELINE_VERSION = 2
+
+_FORMATS = {
+    "pkl": (pickle.dump, pickle.load),
+    "npy": (lambda value, f: np.save(f, value, allow_pickle=False), np.load),
+    "json": (lambda value, f: f.write(json.dumps(value, ensure_ascii=False).encode("utf-8")),
+             lambda f: json.loads(f.read().decode("utf-8"))),
+}
+
+
+class CheckpointStore:
+    """
+    Checkpoints dos nós, endereçados pelo conteúdo.
+
+    Cada nó fica em `<root>/<tipo>/<chave>.<formato>`, gravado de forma
+    atômica (arquivo temporário + rename): um nó interrompido no meio nunca
+    deixa checkpoint.
+
+    Parameters
+    ----------
+    root : str, optional
+        Pasta dos checkpoints. Padrão: variável de ambiente CHECKPOINT_DIR
+        ou "./.cache/pipeline".
+    force : bool, optional (default=False)
+        Ignora os checkpoints existentes e refaz todos os nós.
+    """
+
+    def __init__(self, root=None, force=False):
+        self.root = root or os.getenv("CHECKPOINT_DIR", "./.cache/pipeline")
+        self.force = force
+        self.counts = {}
+
+    @staticmethod
+    def key(kind, *parts):
+        """Chave de um nó: hash do tipo, da versão e das entradas."""
+        payload = json.dumps([PIPELINE_VERSION, kind, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def path(self, kind, key, fmt):
+        return os.path.join(self.root, kind, f"{key}.{fmt}")
+
+    def done(self, kind, key, fmt):
+        return not self.force and os.path.exists(self.path(kind, key, fmt))
+
+    def run(self, kind, key, fmt, compute, valid=None):
+        """
+        Retorna o resultado do nó, do checkpoint ou calculando-o.
+
+        Parameters
+        ----------
+        kind : str
+            Tipo do nó (load, embed, fit, ...), também a subpasta.
+        key : str
+            Chave do nó (ver `key`).
+        fmt : {'pkl', 'npy', 'json'}
+            Formato do checkpoint.
+        compute : callable
+            Calcula o resultado quando não há checkpoint.
+        valid : callable, optional
+            Confere um resultado carregado (ex.: se o arquivo a que ele
+            aponta ainda existe); se retornar False, o nó é refeito.
+        """
+        dump, load = _FORMATS[fmt]
+        path = self.path(kind, key, fmt)
+        status = self.counts.setdefault(kind, {"cached": 0, "computed": 0})
+        if self.done(kind, key, fmt):
+            with open(path, "rb") as f:
+                value = load(f)
+            if valid is None or valid(value):
+                status["cached"] += 1
+                return value
+
+        with stage(f"pipeline.{kind}"):
+            value = compute()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            dump(value, f)
+        os.replace(tmp, path)
+        status["computed"] += 1
+        return value
+
+
+def file_digest(path):
+    """sha256 do conteúdo de um arquivo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 ** 2), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def folder_manifest(folder):
+    """Nome, tamanho e mtime dos JSONs de uma pasta de resultados de modelos."""
+    manifest = []
+    for name in sorted(f for f in os.listdir(folder) if f.endswith(".json")):
+        info = os.stat(os.path.join(folder, name))
+        manifest.append((name, info.st_size, info.st_mtime_ns))
+    return manifest
+
+
+def parse_methods(specs):
+    """
+    Converte ["kmeans", "bottom_top:ward", ...] em {método: (linkages,)}.
+
+    Um método sem linkage usa todos os linkages de CLUSTERING_METHODS.
+    """
+    if not specs:
+        return dict(CLUSTERING_METHODS)
+    methods = {}
+    for spec in specs:
+        method, _, linkage = spec.partition(":")
+        if method not in CLUSTERING_METHODS:
+            raise ValueError(f"Método de clustering desconhecido: {method}")
+        linkages = (linkage,) if linkage else CLUSTERING_METHODS[method]
+        methods[method] = tuple(dict.fromkeys(methods.get(method, ()) + linkages))
+    return methods
+
+
+def run_pipeline(ks, methods=None, json_path=None, models_folder=None, model_name=DEFAULT_EMBEDDING_MODEL,
+                 name=True, checkpoint_dir=None, force=False):
+    """
+    Executa (ou retoma) a varredura completa com checkpoints por nó.
+
+    Parameters
+    ----------
+    ks : iterable of int
+        Valores de k.
+    methods : dict, optional
+        {método: (linkages,)}. Padrão: CLUSTERING_METHODS.
+    json_path : str, optional
+        JSON de perguntas. Padrão: variável de ambiente JSON_PATH.
+    models_folder : str, optional
+        Pasta de resultados de modelos; se informada, roda também o nó de
+        avaliação e grava RESULTS_PATH/evaluation_grid.csv.
+    model_name : str, optional
+        Modelo de embeddings.
+    name : bool, optional (default=True)
+        Nomeia os clusters pelo LLM e grava os resultados (nós name e
+        write). False roda só load, embed, fit e evaluate.
+    checkpoint_dir : str, optional
+        Pasta dos checkpoints (ver `CheckpointStore`).
+    force : bool, optional (default=False)
+        Refaz todos os nós.
+
+    Returns
+    -------
+    dict
+        labelings: {(método, linkage, k): rótulos}; evaluation: DataFrame
+        da avaliação (ou None); counts: nós reaproveitados e calculados por
+        tipo.
+
+    Examples
+    --------
+    >>> result = run_pipeline(range(5, 51, 5), models_folder="modelos/")
+    >>> result["counts"]["fit"]
+    {'cached': 30, 'computed': 0}
+    """
+    store = CheckpointStore(checkpoint_dir, force)
+    methods = parse_methods(None) if methods is None else methods
+    ks = sorted(set(int(k) for k in ks))
+    json_path = json_path or os.getenv("JSON_PATH")
+
+    # load: depende só do conteúdo do JSON
+    load_key = store.key("load", file_digest(json_path))
+    corpus = store.run("load", load_key, "pkl", lambda: load_corpus(json_path))
+
+    # embed: o checkpoint guarda o caminho do artefato (refeito se ele sumir)
+    dtype = os.getenv("EMBEDDING_DTYPE", "float32")
+    embed_key = store.key("embed", load_key, model_id(model_name), dtype)
+    artifact = store.run(
+        "embed", embed_key, "json",
+        lambda: embed_to_artifact(corpus["text"].tolist(), model_name=model_name, dtype=dtype),
+        valid=lambda path: os.path.exists(os.path.join(path, ARTIFACT_META)),
+    )
+    embeddings = open_embedding_artifact(artifact)[0]
+
+    labelings, fit_keys, models = {}, {}, {}
+    for method, linkages in methods.items():
+        for linkage in linkages:
+            tree = _TreeNode(store, embed_key, embeddings, linkage) if method == "bottom_top" else None
+            for k in ks:
+                fit_key = store.key("fit", embed_key, method, linkage, k)
+                if method == "top_bottom":
+                    # predict() do BisectingKMeans desce a árvore de bisecções:
+                    # o modelo ajustado vira um nó, reaproveitado na avaliação
+                    model = _ModelNode(store, fit_key, embeddings, linkage, k)
+                    labels = store.run("fit", fit_key, "npy", lambda: model.get().labels_)
+                    models[(method, linkage, k)] = model
+                else:
+                    labels = store.run("fit", fit_key, "npy",
+                                       lambda: fit_labels(method, linkage, k, embeddings, tree and tree.get()))
+                labelings[(method, linkage, k)] = labels
+                fit_keys[(method, linkage, k)] = fit_key
+                if name:
+                    _name_and_write(store, corpus, (method, linkage, k), fit_key, labels)
+
+    evaluation = None
+    if models_folder:
+        from utils.evaluation import evaluate_labelings
+
+        eval_key = store.key("evaluate", embed_key, model_id(model_name), folder_manifest(models_folder),
+                             sorted(fit_keys.values()))
+        evaluation = store.run("evaluate", eval_key, "pkl",
+                               lambda: evaluate_labelings(models_folder, embeddings, labelings,
+                                                          models={key: node.get() for key, node in models.items()},
+                                                          model_name=model_name))
+        results_path = os.getenv("RESULTS_PATH") or "."
+        os.makedirs(results_path, exist_ok=True)
+        evaluation.to_csv(os.path.join(results_path, "evaluation_grid.csv"), index=False)
+
+    return {"labelings": labelings, "evaluation": evaluation, "counts": store.counts}
+
+
+class _TreeNode:
+    # Árvore aglomerativa de um linkage: ajustada (ou lida do checkpoint)
+    # só se algum k ainda não tiver rótulos
+    def __init__(self, store, embed_key, embeddings, linkage):
+        self.store, self.embeddings, self.linkage = store, embeddings, linkage
+        self.key = store.key("tree", embed_key, linkage)
+        self._tree = None
+
+    def get(self):
+        if self._tree is None:
+            self._tree = self.store.run(
+                "tree", self.key, "pkl",
+                lambda: agglomerative_tree(np.asarray(self.embeddings), self.linkage))
+        return self._tree
+
+
+class _ModelNode:
+    # BisectingKMeans de uma combinação top_bottom: ajustado (ou lido do
+    # checkpoint) só se os rótulos ou a avaliação precisarem dele
+    def __init__(self, store, fit_key, embeddings, linkage, k):
+        self.store, self.embeddings, self.linkage, self.k = store, embeddings, linkage, k
+        self.key = fit_key
+        self._model = None
+
+    def get(self):
+        if self._model is None:
+            self._model = self.store.run(
+                "model", self.key, "pkl",
+                lambda: bisecting_kmeans_estimator(self.k, self.linkage).fit(self.embeddings))
+        return self._model
+
+
+def _name_and_write(store, corpus, combo, fit_key, labels):
+    df = corpus.copy()
+    df["cluster"] = labels
+
+    # name: uma chamada ao LLM por cluster; o checkpoint evita repeti-las
+    model = os.getenv("AWS_MODEL") or ""
+    name_key = store.key("name", fit_key, model)
+
+    def compute_names():
+        groups = cluster_groups(df, "question")
+        names = generate_cluster_names([texts for _, texts in groups])
+        return {str(cluster): name for (cluster, _), name in zip(groups, names)}
+
+    names = store.run("name", name_key, "json", compute_names)
+
+    # write: refeito se os arquivos de saída tiverem sido apagados
+    csv_path, clusters_dir = result_paths(*combo)
+    write_key = store.key("write", fit_key, name_key, csv_path, clusters_dir)
+
+    def compute_write():
+        write_cluster_results(df, csv_path, clusters_dir, text_col="question",
+                              names={cluster: names[str(cluster)] for cluster in df["cluster"].unique()})
+        return {"csv_path": csv_path, "clusters_dir": clusters_dir}
+
+    store.run("write", write_key, "json", compute_write,
+              valid=lambda out: os.path.exists(out["csv_path"]) and os.path.isdir(out["clusters_dir"]))
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Varredura de clustering com checkpoints (retomável).")
+    parser.add_argument("--json-path", help="JSON de perguntas (padrão: JSON_PATH).")
+    grid = parser.add_mutually_exclusive_group()
+    grid.add_argument("--max-clusters", type=int, default=51,
+                      help="Varre k = 5, 10, ... < max-clusters, como os runners (padrão: 51).")
+    grid.add_argument("--ks", type=int, nargs="+", help="Valores de k explícitos.")
+    parser.add_argument("--methods", nargs="+",
+                        help="Métodos, opcionalmente com linkage: kmeans top_bottom bottom_top:ward ...")
+    parser.add_argument("--models-folder", help="Pasta de resultados de modelos para a avaliação.")
+    parser.add_argument("--embedding-model", default=os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL))
+    parser.add_argument("--no-names", action="store_true", help="Não nomeia nem grava os clusters.")
+    parser.add_argument("--checkpoint-dir", help="Pasta dos checkpoints (padrão: CHECKPOINT_DIR).")
+    parser.add_argument("--force", action="store_true", help="Ignora os checkpoints e refaz tudo.")
+    args = parser.parse_args(argv)
+
+    ks = args.ks or range(5, args.max_clusters, 5)
+    result = run_pipeline(ks, parse_methods(args.methods), json_path=args.json_path,
+                          models_folder=args.models_folder, model_name=args.embedding_model,
+                          name=not args.no_names, checkpoint_dir=args.checkpoint_dir, force=args.force)
+
+    summary = pd.DataFrame(result["counts"]).T[["cached", "computed"]]
+    print(summary.to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Projection Module
+=================
+
+Projeção 2-D (PCA) dos embeddings usada nos gráficos da varredura. A
+projeção não depende de k nem do linkage: é calculada uma vez por matriz de
+embeddings e reaproveitada por todos os gráficos. Para artefatos de
+embeddings em disco (ver `utils.embeddings.embed_to_artifact`) ela é gravada
+ao lado da matriz e sobrevive entre execuções.
+"""
+
+import os
+import threading
+import weakref
+import numpy as np
+from utils.embeddings import ARTIFACT_META, memmap_file
+from utils.tracing import traced
+
+
+PROJECTION_FILE = "projection.npy"
+
+_projections = {}
+_lock = threading.Lock()
+
+
+def pca_projection(embeddings, randomized_rows=None, chunk_size=None):
+    """
+    Retorna a projeção PCA 2-D dos embeddings, calculando-a uma única vez.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray, shape (n, dim)
+        Matriz de embeddings (em memória ou memory map de um artefato).
+    randomized_rows : int, optional
+        A partir deste número de linhas usa PCA randomizado (matriz em
+        memória) ou incremental em blocos (memory map). Padrão: variável de
+        ambiente PCA_RANDOMIZED_ROWS ou 10000.
+    chunk_size : int, optional
+        Linhas por bloco do PCA incremental. Padrão: 8192.
+
+    Returns
+    -------
+    np.ndarray, shape (n, 2)
+        Coordenadas float32 de cada linha.
+    """
+    path = _artifact_projection_path(embeddings)
+    with _lock:
+        cached = _projections.get(id(embeddings))
+        if cached is not None and cached[0]() is embeddings:
+            return cached[1]
+        if path and os.path.exists(path):
+            reduced = np.load(path)
+        else:
+            reduced = _fit_projection(embeddings, randomized_rows, chunk_size)
+            if path:
+                tmp = f"{path}.tmp.npy"
+                np.save(tmp, reduced)
+                os.replace(tmp, path)
+        try:
+            ref = weakref.ref(embeddings, lambda _, key=id(embeddings): _projections.pop(key, None))
+            _projections[id(embeddings)] = (ref, reduced)
+        except TypeError:  # objetos sem weakref (ex.: listas) não são memoizados
+            pass
+        return reduced
+
+
+def _artifact_projection_path(embeddings):
+    # Memory map aberto de um artefato: a projeção fica na mesma pasta. Uma
+    # fatia do memory map não é a matriz do artefato (ver `memmap_file`)
+    filename = memmap_file(embeddings)
+    if not filename:
+        return None
+    folder = os.path.dirname(str(filename))
+    if not os.path.exists(os.path.join(folder, ARTIFACT_META)):
+        return None
+    return os.path.join(folder, PROJECTION_FILE)
+
+
+@traced("projection.fit")
+def _fit_projection(embeddings, randomized_rows, chunk_size):
+    from sklearn.decomposition import PCA, IncrementalPCA
+
+    n = len(embeddings)
+    randomized_rows = int(randomized_rows or os.getenv("PCA_RANDOMIZED_ROWS", 10000))
+    if n < randomized_rows:
+        return PCA(n_components=2).fit_transform(np.asarray(embeddings)).astype(np.float32)
+
+    if not isinstance(embeddings, np.memmap):
+        pca = PCA(n_components=2, svd_solver="randomized", random_state=42)
+        return pca.fit_transform(embeddings).astype(np.float32)
+
+    # Memory map: ajusta e projeta em blocos, sem carregar a matriz inteira
+    chunk_size = max(int(chunk_size or 8192), 2)
+    pca = IncrementalPCA(n_components=2)
+    for start in range(0, n, chunk_size):
+        block = np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+        if len(block) >= 2:
+            pca.partial_fit(block)
+    reduced = np.empty((n, 2), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        reduced[start:start + chunk_size] = pca.transform(
+            np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+        )
+    return reduced
+
+
+def plot_sample(n, max_points=None, random_state=42):
+    """
+    Índices das linhas desenhadas no gráfico.
+
+    Com `max_points` (padrão: variável de ambiente PLOT_MAX_POINTS; 0 ou
+    ausente desenha tudo), sorteia uma amostra fixa de linhas, a mesma em
+    todos os gráficos da varredura.
+    """
+    max_points = int(max_points or os.getenv("PLOT_MAX_POINTS", 0))
+    if not max_points or n <= max_points:
+        return slice(None)
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(n, size=max_points, replace=False))
@@ -0,0 +1,232 @@
+"""
+Cluster Quality Module
+======================
+
+Métricas internas de qualidade do clustering para escolher k sem rodar a
+avaliação completa em todos os pontos da grade: silhouette, Calinski-Harabasz,
+Davies-Bouldin e inércia.
+
+Todas as métricas percorrem os embeddings em blocos (funcionam sobre o
+memory map de um artefato). A silhouette, O(n²), é exata sobre uma amostra
+fixa de linhas; com amostragem desativada, é exata sobre todo o corpus,
+calculada em blocos com memória O(bloco · n).
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from utils.embeddings import load_embeddings
+from utils.tracing import traced
+
+
+QUALITY_METRICS = ["silhouette", "calinski_harabasz", "davies_bouldin", "inertia"]
+
+# Sentido de cada métrica na escolha de k: True = maior é melhor
+HIGHER_IS_BETTER = {
+    "silhouette": True,
+    "calinski_harabasz": True,
+    "davies_bouldin": False,
+    "inertia": False,
+}
+
+
+def cluster_quality(embeddings, labels, sample_size=None, chunk_size=None, random_state=42):
+    """
+    Calcula as métricas de qualidade de uma rotulação.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray, shape (n, dim), ou str
+        Embeddings do ajuste, ou o caminho de um artefato de embeddings.
+    labels : array-like, shape (n,)
+        Rótulo de cluster de cada linha.
+    sample_size : int, optional
+        Linhas usadas na silhouette. Padrão: variável de ambiente
+        QUALITY_SAMPLE_SIZE ou 10000; 0 usa todas as linhas.
+    chunk_size : int, optional
+        Linhas por bloco. Padrão: 8192.
+    random_state : int, optional (default=42)
+        Semente da amostra da silhouette (a mesma amostra para todo k).
+
+    Returns
+    -------
+    dict
+        n_clusters, silhouette, calinski_harabasz, davies_bouldin e inertia
+        (NaN quando há menos de 2 clusters).
+
+    Examples
+    --------
+    >>> cluster_quality(embeddings, df["cluster"])
+    {'n_clusters': 10, 'silhouette': 0.061, 'calinski_harabasz': 152.3, ...}
+    """
+    embeddings = load_embeddings(embeddings)
+    clusters, inverse = np.unique(np.asarray(labels), return_inverse=True)
+    k, n = len(clusters), len(inverse)
+    chunk_size = max(1, int(chunk_size or 8192))
+
+    result = {"n_clusters": k, **{metric: np.nan for metric in QUALITY_METRICS}}
+    if k < 2 or k >= n:
+        return result
+
+    result.update(_centroid_metrics(embeddings, inverse, k, chunk_size))
+
+    sample_size = int(os.getenv("QUALITY_SAMPLE_SIZE", 10000) if sample_size is None else sample_size)
+    rows = np.arange(n)
+    if sample_size and n > sample_size:
+        rng = np.random.default_rng(random_state)
+        rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+    result["silhouette"] = silhouette_blocked(embeddings, inverse, rows, chunk_size)
+    return result
+
+
+def _centroid_metrics(embeddings, inverse, k, chunk_size):
+    # Duas passadas em blocos: centróides, depois distâncias ao centróide
+    n, dim = len(inverse), embeddings.shape[1]
+    counts = np.bincount(inverse, minlength=k).astype(np.float64)
+    sums = np.zeros((k, dim), dtype=np.float64)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        sums += _indicator(inverse[start:stop], k).T @ np.asarray(embeddings[start:stop], dtype=np.float64)
+    centroids = sums / counts[:, None]
+
+    within_sq = np.zeros(k)
+    within_dist = np.zeros(k)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        own = inverse[start:stop]
+        sq = ((np.asarray(embeddings[start:stop], dtype=np.float64) - centroids[own]) ** 2).sum(axis=1)
+        within_sq += np.bincount(own, weights=sq, minlength=k)
+        within_dist += np.bincount(own, weights=np.sqrt(sq), minlength=k)
+
+    inertia = within_sq.sum()
+    mean = sums.sum(axis=0) / n
+    between = (counts * ((centroids - mean) ** 2).sum(axis=1)).sum()
+    calinski_harabasz = 1.0 if inertia == 0 else between * (n - k) / (inertia * (k - 1))
+
+    # Davies-Bouldin: média do pior (s_i + s_j) / d(c_i, c_j) de cada cluster
+    scatter = within_dist / counts
+    sq_norms = (centroids ** 2).sum(axis=1)
+    distances = np.sqrt(np.maximum(sq_norms[:, None] + sq_norms[None, :] - 2 * centroids @ centroids.T, 0))
+    np.fill_diagonal(distances, 0)
+    if np.allclose(scatter, 0) or np.allclose(distances, 0):
+        davies_bouldin = 0.0
+    else:
+        distances[distances == 0] = np.inf
+        ratios = (scatter[:, None] + scatter[None, :]) / distances
+        davies_bouldin = float(np.max(ratios, axis=1).mean())
+
+    return {
+        "calinski_harabasz": float(calinski_harabasz),
+        "davies_bouldin": davies_bouldin,
+        "inertia": float(inertia),
+    }
+
+
+def silhouette_blocked(embeddings, inverse, rows=None, chunk_size=8192, memory_mb=256):
+    """
+    Silhouette exata (distância euclidiana) das linhas `rows`, em blocos.
+
+    Cada bloco calcula as distâncias para todas as linhas selecionadas e as
+    soma por cluster com um produto esparso; a memória fica em
+    O(bloco · len(rows)). Clusters unitários têm silhouette 0, como no
+    scikit-learn.
+    """
+    rows = np.arange(len(inverse)) if rows is None else np.asarray(rows)
+    X = np.asarray(embeddings[rows], dtype=np.float64)
+    _, own_all = np.unique(inverse[rows], return_inverse=True)
+    k, m = int(own_all.max()) + 1, len(rows)
+    if k < 2 or k >= m:
+        return np.nan
+
+    members = _indicator(own_all, k)
+    sizes = np.bincount(own_all, minlength=k).astype(np.float64)
+    sq_norms = (X ** 2).sum(axis=1)
+    block = max(1, min(chunk_size, int(memory_mb * 1024 ** 2 // (8 * m))))
+
+    scores = np.empty(m)
+    for start in range(0, m, block):
+        stop = min(start + block, m)
+        local = np.arange(stop - start)
+        dist = sq_norms[start:stop, None] + sq_norms[None, :] - 2 * X[start:stop] @ X.T
+        dist = np.sqrt(np.maximum(dist, 0))
+        dist[local, start + local] = 0
+        per_cluster = np.asarray((members.T @ dist.T).T)
+
+        own = own_all[start:stop]
+        a = per_cluster[local, own] / np.maximum(sizes[own] - 1, 1)
+        per_cluster[local, own] = np.inf
+        b = (per_cluster / sizes).min(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s = (b - a) / np.maximum(a, b)
+        scores[start:stop] = np.where(sizes[own] > 1, np.nan_to_num(s), 0.0)
+    return float(scores.mean())
+
+
+def _indicator(inverse, k):
+    # Matriz esparsa (linhas, k) com 1 na coluna do cluster de cada linha
+    n = len(inverse)
+    return sparse.csr_matrix((np.ones(n), (np.arange(n), inverse)), shape=(n, k))
+
+
+@traced("quality.quality_table")
+def quality_table(embeddings, labelings, path=None, **kwargs):
+    """
+    Tabela de qualidade de toda a grade (método, linkage, k).
+
+    Parameters
+    ----------
+    embeddings : np.ndarray ou str
+        Embeddings do corpus (ou caminho do artefato), reaproveitados por
+        todas as combinações.
+    labelings : dict
+        Mapeia (método, linkage, k) para os rótulos ou para o DataFrame com
+        a coluna 'cluster' (ex.: o retorno de `utils.sweep.run_sweep`).
+    path : str, optional
+        Se informado, grava a tabela em CSV.
+    **kwargs
+        Repassados para `cluster_quality`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Uma linha por combinação: method, linkage, k, n_clusters e as
+        métricas de QUALITY_METRICS.
+
+    Examples
+    --------
+    >>> results = run_sweep(51)
+    >>> quality = quality_table(embeddings, results, path="quality.csv")
+    >>> best_ks(quality, "silhouette", top=2)
+    """
+    embeddings = load_embeddings(embeddings)
+    rows = []
+    for (method, linkage, k), labels in labelings.items():
+        if isinstance(labels, pd.DataFrame):
+            labels = labels["cluster"]
+        rows.append({"method": method, "linkage": linkage, "k": k,
+                     **cluster_quality(embeddings, labels, **kwargs)})
+
+    table = pd.DataFrame(rows, columns=["method", "linkage", "k", "n_clusters", *QUALITY_METRICS])
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        table.to_csv(path, index=False)
+    return table
+
+
+def best_ks(table, metric="silhouette", top=3):
+    """
+    Os `top` melhores k de cada (método, linkage) segundo uma métrica.
+
+    Use para podar a grade antes da avaliação completa (ver
+    `utils.evaluation.evaluate_grid`). A inércia sempre cai com k; prefira
+    silhouette, calinski_harabasz ou davies_bouldin.
+    """
+    ordered = table.sort_values(metric, ascending=not HIGHER_IS_BETTER[metric], na_position="last")
+    return (
+        ordered
+        .groupby(["method", "linkage"], dropna=False, sort=False)
+        .head(top)
+        .sort_values(["method", "linkage", "k"])
+        .reset_index(drop=True)
+    )
@@ -1,187 +1,595 @@
 import os
+import time
+import tempfile
+import heapq
+import itertools
+import numpy as np
 import pandas as pd
-from utils.utils_IO import save_txt_per_cluster
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans , BisectingKMeans, AgglomerativeClustering
-from sklearn.decomposition import PCA
-from dotenv import load_dotenv
-import matplotlib as plt
-load_dotenv()
+from utils.utils_IO import load_corpus
+from utils.embeddings import (encode_texts, embed_to_artifact, open_embedding_artifact, load_embeddings,
+                              DEFAULT_EMBEDDING_MODEL)
+from utils.writer import ArtifactWriter, write_cluster_results, render_pca
+from utils.tracing import traced
+
+# sklearn é importado dentro das funções que o usam: importar utils.run
+# (ou utils.evaluation) não carrega sklearn nem sentence_transformers. As
+# variáveis de ambiente são lidas na chamada; o .env é carregado pelos
+# pontos de entrada (notebook, `python -m utils.pipeline`).
+
+# Métodos da varredura e seus linkages / estratégias de bisecção
+CLUSTERING_METHODS = {
+    "kmeans": (None,),
+    "top_bottom": ("largest_cluster",),
+    "bottom_top": ("ward", "complete"),
+}
+
+
+#corpus
+@traced("run.prepare_corpus")
+def prepare_corpus(json_path=None, artifact_dir=None, model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Carrega o corpus de perguntas e seus embeddings uma única vez por execução.
+
+    Parameters
+    ----------
+    json_path : str, optional
+        Caminho do JSON de perguntas. Padrão: variável de ambiente JSON_PATH.
+    artifact_dir : str, optional
+        Pasta de artefatos de embeddings. Se definida (ou se a variável de
+        ambiente EMBEDDING_ARTIFACT_DIR estiver definida), a matriz é gravada
+        em disco uma vez (ver `utils.embeddings.embed_to_artifact`) e
+        devolvida como memory map somente leitura, compartilhável entre
+        processos sem cópia.
+    model_name : str, optional (default="all-MiniLM-L6-v2")
+        Modelo de embeddings.
+
+    Returns
+    -------
+    tuple of (pandas.DataFrame, np.ndarray)
+        Corpus section/question/text e a matriz de embeddings normalizados,
+        alinhada linha a linha com o corpus.
+    """
+    corpus = load_corpus(json_path or os.getenv("JSON_PATH"))
+    texts = corpus["text"].tolist()
+    artifact_dir = artifact_dir or os.getenv("EMBEDDING_ARTIFACT_DIR")
+    if artifact_dir:
+        embeddings, _, _ = open_embedding_artifact(embed_to_artifact(texts, artifact_dir, model_name))
+    else:
+        embeddings = encode_texts(texts, model_name=model_name, normalize=True)
+    return corpus, embeddings
+
+
+def _resolve_corpus(corpus, embeddings, json_path):
+    # `embeddings` pode ser a matriz ou o caminho de um artefato em disco
+    embeddings = load_embeddings(embeddings)
+    if corpus is None:
+        corpus, embeddings = prepare_corpus(json_path)
+    elif embeddings is None:
+        embeddings = encode_texts(corpus["text"].tolist(), normalize=True)
+    return corpus.copy(), embeddings
+
+
+def fit_labels(method, linkage, k, embeddings, tree=None):
+    """
+    Rótulos de uma combinação (método, linkage, k) da varredura.
+
+    Parameters
+    ----------
+    method : {'kmeans', 'top_bottom', 'bottom_top'}
+        Método de clustering (ver CLUSTERING_METHODS).
+    linkage : str or None
+        Linkage / estratégia de bisecção.
+    k : int
+        Número de clusters.
+    embeddings : np.ndarray
+        Embeddings do corpus.
+    tree : sklearn.cluster.AgglomerativeClustering, optional
+        Árvore de `agglomerative_tree` já ajustada (bottom_top); se None, é
+        ajustada aqui.
+
+    Returns
+    -------
+    np.ndarray, shape (n,)
+    """
+    if method == "kmeans":
+        # Mesmo limite de `kmeans_model`: k acima do corpus vira um cluster por linha
+        labels = kmeans_estimator(min(k, len(embeddings))).fit_predict(embeddings)
+    elif method == "top_bottom":
+        labels = bisecting_kmeans_estimator(k, linkage).fit_predict(embeddings)
+    elif method == "bottom_top":
+        labels = cut_tree(tree if tree is not None else agglomerative_tree(np.asarray(embeddings), linkage), k)
+    else:
+        raise ValueError(f"Método de clustering desconhecido: {method}")
+    return np.asarray(labels)
 
 
 #kmeans
-def kmeans_model(chosen_k):
-    raw = pd.read_json(os.getenv('JSON_PATH'))
-    rows = []
+def kmeans_estimator(k):
+    from sklearn.cluster import KMeans
+    return KMeans(n_clusters=k, random_state=42, n_init=20)
 
-    for section in raw.columns: 
-        block = raw[section]
 
-        if "question" not in block:
-            continue
-
-        questions = block["question"]
-        answers = block.get("answer", [None] * len(questions))
-
-        for q, a in zip(questions, answers):
-            text = q
-            if section in {"qa", "completion"} and a is not None:
-                text = f"{q} {a}"
-
-            rows.append({
-                "section": section,
-                "question": q,
-                "text": text
-            })
-
-    df = pd.DataFrame(rows)
-
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = embed_model.encode(
-        df["text"].tolist(),
-        normalize_embeddings=True,
-        show_progress_bar=True
-    )
+@traced("run.kmeans_model")
+def kmeans_model(chosen_k, corpus=None, embeddings=None):
+    df, embeddings = _resolve_corpus(corpus, embeddings, None)
 
     k = min(chosen_k, len(df))
-    kmeans = KMeans(n_clusters=k, random_state=42, n_init=20)
+    kmeans = kmeans_estimator(k)
     df["cluster"] = kmeans.fit_predict(embeddings)
     print(df)
     return df, kmeans
 
-def kmeans_run(max_clusters: int):
+@traced("run.kmeans_streaming_sweep", rows=None)
+def kmeans_streaming_sweep(ks, corpus=None, json_path=None, chunk_size=None, n_epochs=1):
+    """
+    K-Means em streaming (MiniBatchKMeans) para corpora maiores que a RAM.
+
+    Os textos são codificados uma única vez, em blocos: cada bloco alimenta
+    `partial_fit` de todos os modelos da varredura e é gravado em um .npy
+    temporário (memory map). As demais épocas e a passada de `predict` leem
+    os blocos desse arquivo, sem codificar de novo. A matriz de embeddings
+    completa nunca fica na memória: o processo lê um bloco por vez, e o
+    arquivo ocupa n × dim × 4 bytes em disco (pasta de `tempfile`).
+
+    Parameters
+    ----------
+    ks : iterable of int
+        Números de clusters a ajustar (todos na mesma passada).
+    corpus : pandas.DataFrame, optional
+        Corpus já carregado (ver `utils.utils_IO.load_corpus`).
+    json_path : str, optional
+        Caminho do JSON, usado quando `corpus` é None.
+    chunk_size : int, optional
+        Textos por bloco. Padrão: variável de ambiente KMEANS_CHUNK_SIZE ou
+        4096 (no mínimo o maior k).
+    n_epochs : int, optional (default=1)
+        Passadas de `partial_fit` sobre o corpus.
+
+    Returns
+    -------
+    dict
+        Mapeia k para (DataFrame do corpus com a coluna 'cluster', modelo).
+    """
+    if corpus is None:
+        corpus = load_corpus(json_path or os.getenv("JSON_PATH"))
+    texts = corpus["text"].tolist()
+    ks = [min(k, len(texts)) for k in ks]
+    chunk_size = max(int(chunk_size or os.getenv("KMEANS_CHUNK_SIZE", 4096)), max(ks))
+
+    from sklearn.cluster import MiniBatchKMeans
+
+    models = {k: MiniBatchKMeans(n_clusters=k, random_state=42, batch_size=chunk_size, n_init=3)
+              for k in ks}
+    chunks = [(start, start + chunk_size) for start in range(0, len(texts), chunk_size)]
+    labels = {k: np.empty(len(texts), dtype=np.int32) for k in ks}
+
+    with tempfile.TemporaryDirectory(prefix="kmeans_stream_") as tmp:
+        spilled = None
+        for epoch in range(n_epochs):
+            for start, stop in chunks:
+                if epoch == 0:
+                    # Primeira passada: codifica e grava o bloco no memory map
+                    block = encode_texts(texts[start:stop], normalize=True, show_progress_bar=False)
+                    if spilled is None:
+                        spilled = np.lib.format.open_memmap(os.path.join(tmp, "embeddings.npy"), mode="w+",
+                                                            dtype=np.float32, shape=(len(texts), block.shape[1]))
+                    spilled[start:stop] = block
+                else:
+                    block = np.asarray(spilled[start:stop])
+                # Um bloco pequeno no fim não pode inicializar, mas pode atualizar
+                for model in models.values():
+                    model.partial_fit(block)
+
+        for start, stop in chunks:
+            block = np.asarray(spilled[start:stop])
+            for k, model in models.items():
+                labels[k][start:stop] = model.predict(block)
+        del spilled
+
+    results = {}
+    for k in ks:
+        df = corpus.copy()
+        df["cluster"] = labels[k]
+        results[k] = (df, models[k])
+    return results
+
+
+@traced("run.kmeans_warm_sweep", rows=None)
+def kmeans_warm_sweep(ks, corpus=None, embeddings=None, compare=False):
+    """
+    Varredura de K-Means em que cada k parte da solução do k anterior.
+
+    O menor k é ajustado do zero (`kmeans_estimator`). Cada k seguinte é
+    inicializado dividindo em dois, com um 2-means, os clusters de maior
+    inércia da solução anterior até chegar a k centróides, e refinado com
+    uma única execução de Lloyd (n_init=1) — em vez de 20 reinícios
+    k-means++ por ponto.
+
+    Parameters
+    ----------
+    ks : iterable of int
+        Números de clusters (ordenados de forma crescente).
+    corpus, embeddings : optional
+        Corpus e embeddings já preparados (ver `prepare_corpus`).
+    compare : bool, optional (default=False)
+        Ajusta também cada k do zero, para comparar tempo e inércia.
+
+    Returns
+    -------
+    tuple of (dict, pandas.DataFrame)
+        Mapeia k para (DataFrame do corpus com a coluna 'cluster', modelo), e
+        a tabela k, mode ('warm' ou 'cold'), seconds, inertia, n_iter.
+
+    Examples
+    --------
+    >>> results, stats = kmeans_warm_sweep(range(5, 51, 5), compare=True)
+    >>> stats.pivot(index="k", columns="mode", values="seconds")
+    """
+    df, embeddings = _resolve_corpus(corpus, embeddings, None)
+    X = np.asarray(embeddings)
+    ks = sorted({min(k, len(X)) for k in ks})
+
+    from sklearn.cluster import KMeans
+
+    results, stats, model = {}, [], None
+    for k in ks:
+        start = time.perf_counter()
+        if model is None:
+            model = kmeans_estimator(k).fit(X)
+        else:
+            init = _split_centroids(X, model.labels_, model.cluster_centers_, k)
+            model = KMeans(n_clusters=k, init=init, n_init=1, random_state=42).fit(X)
+        stats.append({"k": k, "mode": "warm", "seconds": time.perf_counter() - start,
+                      "inertia": model.inertia_, "n_iter": model.n_iter_})
+
+        if compare:
+            start = time.perf_counter()
+            cold = kmeans_estimator(k).fit(X)
+            stats.append({"k": k, "mode": "cold", "seconds": time.perf_counter() - start,
+                          "inertia": cold.inertia_, "n_iter": cold.n_iter_})
+
+        out = df.copy()
+        out["cluster"] = model.labels_
+        results[k] = (out, model)
+    return results, pd.DataFrame(stats)
+
+
+def _split_centroids(X, labels, centers, k):
+    from sklearn.cluster import KMeans
+
+    # Heap de clusters pela inércia (maior primeiro); divide o pior até ter k
+    order = itertools.count()
+
+    def entry(members, center):
+        return (-float(((X[members] - center) ** 2).sum()), next(order), members, center)
+
+    heap = [entry(np.flatnonzero(labels == c), center) for c, center in enumerate(centers)]
+    heapq.heapify(heap)
+    kept = []
+    while heap and len(heap) + len(kept) < k:
+        neg_sse, _, members, center = heapq.heappop(heap)
+        if len(members) < 2 or neg_sse == 0:
+            kept.append(center)  # nada a dividir
+            continue
+        split = KMeans(n_clusters=2, n_init=1, random_state=42).fit(X[members])
+        for child in range(2):
+            heapq.heappush(heap, entry(members[split.labels_ == child], split.cluster_centers_[child]))
+
+    init = np.array(kept + [center for *_, center in heap], dtype=np.float64)
+    if len(init) < k:
+        # Clusters degenerados (pontos repetidos): completa com pontos ao acaso
+        rng = np.random.default_rng(42)
+        init = np.vstack([init, X[rng.choice(len(X), size=k - len(init), replace=False)]])
+    return init
+
+
+@traced("run.kmeans_run", rows=None)
+def kmeans_run(max_clusters: int, corpus=None, embeddings=None, streaming=False, chunk_size=None,
+               warm_start=False):
     os.makedirs(f"{os.getenv('RESULTS_PATH')}/K_Means", exist_ok=True)
-    for i in range(5, max_clusters, 5):
-            result = kmeans_model(chosen_k=i)
-            df = result[0] if isinstance(result, tuple) else result
+    # Artefatos gravados em segundo plano (utils.writer), fora do caminho do ajuste
+    with ArtifactWriter(parquet_path=f"{os.getenv('RESULTS_PATH')}/K_Means/sweep.parquet") as writer:
+        if streaming:
+            # Memória limitada a um bloco de embeddings, para qualquer tamanho de corpus
+            results = kmeans_streaming_sweep(range(5, max_clusters, 5), corpus=corpus, chunk_size=chunk_size)
+            for i, (df, _) in results.items():
+                save_kmeans_results(df, i, writer)
+            return
+        if warm_start:
+            # Cada k inicializado pela divisão dos clusters do k anterior
+            results, stats = kmeans_warm_sweep(range(5, max_clusters, 5), corpus=corpus, embeddings=embeddings)
+            stats.to_csv(f"{os.getenv('RESULTS_PATH')}/K_Means/warm_start_stats.csv", index=False)
+            for i, (df, _) in results.items():
+                save_kmeans_results(df, i, writer)
+            return
+        corpus, embeddings = _resolve_corpus(corpus, embeddings, None)
+        for i in range(5, max_clusters, 5):
+                result = kmeans_model(chosen_k=i, corpus=corpus, embeddings=embeddings)
+                df = result[0] if isinstance(result, tuple) else result
+                save_kmeans_results(df, i, writer)
 
-            save_txt_per_cluster(df, f"{os.getenv('RESULTS_PATH')}/K_Means/Clusters/{i}", text_col="question")
-            df.to_csv(f"{os.getenv('RESULTS_PATH')}/K_Means/{i}_final_results_kmeans.csv", index=False)
 
+def save_kmeans_results(df, k, writer=None):
+    _save_results(df, ("kmeans", None, k), writer)
 
 
+def result_paths(method, linkage, k):
+    """
+    Caminhos do CSV e da pasta de TXT por cluster de uma combinação.
 
-#top-bottom
-def hierachical_clustering_top_bottom(chosen_k,linkage="largest_cluster",json_path=os.getenv("JSON_PATH")):
-    raw = pd.read_json(json_path)
-    rows = []
+    Returns
+    -------
+    tuple of (str, str)
+        (csv_path, clusters_dir) sob RESULTS_PATH, no layout dos runners.
+    """
+    results_path = os.getenv("RESULTS_PATH")
+    if method == "kmeans":
+        return (f"{results_path}/K_Means/{k}_final_results_kmeans.csv",
+                f"{results_path}/K_Means/Clusters/{k}")
+    if method == "top_bottom":
+        return (f"{results_path}/Hierarchical/Top-Bottom/csv/{linkage}_final_results_hierarchical_{k}.csv",
+                f"{results_path}/Hierarchical/Top-Bottom/clusters/{linkage}/{k}")
+    if method == "bottom_top":
+        return (f"{results_path}/Hierarchical/Bottom-top/csv/{linkage}_final_results_hierarchical_{k}.csv",
+                f"{results_path}/Hierarchical/Bottom-top/clusters/{linkage}/{k}")
+    raise ValueError(f"Método de clustering desconhecido: {method}")
 
-    for section in raw.columns: 
-        block = raw[section]
 
-        if "question" not in block:
-            continue
+def _save_results(df, key, writer):
+    csv_path, clusters_dir = result_paths(*key)
+    # Sem writer, grava de forma síncrona (uso avulso das funções save_*)
+    if writer is None:
+        write_cluster_results(df, csv_path, clusters_dir, text_col="question")
+    else:
+        writer.write_results(df, csv_path, clusters_dir, key, text_col="question")
 
-        questions = block["question"]
-        answers = block.get("answer", [None] * len(questions))
 
-        for q, a in zip(questions, answers):
-            text = q
-            if section in {"qa", "completion"} and a is not None:
-                text = f"{q} {a}"
 
-            rows.append({
-                "section": section,
-                "question": q,
-                "text": text
-            })
 
-    df = pd.DataFrame(rows)
+#top-bottom
+def bisecting_kmeans_estimator(k, linkage="largest_cluster"):
+    from sklearn.cluster import BisectingKMeans
+    return BisectingKMeans(n_clusters=k, init="k-means++", n_init=1, random_state=42,
+                           max_iter=300, verbose=0, tol=0.0001,
+                           copy_x=True, algorithm='lloyd', bisecting_strategy=linkage)
 
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = embed_model.encode(
-        df["text"].tolist(),
-        normalize_embeddings=True,
-        show_progress_bar=True
-    )
 
-    hierach = BisectingKMeans(n_clusters=chosen_k, init="k-means++", n_init=1, random_state=42,
-                               max_iter=300, verbose=0, tol=0.0001, 
-                              copy_x=True, algorithm='lloyd', bisecting_strategy=linkage)
-    df["cluster"] = hierach.fit_predict(embeddings)
-    pca = PCA(n_components=2)
-    reduced = pca.fit_transform(embeddings)
+@traced("run.hierachical_clustering_top_bottom")
+def hierachical_clustering_top_bottom(chosen_k,linkage="largest_cluster",json_path=None,corpus=None,embeddings=None,writer=None):
+    df, embeddings = _resolve_corpus(corpus, embeddings, json_path)
 
-    plt.figure()
-    plt.scatter(reduced[:, 0], reduced[:, 1], c=df["cluster"])
-    plt.xlabel("PCA 1")
-    plt.ylabel("PCA 2")
-    plt.title("Bisecting K-Means Clustering (PCA)")
-    plt.savefig(f"{os.getenv('RESULTS_PATH')}/Hierarchical/Top-Bottom/plots/{linkage}_{chosen_k}.png", dpi=300, bbox_inches="tight")
-    plt.show()
+    hierach = bisecting_kmeans_estimator(chosen_k, linkage)
+    df["cluster"] = hierach.fit_predict(embeddings)
+    _plot_pca(embeddings, df["cluster"], "Bisecting K-Means Clustering (PCA)",
+              f"{os.getenv('RESULTS_PATH')}/Hierarchical/Top-Bottom/plots/{linkage}_{chosen_k}.png", writer)
 
 
     return df , hierach
 
 
-def hierarchical_top_bottom_run(max_clusters: int):
+@traced("run.hierarchical_top_bottom_run", rows=None)
+def hierarchical_top_bottom_run(max_clusters: int, corpus=None, embeddings=None):
     os.makedirs(f"{os.getenv('RESULTS_PATH')}/Hierarchical/Top-Bottom", exist_ok=True)
-    for linkage in ['largest_cluster', 'largest_cluster']:
-        for i in range(5, max_clusters, 5):
-                df, _ = hierachical_clustering_top_bottom(chosen_k=i,linkage=linkage)
-                save_txt_per_cluster(df, f"{os.getenv('RESULTS_PATH')}/Hierarchical/Top-Bottom/clusters/{linkage}/{i}", text_col="question")
-                df.to_csv(f"{os.getenv('RESULTS_PATH')}/Hierarchical/Top-Bottom/csv/{linkage}_final_results_hierarchical_{i}.csv", index=False)
-
+    corpus, embeddings = _resolve_corpus(corpus, embeddings, None)
+    with ArtifactWriter(parquet_path=f"{os.getenv('RESULTS_PATH')}/Hierarchical/Top-Bottom/sweep.parquet") as writer:
+        for linkage in ['largest_cluster', 'largest_cluster']:
+            for i in range(5, max_clusters, 5):
+                    df, _ = hierachical_clustering_top_bottom(chosen_k=i,linkage=linkage,corpus=corpus,embeddings=embeddings,writer=writer)
+                    save_top_bottom_results(df, linkage, i, writer)
 
 
+def save_top_bottom_results(df, linkage, k, writer=None):
+    _save_results(df, ("top_bottom", linkage, k), writer)
 
-#bottom-top
-def hierarchical_clustering_bottom_top(chosen_k,linkage,json_path=os.getenv("JSON_PATH")):
-    raw = pd.read_json(json_path)
-    rows = []
 
-    for section in raw.columns: 
-        block = raw[section]
 
-        if "question" not in block:
-            continue
 
-        questions = block["question"]
-        answers = block.get("answer", [None] * len(questions))
-
-        for q, a in zip(questions, answers):
-            text = q
-            if section in {"qa", "completion"} and a is not None:
-                text = f"{q} {a}"
-
-            rows.append({
-                "section": section,
-                "question": q,
-                "text": text
-            })
-
-    df = pd.DataFrame(rows)
-
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = embed_model.encode(
-        df["text"].tolist(),
-        normalize_embeddings=True,
-        show_progress_bar=True
-    )
-
-    hierach = AgglomerativeClustering(n_clusters=chosen_k,
-                                       metric='euclidean' if linkage =='ward' else 'cosine',  
-                                        compute_full_tree='auto', 
-                                       linkage=linkage, distance_threshold=None if chosen_k != None else 2.5,
-                                         compute_distances=False)
+#bottom-top
+@traced("run.hierarchical_clustering_bottom_top")
+def hierarchical_clustering_bottom_top(chosen_k,linkage,json_path=None,corpus=None,embeddings=None,writer=None):
+    df, embeddings = _resolve_corpus(corpus, embeddings, json_path)
+
+    hierach = agglomerative_estimator(linkage, embeddings, n_clusters=chosen_k,
+                                        compute_full_tree='auto',
+                                        distance_threshold=None if chosen_k != None else 2.5,
+                                        compute_distances=False)
     df["cluster"] = hierach.fit_predict(embeddings)
-    pca = PCA(n_components=2)
-    reduced = pca.fit_transform(embeddings)
-
-    plt.figure()
-    plt.scatter(reduced[:, 0], reduced[:, 1], c=df["cluster"])
-    plt.xlabel("PCA 1")
-    plt.ylabel("PCA 2")
-    plt.title("Hierarchical Clustering (PCA)")
-    plt.savefig(f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top/plots/_{linkage}.png", dpi=300, bbox_inches="tight")
-    plt.show()
+    _plot_pca(embeddings, df["cluster"], "Hierarchical Clustering (PCA)",
+              f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top/plots/_{linkage}.png", writer)
     return df
+
+
+def agglomerative_estimator(linkage, embeddings, n_neighbors=None, **kwargs):
+    """
+    Cria o AgglomerativeClustering para um linkage da varredura.
+
+    Linkages com sufixo "_knn" (ex.: 'ward_knn', 'complete_knn') usam o
+    linkage base restrito a um grafo esparso de k vizinhos mais próximos
+    (utils.knn_graph.knn_graph), com memória O(n·k) em vez de O(n²).
+
+    Parameters
+    ----------
+    linkage : str
+        'ward', 'complete', 'average', 'single' ou um deles com "_knn".
+    embeddings : np.ndarray
+        Embeddings normalizados (usados para construir o grafo kNN).
+    n_neighbors : int, optional
+        Vizinhos do grafo kNN. Padrão: variável de ambiente KNN_NEIGHBORS
+        ou 15.
+    **kwargs
+        Demais parâmetros do AgglomerativeClustering.
+    """
+    from sklearn.cluster import AgglomerativeClustering
+
+    base = linkage[:-len("_knn")] if linkage.endswith("_knn") else linkage
+    connectivity = None
+    if base != linkage:
+        from utils.knn_graph import knn_graph
+        connectivity = knn_graph(embeddings,
+                                 n_neighbors=n_neighbors or int(os.getenv("KNN_NEIGHBORS", 15)),
+                                 method=os.getenv("KNN_METHOD", "exact"))
+    return AgglomerativeClustering(metric='euclidean' if base == 'ward' else 'cosine',
+                                   linkage=base, connectivity=connectivity, **kwargs)
+
+
+@traced("run.agglomerative_tree", rows=lambda tree: len(tree.labels_))
+def agglomerative_tree(embeddings, linkage, n_neighbors=None):
+    """
+    Constrói uma única árvore de fusões completa (bottom-up) para o corpus.
+
+    A árvore contém todas as partições possíveis: qualquer número de
+    clusters ou limiar de distância pode ser obtido depois com `cut_tree`,
+    sem reajustar o modelo.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray
+        Matriz de embeddings normalizados.
+    linkage : str
+        'ward', 'complete', 'average' ou 'single', opcionalmente com o
+        sufixo "_knn" (ver `agglomerative_estimator`).
+    n_neighbors : int, optional
+        Vizinhos do grafo kNN nos linkages "_knn".
+
+    Returns
+    -------
+    sklearn.cluster.AgglomerativeClustering
+        Modelo ajustado com `children_` e `distances_` da árvore completa.
+    """
+    tree = agglomerative_estimator(linkage, embeddings, n_neighbors=n_neighbors,
+                                   n_clusters=1,
+                                   compute_full_tree=True,
+                                   compute_distances=True)
+    return tree.fit(embeddings)
+
+
+def cut_tree(tree, n_clusters=None, distance_threshold=None):
+    """
+    Corta a árvore de `agglomerative_tree` em k clusters ou em um limiar.
+
+    A partição é idêntica à de um AgglomerativeClustering ajustado
+    diretamente com o mesmo `n_clusters` (ou `distance_threshold`). Nos
+    linkages sem conectividade (ward, complete, average, single) os rótulos
+    também são idênticos; nos linkages "_knn" o ajuste direto para a árvore
+    antes da raiz, e a numeração dos clusters pode vir permutada. O corte
+    custa O(n log n) com operações vetorizadas, em vez de um novo ajuste
+    O(n²).
+
+    Parameters
+    ----------
+    tree : sklearn.cluster.AgglomerativeClustering
+        Árvore completa retornada por `agglomerative_tree`.
+    n_clusters : int, optional
+        Número de clusters desejado.
+    distance_threshold : float, optional
+        Limiar de distância; usado quando `n_clusters` é None.
+
+    Returns
+    -------
+    np.ndarray
+        Rótulo de cluster de cada amostra.
+    """
+    children = tree.children_
+    n_leaves = tree.n_leaves_
+    if n_clusters is None:
+        n_clusters = int(np.count_nonzero(tree.distances_ >= distance_threshold)) + 1
+    n_clusters = min(n_clusters, n_leaves)
+
+    # Mesma ordem de rótulos do corte do sklearn: expande os nós de maior
+    # índice a partir da raiz, mantendo-os em um heap
+    nodes = [-(max(children[-1]) + 1)]
+    for _ in range(n_clusters - 1):
+        these_children = children[-nodes[0] - n_leaves]
+        heapq.heappush(nodes, -these_children[0])
+        heapq.heappushpop(nodes, -these_children[1])
+
+    # Nós com índice >= cut estão acima do corte; cada folha sobe até o
+    # ancestral mais alto abaixo do corte (pointer jumping)
+    n_nodes = 2 * n_leaves - 1
+    cut = n_nodes - n_clusters + 1
+    parent = np.arange(n_nodes)
+    merged = np.arange(n_leaves, n_nodes)
+    parent[children[:, 0]] = merged
+    parent[children[:, 1]] = merged
+    up = np.where(parent < cut, parent, np.arange(n_nodes))
+    while True:
+        nxt = up[up]
+        if np.array_equal(nxt, up):
+            break
+        up = nxt
+
+    label_of_node = np.zeros(n_nodes, dtype=np.intp)
+    label_of_node[[-node for node in nodes]] = np.arange(len(nodes))
+    return label_of_node[up[:n_leaves]]
     
 
-def hierarchical_bottom_top_run(max_clusters: int):
+@traced("run.hierarchical_bottom_top_sweep", rows=None)
+def hierarchical_bottom_top_sweep(ks, linkage, distance_thresholds=(), corpus=None, embeddings=None):
+    """
+    Varre vários k (e limiares de distância) a partir de uma única árvore.
+
+    Em vez de um AgglomerativeClustering O(n²) por k, ajusta a árvore de
+    fusões uma vez por linkage e a corta em cada ponto pedido.
+
+    Parameters
+    ----------
+    ks : iterable of int
+        Números de clusters a extrair.
+    linkage : str
+        Critério de linkage ('ward', 'complete', ...).
+    distance_thresholds : iterable of float, optional
+        Limiares de distância adicionais a extrair.
+    corpus, embeddings : optional
+        Corpus e embeddings já preparados (ver `prepare_corpus`).
+
+    Returns
+    -------
+    dict
+        Mapeia o nome do corte (str(k) ou "t<limiar>") para o DataFrame
+        do corpus com a coluna 'cluster'.
+    """
+    corpus, embeddings = _resolve_corpus(corpus, embeddings, None)
+    tree = agglomerative_tree(embeddings, linkage)
+
+    cuts = {str(k): {"n_clusters": k} for k in ks}
+    cuts.update({f"t{t:g}": {"distance_threshold": t} for t in distance_thresholds})
+
+    results = {}
+    for name, cut in cuts.items():
+        df = corpus.copy()
+        df["cluster"] = cut_tree(tree, **cut)
+        results[name] = df
+    return results
+
+
+@traced("run.hierarchical_bottom_top_run", rows=None)
+def hierarchical_bottom_top_run(max_clusters: int, corpus=None, embeddings=None, sweep=True, distance_thresholds=(),
+                                linkages=CLUSTERING_METHODS["bottom_top"]):
     os.makedirs(f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top", exist_ok=True)
-    for linkage in ['ward', 'complete']:
-        for i in range(5, max_clusters, 5):
-                df = hierarchical_clustering_bottom_top(chosen_k=i,linkage=linkage)
-                save_txt_per_cluster(df, f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top/clusters/{linkage}/{i}", text_col="question")
-                df.to_csv(f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top/csv/{linkage}_final_results_hierarchical_{i}.csv", index=False)
\ No newline at end of file
+    corpus, embeddings = _resolve_corpus(corpus, embeddings, None)
+    with ArtifactWriter(parquet_path=f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top/sweep.parquet") as writer:
+        for linkage in linkages:
+            if sweep:
+                # Uma árvore por linkage, cortada em todos os k
+                results = hierarchical_bottom_top_sweep(range(5, max_clusters, 5), linkage,
+                                                        distance_thresholds, corpus=corpus, embeddings=embeddings)
+                if results:
+                    _plot_pca(embeddings, list(results.values())[-1]["cluster"], "Hierarchical Clustering (PCA)",
+                              f"{os.getenv('RESULTS_PATH')}/Hierarchical/Bottom-top/plots/_{linkage}.png", writer)
+            else:
+                results = {str(i): hierarchical_clustering_bottom_top(chosen_k=i,linkage=linkage,corpus=corpus,embeddings=embeddings,writer=writer)
+                           for i in range(5, max_clusters, 5)}
+            for i, df in results.items():
+                    save_bottom_top_results(df, linkage, i, writer)
+
+
+def save_bottom_top_results(df, linkage, k, writer=None):
+    _save_results(df, ("bottom_top", linkage, k), writer)
+
+
+def _plot_pca(embeddings, labels, title, path, writer=None):
+    # Renderização headless (Agg); com writer, fora do caminho do clustering
+    if writer is None:
+        render_pca(embeddings, labels, title, path)
+    else:
+        writer.plot(embeddings, labels, title, path)
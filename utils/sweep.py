@@ -0,0 +1,176 @@
+"""
+Parallel Sweep Module
+=====================
+
+Executa a grade (método, linkage, k) de clustering em paralelo, em um pool
+de processos. A matriz de embeddings é gravada uma vez em disco e aberta
+pelos workers com memory map, sem cópia por processo.
+"""
+
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from utils.writer import ArtifactWriter
+from utils.embeddings import memmap_file
+from utils.quality import quality_table
+from utils.tracing import traced, stage
+from utils.run import (_resolve_corpus, CLUSTERING_METHODS, kmeans_estimator,
+                       bisecting_kmeans_estimator, agglomerative_tree, cut_tree,
+                       save_kmeans_results, save_top_bottom_results, save_bottom_top_results, _plot_pca)
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # instalado junto com scikit-learn, mas opcional aqui
+    threadpool_limits = None
+
+_BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def sweep_tasks(ks, methods=None):
+    """
+    Lista as tarefas independentes da varredura, em ordem determinística.
+
+    K-Means e Bisecting K-Means geram uma tarefa por (linkage, k). O
+    aglomerativo gera uma tarefa por linkage, que constrói uma única árvore
+    e a corta em todos os k (ver `utils.run.cut_tree`).
+
+    Returns
+    -------
+    list of tuple
+        (método, linkage, tupla de k).
+    """
+    ks = tuple(ks)
+    tasks = []
+    for method, linkages in (methods or CLUSTERING_METHODS).items():
+        for linkage in linkages:
+            if method == "bottom_top":
+                tasks.append((method, linkage, ks))
+            else:
+                tasks.extend((method, linkage, (k,)) for k in ks)
+    return tasks
+
+
+def _init_worker(blas_threads):
+    # Evita que cada worker abra um pool BLAS/OpenMP do tamanho da máquina
+    for var in _BLAS_ENV:
+        os.environ[var] = str(blas_threads)
+    if threadpool_limits is not None:
+        threadpool_limits(limits=blas_threads)
+
+
+def _fit_task(embeddings_path, method, linkage, ks):
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    if method == "kmeans":
+        return [(k, kmeans_estimator(min(k, len(embeddings))).fit_predict(embeddings)) for k in ks]
+    if method == "top_bottom":
+        return [(k, bisecting_kmeans_estimator(k, linkage).fit_predict(embeddings)) for k in ks]
+    if method == "bottom_top":
+        tree = agglomerative_tree(np.asarray(embeddings), linkage)
+        return [(k, cut_tree(tree, k)) for k in ks]
+    raise ValueError(f"Método de clustering desconhecido: {method}")
+
+
+@traced("sweep.run_sweep", rows=None)
+def run_sweep(max_clusters, methods=None, corpus=None, embeddings=None,
+              n_workers=None, blas_threads=None, write=True, quality=True):
+    """
+    Ajusta toda a grade (método, linkage, k) em paralelo.
+
+    Parameters
+    ----------
+    max_clusters : int
+        Limite (exclusivo) da varredura; k percorre range(5, max_clusters, 5),
+        como em `kmeans_run` e nos runners hierárquicos.
+    methods : dict, optional
+        Métodos e linkages a executar. Padrão: CLUSTERING_METHODS.
+    corpus, embeddings : optional
+        Corpus e embeddings já preparados (ver `utils.run.prepare_corpus`).
+        `embeddings` pode ser o caminho de um artefato de embeddings, que os
+        workers abrem diretamente.
+    n_workers : int, optional
+        Número máximo de processos. Padrão: variável de ambiente
+        SWEEP_WORKERS ou o número de CPUs.
+    blas_threads : int, optional
+        Threads BLAS/OpenMP por worker. Padrão: CPUs // n_workers (mínimo 1).
+    write : bool, optional (default=True)
+        Grava CSVs, TXTs por cluster e gráficos PCA no mesmo layout dos
+        runners de `utils.run`.
+    quality : bool, optional (default=True)
+        Com `write`, grava também RESULTS_PATH/quality.csv com silhouette,
+        Calinski-Harabasz, Davies-Bouldin e inércia de cada combinação (ver
+        `utils.quality.quality_table`).
+
+    Returns
+    -------
+    dict
+        Mapeia (método, linkage, k) para o DataFrame do corpus com a
+        coluna 'cluster', em ordem determinística.
+
+    Examples
+    --------
+    >>> results = run_sweep(51, n_workers=16)
+    >>> results[("kmeans", None, 10)]["cluster"].nunique()
+    10
+    """
+    corpus, embeddings = _resolve_corpus(corpus, embeddings, None)
+    tasks = sweep_tasks(range(5, max_clusters, 5), methods)
+
+    cpus = os.cpu_count() or 1
+    n_workers = n_workers or int(os.getenv("SWEEP_WORKERS", cpus))
+    n_workers = max(1, min(n_workers, len(tasks)))
+    blas_threads = blas_threads or max(1, cpus // n_workers)
+
+    with tempfile.TemporaryDirectory(prefix="sweep_") as tmp:
+        # Um único arquivo .npy compartilhado por memory map entre os workers;
+        # um artefato de embeddings já em disco é reaproveitado sem cópia
+        # (fatias de um memory map não: ver `memmap_file`)
+        path = memmap_file(embeddings)
+        if path is None:
+            path = os.path.join(tmp, "embeddings.npy")
+            np.save(path, np.ascontiguousarray(embeddings, dtype=np.float32))
+
+        with stage("sweep.fit_pool", rows=len(embeddings) * len(tasks)), \
+                ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                    initargs=(blas_threads,)) as pool:
+            futures = [pool.submit(_fit_task, path, *task) for task in tasks]
+            outputs = [future.result() for future in futures]
+
+    results = {}
+    for (method, linkage, _), labelled in zip(tasks, outputs):
+        for k, labels in labelled:
+            df = corpus.copy()
+            df["cluster"] = labels
+            results[(method, linkage, k)] = df
+
+    if write:
+        _write_results(results, embeddings)
+        if quality:
+            quality_table(embeddings, results, path=f"{os.getenv('RESULTS_PATH')}/quality.csv")
+    return results
+
+
+def _write_results(results, embeddings):
+    results_path = os.getenv("RESULTS_PATH")
+    # Mesmos gráficos dos runners seriais: um por (linkage, k) no
+    # top-bottom, um por linkage (último k) no bottom-top, nenhum no K-Means
+    last_k = {}
+    for method, linkage, k in results:
+        if method == "bottom_top":
+            last_k[linkage] = k
+    os.makedirs(f"{results_path}/K_Means", exist_ok=True)
+    os.makedirs(f"{results_path}/Hierarchical/Top-Bottom", exist_ok=True)
+    os.makedirs(f"{results_path}/Hierarchical/Bottom-top", exist_ok=True)
+    with ArtifactWriter(parquet_path=f"{results_path}/sweep.parquet") as writer:
+        for (method, linkage, k), df in results.items():
+            if method == "kmeans":
+                save_kmeans_results(df, k, writer)
+            elif method == "top_bottom":
+                save_top_bottom_results(df, linkage, k, writer)
+                _plot_pca(embeddings, df["cluster"], "Bisecting K-Means Clustering (PCA)",
+                          f"{results_path}/Hierarchical/Top-Bottom/plots/{linkage}_{k}.png", writer)
+            else:
+                save_bottom_top_results(df, linkage, k, writer)
+                if last_k[linkage] == k:
+                    _plot_pca(embeddings, df["cluster"], "Hierarchical Clustering (PCA)",
+                              f"{results_path}/Hierarchical/Bottom-top/plots/_{linkage}.png", writer)
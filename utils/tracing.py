@@ -0,0 +1,301 @@
+"""
+Tracing Module
+==============
+
+Instrumentação leve das etapas da pipeline. Cada etapa registra tempo de
+parede, tempo de CPU, linhas processadas, a variação da memória residente
+durante a etapa e o pico de memória residente do processo (acumulado desde
+o início, não por etapa); chamadas ao LLM registram contagem, erros,
+tentativas e latência.
+
+O custo por etapa é de poucas chamadas ao relógio e leituras de RSS, então a
+instrumentação fica ligada por padrão (TRACE=0 desliga). O trace fica em
+memória e é gravado em JSON com `write_trace`, ou automaticamente ao fim do
+processo se TRACE_DIR estiver definida. Com TRACE_PROFILE=1, o processo
+também roda sob cProfile e o perfil é gravado ao lado do trace (formato
+pstats, legível por snakeviz/pstats; py-spy pode ser anexado externamente
+ao processo sem nenhuma mudança).
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de RSS
+    resource = None
+
+
+_trace = None
+_trace_lock = threading.Lock()
+_local = threading.local()
+
+
+def _rss_mb():
+    # RSS atual (Linux); None onde /proc não existe
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+def _peak_rss_mb():
+    # Pico do processo inteiro (ru_maxrss): só cresce, não é por etapa
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def _infer_rows(result):
+    # Linhas de um DataFrame/array, ou do primeiro item de uma tupla
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class Trace:
+    """
+    Registro das etapas e chamadas externas de uma execução.
+
+    Parameters
+    ----------
+    max_events : int, optional
+        Máximo de etapas guardadas individualmente. Padrão: variável de
+        ambiente TRACE_MAX_EVENTS ou 100000. O resumo por nome de etapa é
+        sempre mantido.
+    """
+
+    def __init__(self, max_events=None):
+        self.enabled = os.getenv("TRACE", "1") != "0"
+        self.max_events = int(max_events or os.getenv("TRACE_MAX_EVENTS", 100000))
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.events = []
+        self.dropped = 0
+        self.summary = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Mede uma etapa. O registro é devolvido e `rows` pode ser definido
+        dentro do bloco.
+
+        Examples
+        --------
+        >>> with get_trace().stage("encode") as record:
+        ...     embeddings = encode_texts(texts)
+        ...     record["rows"] = len(texts)
+        """
+        record = {"stage": name, "rows": rows}
+        if not self.enabled:
+            yield record
+            return
+
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        record["parent"] = stack[-1] if stack else None
+        stack.append(name)
+
+        rss_before, peak_before = _rss_mb(), _peak_rss_mb()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record["error"] = True
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            stack.pop()
+            rss, peak = _rss_mb(), _peak_rss_mb()
+            record.update(
+                start_s=round(start - self._t0, 6),
+                wall_s=round(wall, 6),
+                cpu_s=round(time.process_time() - cpu_start, 6),
+                rss_mb=None if rss is None else round(rss, 3),
+                rss_delta_mb=None if rss is None else round(rss - rss_before, 3),
+                process_peak_rss_mb=peak,
+                process_peak_growth_mb=None if peak is None else round(peak - peak_before, 3),
+                thread=threading.current_thread().name,
+            )
+            self._add(record)
+
+    def _add(self, record):
+        with self._lock:
+            if len(self.events) < self.max_events:
+                self.events.append(record)
+            else:
+                self.dropped += 1
+            total = self.summary.setdefault(record["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0})
+            total["count"] += 1
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["rows"] += record["rows"] or 0
+
+    def record_call(self, name, seconds, ok=True, attempts=1):
+        """Registra uma chamada externa (ex.: LLM): latência, erro e tentativas."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.calls.setdefault(
+                name, {"calls": 0, "errors": 0, "attempts": 0, "total_s": 0.0, "max_s": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["attempts"] += attempts
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+
+    def to_dict(self):
+        with self._lock:
+            calls = {
+                name: {**stats, "mean_s": stats["total_s"] / stats["calls"] if stats["calls"] else None}
+                for name, stats in self.calls.items()
+            }
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "pid": os.getpid(),
+                "wall_s": round(time.perf_counter() - self._t0, 6),
+                "cpu_s": round(time.process_time(), 6),
+                "process_peak_rss_mb": _peak_rss_mb(),
+                "summary": {name: dict(total) for name, total in self.summary.items()},
+                "calls": calls,
+                "stages": list(self.events),
+                "dropped_stages": self.dropped,
+            }
+
+    def write(self, path=None):
+        """
+        Grava o trace em JSON.
+
+        Parameters
+        ----------
+        path : str, optional
+            Arquivo de destino. Padrão: TRACE_DIR/trace_<data>_<pid>.json.
+
+        Returns
+        -------
+        str
+            Caminho gravado.
+        """
+        if path is None:
+            stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started))
+            path = os.path.join(os.getenv("TRACE_DIR", "."), f"trace_{stamp}_{os.getpid()}.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+def get_trace():
+    """
+    Retorna o trace do processo, criando-o na primeira chamada.
+
+    Se TRACE_DIR estiver definida, o trace é gravado ao fim do processo,
+    junto com o perfil .prof quando TRACE_PROFILE=1 (o cProfile é iniciado
+    na importação deste módulo).
+    """
+    global _trace
+    with _trace_lock:
+        if _trace is None:
+            _trace = Trace()
+            if os.getenv("TRACE_DIR") and _trace.enabled:
+                atexit.register(_write_at_exit, _trace)
+    return _trace
+
+
+def _write_at_exit(trace):
+    path = trace.write()
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(path[:-len(".json")] + ".prof")
+
+
+def stage(name, rows=None):
+    """Atalho para `get_trace().stage(name, rows)`."""
+    return get_trace().stage(name, rows)
+
+
+def traced(name=None, rows=_infer_rows):
+    """
+    Decorator que mede cada chamada da função como uma etapa.
+
+    Parameters
+    ----------
+    name : str, optional
+        Nome da etapa. Padrão: módulo.função.
+    rows : callable or int, optional
+        Extrai as linhas processadas do retorno. Padrão: len() do retorno
+        (ou do primeiro item, se for tupla). Um inteiro usa len() do
+        argumento posicional nessa posição (ex.: 0 para o DataFrame de
+        entrada de uma função que não retorna nada).
+    """
+    def decorator(fn):
+        stage_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_trace().stage(stage_name) as record:
+                result = fn(*args, **kwargs)
+                if isinstance(rows, int):
+                    record["rows"] = _infer_rows(args[rows]) if len(args) > rows else None
+                elif rows is not None and record.get("rows") is None:
+                    record["rows"] = rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def record_call(name, seconds, ok=True, attempts=1):
+    """Atalho para `get_trace().record_call(...)`."""
+    get_trace().record_call(name, seconds, ok, attempts)
+
+
+def write_trace(path=None):
+    """Grava o trace do processo em JSON (ver `Trace.write`)."""
+    return get_trace().write(path)
+
+
+@contextmanager
+def profiled(path):
+    """
+    Executa o bloco sob cProfile e grava o perfil em `path` (formato pstats).
+
+    Examples
+    --------
+    >>> with profiled("sweep.prof"):
+    ...     run_sweep(51)
+    $ python -m pstats sweep.prof   # ou: snakeviz sweep.prof
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+
+
+_profiler = None
+if os.getenv("TRACE_PROFILE") == "1" and os.getenv("TRACE_DIR"):
+    import cProfile
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+    get_trace()
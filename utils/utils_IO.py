@@ -1,17 +1,111 @@
-import os, time, json
-from utils.AWS import generate
+import os, json
+from utils.AWS import generate_cluster_names
 import pandas as pd
+from utils.tracing import traced
 
-def save_txt_per_cluster(df, out_dir, text_col):
+# Seções cujo texto para embedding é "pergunta resposta"
+ANSWER_SECTIONS = {"qa", "completion"}
+
+_corpus_cache = {}
+
+
+@traced("io.save_txt_per_cluster", rows=0)
+def save_txt_per_cluster(df, out_dir, text_col, max_workers=None, names=None):
     os.makedirs(out_dir, exist_ok=True)
     print(df)
-    for cluster, g in df.groupby("cluster"):
-        time.sleep(4)
-        rename = generate("\n".join(g[text_col].astype(str)))
+    groups = cluster_groups(df, text_col)
+    if names is None:
+        # Nomeia todos os clusters em paralelo (limite de taxa e cache de nomes em utils.AWS)
+        names = generate_cluster_names([texts for _, texts in groups], max_workers=max_workers)
+    else:
+        # Nomes já gerados (ex.: checkpoint de utils.pipeline), por cluster
+        names = [names[cluster] for cluster, _ in groups]
+    for (cluster, texts), rename in zip(groups, names):
         with open(f"{out_dir}/{cluster}_{rename}_.txt", "w", encoding="utf-8") as f:
-            f.write("\n".join(g[text_col].astype(str)))
+            f.write("\n".join(texts))
+
+def cluster_groups(df, text_col):
+    """Lista (cluster, textos) de cada cluster, em ordem de rótulo."""
+    return [(cluster, g[text_col].astype(str).tolist()) for cluster, g in df.groupby("cluster")]
 
 def json_to_df(path):
     with open(path) as f:
         data = json.load(f)
-    return pd.DataFrame(data["testCases"])
\ No newline at end of file
+    return pd.DataFrame(data["testCases"])
+
+
+@traced("io.load_corpus")
+def load_corpus(json_path=None):
+    """
+    Lê e achata o corpus de perguntas em um DataFrame section/question/text.
+
+    O resultado é memoizado por (caminho, mtime): chamadas repetidas com o
+    mesmo arquivo inalterado não fazem novo parse do JSON.
+
+    Parameters
+    ----------
+    json_path : str, optional
+        Caminho do JSON no formato {seção: {"question": [...], "answer": [...]}}.
+        Padrão: variável de ambiente JSON_PATH.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Cópia do corpus com as colunas:
+        - section: nome da seção
+        - question: pergunta original
+        - text: texto usado no embedding ("pergunta resposta" nas seções
+          qa/completion quando há resposta, senão a própria pergunta)
+
+    Examples
+    --------
+    >>> corpus = load_corpus("dados.json")
+    >>> corpus.columns.tolist()
+    ['section', 'question', 'text']
+    """
+    path = os.path.abspath(json_path or os.getenv("JSON_PATH"))
+    key = (path, os.stat(path).st_mtime_ns)
+
+    if key not in _corpus_cache:
+        # Descarta versões antigas do mesmo arquivo
+        for stale in [k for k in _corpus_cache if k[0] == path]:
+            del _corpus_cache[stale]
+        _corpus_cache[key] = _flatten_corpus(pd.read_json(path))
+
+    return _corpus_cache[key].copy()
+
+
+def _flatten_corpus(raw):
+    frames = []
+
+    for section in raw.columns:
+        block = raw[section]
+
+        if "question" not in block or not isinstance(block["question"], list):
+            continue
+
+        questions = pd.Series(block["question"], dtype=object)
+        answers = block.get("answer")
+
+        if isinstance(answers, list):
+            # Mantém o comportamento do zip(): trunca no menor comprimento
+            n = min(len(questions), len(answers))
+            questions = questions.iloc[:n]
+            answers = pd.Series(answers[:n], dtype=object)
+        else:
+            answers = pd.Series([None] * len(questions), dtype=object)
+
+        text = questions
+        if section in ANSWER_SECTIONS:
+            joined = questions.astype(str) + " " + answers.astype(str)
+            text = questions.where(answers.isna(), joined)
+
+        frames.append(pd.DataFrame({
+            "section": section,
+            "question": questions.to_numpy(),
+            "text": text.to_numpy(),
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=["section", "question", "text"])
+    return pd.concat(frames, ignore_index=True)
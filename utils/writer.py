@@ -0,0 +1,160 @@
+"""
+Artifact Writer Module
+======================
+
+Escrita adiada dos artefatos da varredura de clustering (CSV, TXT por
+cluster e gráficos PCA). As saídas entram em uma fila e são gravadas por um
+pool de threads em segundo plano: o clustering não espera disco, nomeação
+de clusters nem renderização.
+
+Com ARTIFACT_FORMAT=parquet, os milhares de CSV/TXT de uma varredura são
+substituídos por um único arquivo Parquet em formato longo.
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from utils.utils_IO import save_txt_per_cluster
+from utils.projection import pca_projection, plot_sample
+from utils.tracing import traced
+
+
+ARTIFACT_FORMATS = ("files", "parquet")
+
+
+@traced("writer.write_cluster_results", rows=0)
+def write_cluster_results(df, csv_path, clusters_dir, text_col="question", names=None):
+    """
+    Grava o CSV de uma combinação da varredura e um TXT por cluster.
+
+    Os TXT são nomeados pelo LLM (ver `utils.utils_IO.save_txt_per_cluster`),
+    a menos que `names` (cluster -> nome) seja informado.
+    """
+    save_txt_per_cluster(df, clusters_dir, text_col=text_col, names=names)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    df.to_csv(csv_path, index=False)
+
+
+@traced("writer.render_pca", rows=0)
+def render_pca(embeddings, labels, title, path, max_points=None):
+    """
+    Renderiza o gráfico de dispersão PCA dos clusters em um PNG.
+
+    A projeção 2-D é calculada uma vez por matriz de embeddings e
+    reaproveitada por todos os gráficos (ver `utils.projection`). Com
+    `max_points` (ou PLOT_MAX_POINTS), desenha só uma amostra fixa de linhas.
+
+    Usa o backend Agg diretamente (Figure + FigureCanvasAgg), sem pyplot:
+    funciona sem display e pode rodar em qualquer thread.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    reduced = pca_projection(embeddings)
+    rows = plot_sample(len(reduced), max_points)
+    reduced, labels = reduced[rows], np.asarray(labels)[rows]
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.scatter(reduced[:, 0], reduced[:, 1], c=labels)
+    ax.set_xlabel("PCA 1")
+    ax.set_ylabel("PCA 2")
+    ax.set_title(title)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fig.savefig(path, dpi=300, bbox_inches="tight")
+
+
+class ArtifactWriter:
+    """
+    Fila de artefatos gravados em segundo plano.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Threads de escrita. Padrão: variável de ambiente ARTIFACT_WRITERS ou 4.
+    fmt : {'files', 'parquet'}, optional
+        'files' grava CSV + TXT por cluster (layout original). 'parquet'
+        acumula os resultados e grava um único arquivo em `parquet_path` ao
+        fechar, com as colunas method, linkage, k e cluster ao lado das
+        colunas do corpus (sem TXT nem nomeação de clusters). Padrão:
+        variável de ambiente ARTIFACT_FORMAT ou 'files'.
+    parquet_path : str, optional
+        Arquivo Parquet da varredura (obrigatório no formato 'parquet').
+
+    Examples
+    --------
+    >>> with ArtifactWriter() as writer:
+    ...     for k in ks:
+    ...         df = fit(k)
+    ...         writer.write_results(df, csv_path, clusters_dir, key=("kmeans", None, k))
+    ...     writer.plot(embeddings, df["cluster"], "K-Means (PCA)", png_path)
+    """
+
+    def __init__(self, max_workers=None, fmt=None, parquet_path=None):
+        self.fmt = fmt or os.getenv("ARTIFACT_FORMAT", "files")
+        if self.fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"Formato de artefatos desconhecido: {self.fmt}")
+        if self.fmt == "parquet" and not parquet_path:
+            raise ValueError("O formato 'parquet' requer parquet_path.")
+
+        self.parquet_path = parquet_path
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("ARTIFACT_WRITERS", 4)),
+            thread_name_prefix="artifact-writer",
+        )
+        self._futures = []
+        self._frames = []
+        self._lock = threading.Lock()
+
+    def write_results(self, df, csv_path, clusters_dir, key, text_col="question"):
+        """
+        Enfileira os resultados de uma combinação (método, linkage, k).
+
+        `df` não deve ser alterado depois de enfileirado.
+        """
+        if self.fmt == "parquet":
+            method, linkage, k = key
+            frame = df.assign(method=method, linkage=linkage, k=str(k))
+            with self._lock:
+                self._frames.append(frame)
+            return
+        self._submit(write_cluster_results, df, csv_path, clusters_dir, text_col)
+
+    def plot(self, embeddings, labels, title, path):
+        """Enfileira a renderização do gráfico PCA (ver `render_pca`)."""
+        self._submit(render_pca, embeddings, np.array(labels), title, path)
+
+    def _submit(self, fn, *args):
+        future = self._pool.submit(fn, *args)
+        with self._lock:
+            self._futures.append(future)
+
+    def close(self):
+        """
+        Espera todas as escritas pendentes e grava o Parquet, se houver.
+
+        A primeira exceção de uma escrita em segundo plano é relançada aqui.
+        """
+        try:
+            for future in self._futures:
+                future.result()
+            if self._frames:
+                os.makedirs(os.path.dirname(self.parquet_path) or ".", exist_ok=True)
+                pd.concat(self._frames, ignore_index=True).to_parquet(self.parquet_path, index=False)
+        finally:
+            self._pool.shutdown(wait=True)
+            self._futures, self._frames = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Não mascara o erro original com erros de escrita pendentes
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            return
+        self.close()